@@ -0,0 +1,95 @@
+# coding: utf-8
+
+"""
+    Benchmark of server-side batching with a progress bar emitting to many connected clients.
+
+    Each tick of a :class:`~tornado_websockets.modules.ProgressBar` emits three events (``before_update``, ``update``
+    and ``after_update``). Compares the number of frames received by the clients and the time spent until every
+    client received a tick, without batching and with ``WebSocket(path, batch=0)``.
+
+    Usage::
+
+        $ python -m benchmarks.bench_batching --clients 500 --ticks 50
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from tornado import gen
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.websocket import websocket_connect
+
+from tornado_websockets.modules import ProgressBar
+from tornado_websockets.tornadowrapper import TornadoWrapper
+from tornado_websockets.websocket import WebSocket
+
+
+@gen.coroutine
+def measure(path, batch, port, args):
+    ws = WebSocket(path, batch=batch)
+    progressbar = ProgressBar(min=0, max=args.ticks)
+    ws.bind(progressbar)
+
+    clients = []
+    for _ in range(args.clients):
+        client = yield websocket_connect('ws://127.0.0.1:%d/ws%s' % (port, path))
+        clients.append(client)
+
+    while len(ws.handlers) < args.clients:
+        yield gen.sleep(.01)
+
+    # Messages sent by the « open » hook of the progress bar
+    for client in clients:
+        for _ in range(1 if batch is not None else 3):
+            yield client.read_message()
+
+    frames = 0
+    start = time.time()
+
+    for _ in range(args.ticks):
+        progressbar.tick()
+
+        for client in clients:
+            # The last tick also emits « done »
+            expected = 1 if batch is not None else (4 if progressbar.is_done() else 3)
+
+            for _ in range(expected):
+                yield client.read_message()
+                frames += 1
+
+    elapsed = time.time() - start
+
+    for client in clients:
+        client.close()
+
+    raise gen.Return((elapsed / args.ticks, frames, ws.batcher))
+
+
+@gen.coroutine
+def main(args):
+    TornadoWrapper.start_app()
+    sock, port = bind_unused_port()
+    server = HTTPServer(TornadoWrapper.app)
+    server.add_socket(sock)
+
+    unbatched, unbatched_frames, _ = yield measure('/bench_unbatched', None, port, args)
+    batched, batched_frames, batcher = yield measure('/bench_batched', 0, port, args)
+
+    print('clients: %d, ticks: %d' % (args.clients, args.ticks))
+    print('unbatched:  %8.2f ms/tick, %8d frames' % (unbatched * 1e3, unbatched_frames))
+    print('batched:    %8.2f ms/tick, %8d frames' % (batched * 1e3, batched_frames))
+    print('frames:     %8.2fx fewer' % (float(unbatched_frames) / batched_frames))
+    print('speedup:    %8.2fx' % (unbatched / batched))
+    print('flush latency (first emit to flush): %.3f ms on average' % (batcher.average_latency * 1e3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=50)
+
+    IOLoop.current().run_sync(lambda: main(parser.parse_args()))
@@ -0,0 +1,94 @@
+# coding: utf-8
+
+"""
+    Benchmark of a broadcast on a WebSocket path with many connected clients.
+
+    Compares the server-side cost per client of the legacy path (one ``write_message(dict)`` per client, so one JSON
+    encoding and one framing per client) and of :meth:`WebSocket.emit()
+    <tornado_websockets.websocket.WebSocket.emit>` (encoded and framed once, same bytes written to every client).
+
+    Usage::
+
+        $ python -m benchmarks.bench_broadcast --clients 1000 --rounds 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from tornado import gen
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.websocket import websocket_connect
+
+from tornado_websockets.tornadowrapper import TornadoWrapper
+from tornado_websockets.websocket import WebSocket
+
+
+def legacy_emit(ws, event, data):
+    for handler in ws.handlers:
+        handler.write_message({
+            'event': event,
+            'data': data
+        })
+
+
+@gen.coroutine
+def drain(clients):
+    for client in clients:
+        yield client.read_message()
+
+
+@gen.coroutine
+def measure(emit, ws, clients, rounds, data):
+    elapsed = 0
+
+    for _ in range(rounds):
+        start = time.time()
+        emit(ws, 'bench', data)
+        elapsed += time.time() - start
+
+        yield drain(clients)
+
+    raise gen.Return(elapsed / rounds / len(clients))
+
+
+@gen.coroutine
+def main(args):
+    ws = WebSocket('/bench_broadcast')
+    data = {'message': 'x' * args.size}
+
+    TornadoWrapper.start_app()
+    sock, port = bind_unused_port()
+    server = HTTPServer(TornadoWrapper.app)
+    server.add_socket(sock)
+
+    clients = []
+    for _ in range(args.clients):
+        client = yield websocket_connect('ws://127.0.0.1:%d/ws/bench_broadcast' % port)
+        clients.append(client)
+
+    while len(ws.handlers) < args.clients:
+        yield gen.sleep(.01)
+
+    legacy = yield measure(legacy_emit, ws, clients, args.rounds, data)
+    current = yield measure(WebSocket.emit, ws, clients, args.rounds, data)
+
+    print('clients: %d, payload: %d bytes, rounds: %d' % (args.clients, args.size, args.rounds))
+    print('legacy (encode per client):  %8.2f µs/client' % (legacy * 1e6))
+    print('emit (encode/frame once):    %8.2f µs/client' % (current * 1e6))
+    print('speedup:                     %8.2fx' % (legacy / current))
+
+    for client in clients:
+        client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--size', type=int, default=256, help='size of the broadcasted message')
+
+    IOLoop.current().run_sync(lambda: main(parser.parse_args()))
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+"""
+    Benchmark of the codecs available to clients, on chat and progress bar workloads.
+
+    For each registered codec (see :mod:`tornado_websockets.codec`, binary codecs need their package), measures the
+    bytes per message and the CPU time to encode a message (server side, once per broadcast) and to decode a message
+    (server side, for each message sent by a client). The JSON codec is measured with each installed JSON backend
+    (see :mod:`tornado_websockets.jsonbackend`).
+
+    Usage::
+
+        $ pip install msgpack cbor2 orjson ujson
+        $ python -m benchmarks.bench_codecs --messages 20000
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from tornado_websockets import jsonbackend
+from tornado_websockets.codec import codecs
+
+
+def chat_workload(count):
+    words = ['hello', 'world', 'django', 'tornado', 'websocket', 'message', u'caf\xe9', 'ok']
+
+    return [{
+        'event': 'message',
+        'data': {
+            'user': 'user%d' % random.randint(1, 1000),
+            'message': ' '.join(random.choice(words) for _ in range(random.randint(3, 20))),
+            'timestamp': 1500000000 + i,
+        }
+    } for i in range(count)]
+
+
+def progressbar_workload(count):
+    return [{
+        'event': 'module_progressbar_update',
+        'data': {
+            'current': i % 100,
+            'min': 0,
+            'max': 100,
+            'values': [random.random() for _ in range(8)],
+        }
+    } for i in range(count)]
+
+
+def measure(codec, envelopes):
+    start = time.time()
+    payloads = [codec.encode(envelope) for envelope in envelopes]
+    encode = time.time() - start
+
+    start = time.time()
+    for payload in payloads:
+        codec.decode(payload)
+    decode = time.time() - start
+
+    count = float(len(envelopes))
+
+    return sum(len(payload) for payload in payloads) / count, encode / count, decode / count
+
+
+def main(args):
+    random.seed(0)
+
+    workloads = [
+        ('chat', chat_workload(args.messages)),
+        ('progressbar', progressbar_workload(args.messages)),
+    ]
+
+    print('messages: %d per workload, codecs: %s' % (args.messages, ', '.join(sorted(codecs))))
+
+    for workload, envelopes in workloads:
+        print()
+        print('%-12s %-12s %10s %14s %14s' % ('workload', 'codec', 'bytes/msg', 'encode µs/msg', 'decode µs/msg'))
+
+        for name in sorted(codecs):
+            backends = sorted(jsonbackend.backends) if name == 'json' else [None]
+
+            for backend in backends:
+                if backend is not None:
+                    jsonbackend.set_backend(backend)
+
+                size, encode, decode = measure(codecs[name], envelopes)
+                label = name if backend is None else '%s/%s' % (name, backend)
+                print('%-12s %-12s %10.1f %14.2f %14.2f' % (workload, label, size, encode * 1e6, decode * 1e6))
+
+            jsonbackend.set_backend('auto')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000, help='number of messages per workload')
+
+    main(parser.parse_args())
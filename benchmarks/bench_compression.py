@@ -0,0 +1,94 @@
+# coding: utf-8
+
+"""
+    Benchmark of per-message compression: CPU time spent versus bandwidth saved, broadcasting to many clients.
+
+    For chat and progress bar workloads, compares sending messages uncompressed, compressing them for each client
+    with context takeover (``Compression(context_takeover=True)``, the default) and compressing them once for every
+    client without context takeover (``Compression(context_takeover=False)``), at several compression levels.
+    Compression contexts are the ones Tornado creates for each connection.
+
+    Usage::
+
+        $ python -m benchmarks.bench_compression --clients 100 --messages 2000
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from tornado.websocket import _PerMessageDeflateCompressor
+
+from benchmarks.bench_codecs import chat_workload, progressbar_workload
+from tornado_websockets.codec import JSON
+from tornado_websockets.compression import Compression
+from tornado_websockets.frame import OPCODE_TEXT, build_frame
+
+
+def measure(payloads, clients, level, context_takeover, min_size):
+    """
+        Return the average size of a frame sent to a client and the CPU time spent per broadcast.
+    """
+
+    compression = Compression(level=level, min_size=min_size, context_takeover=context_takeover)
+    compressors = [_PerMessageDeflateCompressor(context_takeover, None, compression.options()) for _ in range(clients)]
+    size = 0
+
+    start = time.time()
+
+    for payload in payloads:
+        frame = build_frame(payload)
+
+        for compressor in compressors:
+            written = compression.frame(payload, frame, OPCODE_TEXT, compressor)
+
+            if written is None:
+                # What write_message() does for a connection with context takeover
+                written = build_frame(compressor.compress(payload), OPCODE_TEXT, 0x40)
+
+            size += len(written)
+
+    elapsed = time.time() - start
+    count = float(len(payloads))
+
+    return size / count / clients, elapsed / count
+
+
+def main(args):
+    random.seed(0)
+
+    workloads = [
+        ('chat', chat_workload(args.messages)),
+        ('progressbar', progressbar_workload(args.messages)),
+    ]
+
+    print('messages: %d per workload, clients: %d, min_size: %d' % (args.messages, args.clients, args.min_size))
+
+    for workload, envelopes in workloads:
+        payloads = [JSON.encode(envelope) for envelope in envelopes]
+        raw = sum(len(build_frame(payload)) for payload in payloads) / float(len(payloads))
+
+        print()
+        print('%-12s %-10s %5s %12s %8s %18s' % (
+            'workload', 'mode', 'level', 'bytes/frame', 'ratio', 'CPU µs/broadcast'
+        ))
+        print('%-12s %-10s %5s %12.1f %8.2f %18.2f' % (workload, 'none', '-', raw, 1, 0))
+
+        for level in args.levels:
+            for mode, context_takeover in (('takeover', True), ('shared', False)):
+                size, elapsed = measure(payloads, args.clients, level, context_takeover, args.min_size)
+                print('%-12s %-10s %5d %12.1f %8.2f %18.2f' % (
+                    workload, mode, level, size, size / raw, elapsed * 1e6
+                ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100, help='number of clients of each broadcast')
+    parser.add_argument('--messages', type=int, default=2000, help='number of messages per workload')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6, 9], help='compression levels')
+    parser.add_argument('--min-size', type=int, default=0, help='size below which messages are not compressed')
+
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+"""
+    Micro-benchmark of incoming messages dispatched through :meth:`WebSocketHandler.on_message()
+    <tornado_websockets.websockethandler.WebSocketHandler.on_message>`.
+
+    Compares the legacy dispatch (callback signature inspected on every message) and the invokers compiled by
+    :meth:`WebSocket.on() <tornado_websockets.websocket.WebSocket.on>`. No connection is opened: the handler is
+    used as a plain object, so only the decoding and dispatching costs are measured.
+
+    Usage::
+
+        $ python -m benchmarks.bench_dispatch --messages 200000
+"""
+
+from __future__ import print_function
+
+import argparse
+import inspect
+import time
+
+import tornado.escape
+from mock import patch
+
+from tornado_websockets.codec import JSON
+from tornado_websockets.websocket import WebSocket
+from tornado_websockets.websockethandler import WebSocketHandler
+
+getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+
+
+def legacy_on_message(handler, message):
+    message = tornado.escape.json_decode(message)
+    event = message.get('event')
+    data = message.get('data') or {}
+
+    callback = handler.websocket.events.get(event)
+    spec = getargspec(callback)
+    kwargs = {}
+
+    if 'self' in spec.args:
+        kwargs['self'] = handler.websocket.context
+    if 'socket' in spec.args:
+        kwargs['socket'] = handler
+    if 'data' in spec.args:
+        kwargs['data'] = data
+
+    return callback(**kwargs)
+
+
+def measure(on_message, handler, message, count):
+    start = time.time()
+
+    for _ in range(count):
+        on_message(handler, message)
+
+    return count / (time.time() - start)
+
+
+def main(args):
+    with patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler'):
+        ws = WebSocket('/bench_dispatch')
+
+    @ws.on
+    def message(socket, data):
+        pass
+
+    handler = WebSocketHandler.__new__(WebSocketHandler)
+    handler.websocket = ws
+    handler.codec = JSON
+    payload = tornado.escape.json_encode({'event': 'message', 'data': {'username': 'bench', 'message': 'hello'}})
+
+    legacy = measure(legacy_on_message, handler, payload, args.messages)
+    current = measure(WebSocketHandler.on_message, handler, payload, args.messages)
+
+    print('messages: %d' % args.messages)
+    print('legacy (inspect per message):  %10.0f msg/s' % legacy)
+    print('on_message (compiled invoker): %10.0f msg/s' % current)
+    print('speedup:                       %10.2fx' % (current / legacy))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+"""
+    Micro-benchmark of the overhead of metrics on incoming messages dispatched through
+    :meth:`WebSocketHandler.on_message() <tornado_websockets.websockethandler.WebSocketHandler.on_message>`.
+
+    Messages are handled by the same WebSocket with and without metrics, its callback does nothing. Like
+    ``bench_dispatch``, no connection is opened: the handler is used as a plain object, so the overhead is compared
+    to the decoding and dispatching costs only, not hidden in the noise of sockets. Rounds alternate with and without
+    metrics, the fastest round of each and the median ratio between consecutive rounds are reported.
+
+    Usage::
+
+        $ python -m benchmarks.bench_metrics --messages 2000 --rounds 500
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+from timeit import default_timer
+
+import tornado.escape
+from mock import patch
+
+from tornado_websockets.codec import JSON
+from tornado_websockets.metrics import WebSocketMetrics
+from tornado_websockets.websocket import WebSocket
+from tornado_websockets.websockethandler import WebSocketHandler
+
+
+def create_handler():
+    with patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler'):
+        ws = WebSocket('/bench_metrics')
+
+    @ws.on
+    def message(socket, data):
+        pass
+
+    handler = WebSocketHandler.__new__(WebSocketHandler)
+    handler.websocket = ws
+    handler.codec = JSON
+    handler.buckets = {}
+
+    return handler
+
+
+def measure(handler, message, count):
+    on_message = handler.on_message
+    start = default_timer()
+
+    for _ in range(count):
+        on_message(message)
+
+    return (default_timer() - start) / count
+
+
+def main(args):
+    handler = create_handler()
+    metrics = WebSocketMetrics()
+    payload = tornado.escape.json_encode({'event': 'message', 'data': {'username': 'bench', 'message': 'hello'}})
+    enabled, disabled = [], []
+
+    # Collections would add noise, the handling of a message does not create cycles
+    gc.disable()
+
+    for _ in range(args.rounds):
+        handler.websocket.metrics = None
+        disabled.append(measure(handler, payload, args.messages))
+        handler.websocket.metrics = metrics
+        enabled.append(measure(handler, payload, args.messages))
+
+    gc.enable()
+
+    print('messages: %d per round, rounds: %d' % (args.messages, args.rounds))
+    print('without metrics: %8.3f µs/msg' % (min(disabled) * 1e6))
+    print('with metrics:    %8.3f µs/msg' % (min(enabled) * 1e6))
+    print('overhead:        %8.1f%% (fastest rounds)' % (100 * (min(enabled) / min(disabled) - 1)))
+
+    # Each round with metrics is compared to the round before it, the median is not moved by noisy rounds
+    ratios = sorted(with_metrics / without_metrics for with_metrics, without_metrics in zip(enabled, disabled))
+    print('overhead:        %8.1f%% (median of rounds)' % (100 * (ratios[len(ratios) // 2] - 1)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000, help='number of messages per round')
+    parser.add_argument('--rounds', type=int, default=500, help='number of rounds per WebSocket')
+
+    main(parser.parse_args())
@@ -0,0 +1,315 @@
+# coding: utf-8
+
+"""
+    Load script showing how throughput and connection capacity scale with the number of ``runtornado`` workers.
+
+    For each number of workers, a server is started in the background with
+    :meth:`TornadoWrapper.fork() <tornado_websockets.tornadowrapper.TornadoWrapper.fork>` (like
+    ``runtornado --workers N``), then several client processes open connections and send ``echo`` events as fast
+    as they can. The mean handshake time and echoed messages per second are reported, for a fixed number of
+    connections.
+
+    With ``--capacity``, client processes instead open ``--step`` more connections each per round and keep them
+    open, then every held connection sends one ``echo`` event. Rounds stop when a connection fails (refused, closed
+    or timed out) or when the p99 round trip of a round is over ``--slo`` milliseconds, the maximum number of
+    connections held within the SLO is reported. The limit of file descriptors is raised to its hard limit, which
+    may be the limit being measured.
+
+    Usage::
+
+        $ python -m benchmarks.bench_workers --workers 1 2 4 --clients 4 --connections 200 --duration 5
+        $ python -m benchmarks.bench_workers --workers 1 2 4 --capacity --step 250 --slo 100
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from timeit import default_timer
+
+from tornado import gen
+from tornado.escape import json_encode
+from tornado.ioloop import IOLoop
+from tornado.websocket import websocket_connect
+
+from benchmarks.loadclient import percentile
+from tornado_websockets.tornadowrapper import TornadoWrapper
+from tornado_websockets.websocket import WebSocket
+
+
+def raise_fd_limit():
+    """
+        Raise the soft limit of file descriptors to the hard limit, each connection costs one.
+    """
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def serve(port, workers, reuse_port):
+    raise_fd_limit()
+    ws = WebSocket('/bench_workers')
+
+    @ws.on
+    def echo(socket, data):
+        socket.emit('echo', data)
+
+    if workers != 1:
+        TornadoWrapper.fork(port, workers, reuse_port)
+
+    TornadoWrapper.start_app()
+    TornadoWrapper.listen(port)
+    TornadoWrapper.loop()
+
+
+@gen.coroutine
+def client_connection(url, deadline, message, results):
+    start = time.time()
+    connection = yield websocket_connect(url)
+    results['handshake'] += time.time() - start
+
+    while time.time() < deadline:
+        connection.write_message(message)
+        yield connection.read_message()
+        results['messages'] += 1
+
+    connection.close()
+
+
+@gen.coroutine
+def client(url, connections, duration):
+    results = {'handshake': 0, 'messages': 0}
+    message = json_encode({'event': 'echo', 'data': {'message': 'x' * 64}})
+    deadline = time.time() + duration
+
+    yield [client_connection(url, deadline, message, results) for _ in range(connections)]
+
+    raise gen.Return(results)
+
+
+def run_client(url, connections, duration, queue):
+    queue.put(IOLoop.current().run_sync(lambda: client(url, connections, duration)))
+
+
+@gen.coroutine
+def echo_round_trip(connection, message, timeout):
+    start = default_timer()
+    connection.write_message(message)
+    response = yield gen.with_timeout(timedelta(seconds=timeout), connection.read_message())
+
+    if response is None:
+        raise RuntimeError('connection closed by the server')
+
+    raise gen.Return(default_timer() - start)
+
+
+@gen.coroutine
+def ramp(url, connections, count, message, timeout):
+    """
+        Open ``count`` more connections, kept in ``connections``, then send one ``echo`` event on every held
+        connection at the same time. Return the round trips, or the first error.
+    """
+
+    try:
+        for _ in range(count):
+            connection = yield gen.with_timeout(timedelta(seconds=timeout), websocket_connect(url))
+            connections.append(connection)
+
+        latencies = yield [echo_round_trip(connection, message, timeout) for connection in connections]
+    except Exception as e:
+        raise gen.Return({'held': len(connections), 'error': '%s: %s' % (type(e).__name__, e)})
+
+    raise gen.Return({'held': len(connections), 'latencies': latencies, 'error': None})
+
+
+def run_capacity_client(url, pipe, timeout):
+    """
+        Client process of ``--capacity``: each number of connections received from ``pipe`` is a round, its result
+        is sent back. Connections stay open between rounds, until ``None`` is received.
+    """
+
+    raise_fd_limit()
+    io_loop = IOLoop.current()
+    connections = []
+    message = json_encode({'event': 'echo', 'data': {'message': 'x' * 64}})
+
+    for count in iter(pipe.recv, None):
+        pipe.send(io_loop.run_sync(lambda: ramp(url, connections, count, message, timeout)))
+
+    for connection in connections:
+        connection.close()
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return
+        except socket.error:
+            time.sleep(.1)
+
+    raise RuntimeError('Server did not start on port %d.' % port)
+
+
+def start_server(args, workers, port):
+    command = [sys.executable, '-m', 'benchmarks.bench_workers', '--serve', '--port', str(port), '--workers',
+               str(workers)] + (['--reuse-port'] if args.reuse_port else [])
+    server = subprocess.Popen(command, preexec_fn=os.setsid)
+
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        stop_server(server)
+        raise
+
+    time.sleep(.5)  # let every worker start its IOLoop
+
+    return server
+
+
+def stop_server(server):
+    # Kill the supervisor and its workers
+    os.killpg(server.pid, signal.SIGTERM)
+    server.wait()
+
+
+def measure(args, workers, port):
+    server = start_server(args, workers, port)
+
+    try:
+        url = 'ws://127.0.0.1:%d/ws/bench_workers' % port
+        queue = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=run_client, args=(url, args.connections, args.duration, queue))
+            for _ in range(args.clients)
+        ]
+
+        for process in clients:
+            process.start()
+
+        results = [queue.get() for _ in clients]
+
+        for process in clients:
+            process.join()
+    finally:
+        stop_server(server)
+
+    connections = args.clients * args.connections
+    handshake = sum(result['handshake'] for result in results) / connections
+    messages = sum(result['messages'] for result in results) / float(args.duration)
+
+    return connections, handshake, messages
+
+
+def ramp_rounds(args, pipes):
+    """
+        Run rounds until a connection fails, the SLO is exceeded or ``--max-connections`` are held. Return the
+        number of connections held within the SLO, the p99 round trip of the last round within the SLO, and why
+        the ramp stopped.
+    """
+
+    held, p99 = 0, None
+
+    while held < args.max_connections:
+        for pipe in pipes:
+            pipe.send(args.step)
+
+        results = [pipe.recv() for pipe in pipes]
+        errors = [result['error'] for result in results if result['error']]
+
+        if errors:
+            return held, p99, errors[0]
+
+        round_p99 = percentile(sum((result['latencies'] for result in results), []), 99)
+
+        if round_p99 * 1e3 > args.slo:
+            return held, p99, 'p99 of %.1f ms at %d connections' % (round_p99 * 1e3, held + args.step * len(pipes))
+
+        held, p99 = sum(result['held'] for result in results), round_p99
+
+    return held, p99, 'max connections'
+
+
+def capacity(args, workers, port):
+    server = start_server(args, workers, port)
+    pipes, clients = [], []
+
+    try:
+        url = 'ws://127.0.0.1:%d/ws/bench_workers' % port
+
+        for _ in range(args.clients):
+            pipe, client_pipe = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_capacity_client, args=(url, client_pipe, args.timeout))
+            process.start()
+            pipes.append(pipe)
+            clients.append(process)
+
+        return ramp_rounds(args, pipes)
+    finally:
+        for pipe in pipes:
+            pipe.send(None)
+
+        for process in clients:
+            process.join()
+
+        stop_server(server)
+
+
+def main_capacity(args):
+    print('clients: %d processes, +%d connections each per round, SLO: p99 round trip under %d ms' % (
+        args.clients, args.step, args.slo))
+    print('%8s %10s %10s  %s' % ('workers', 'max held', 'p99 (ms)', 'stopped by'))
+
+    for index, workers in enumerate(args.workers):
+        held, p99, reason = capacity(args, workers, args.port + index)
+        print('%8d %10d %10s  %s' % (workers, held, '%.1f' % (p99 * 1e3) if p99 is not None else '-', reason))
+
+
+def main(args):
+    if args.capacity:
+        main_capacity(args)
+        return
+
+    print('clients: %d processes x %d connections, %ds per run' % (args.clients, args.connections, args.duration))
+    print('%8s %12s %16s %14s' % ('workers', 'connections', 'handshake (ms)', 'messages/s'))
+
+    for index, workers in enumerate(args.workers):
+        connections, handshake, messages = measure(args, workers, args.port + index)
+        print('%8d %12d %16.2f %14.0f' % (workers, connections, handshake * 1e3, messages))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=4, help='number of client processes')
+    parser.add_argument('--connections', type=int, default=100, help='connections per client process')
+    parser.add_argument('--duration', type=int, default=5, help='seconds of echo traffic per run')
+    parser.add_argument('--capacity', action='store_true', help='ramp connections up to the SLO')
+    parser.add_argument('--step', type=int, default=100, help='connections opened per client process per round')
+    parser.add_argument('--slo', type=int, default=100, help='maximum p99 round trip in milliseconds')
+    parser.add_argument('--max-connections', type=int, default=100000, dest='max_connections')
+    parser.add_argument('--timeout', type=int, default=10, help='seconds before a handshake or an echo fails')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--reuse-port', action='store_true', dest='reuse_port')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        serve(arguments.port, arguments.workers[0], arguments.reuse_port)
+    else:
+        main(arguments)
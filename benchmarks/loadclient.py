@@ -0,0 +1,123 @@
+# coding: utf-8
+
+"""
+    Local load client of the benchmark suite: opens many WebSocket connections from the process running the server
+    and records when each message arrives.
+"""
+
+from timeit import default_timer
+
+from tornado import gen
+from tornado.concurrent import Future
+
+
+def percentile(values, percent):
+    """
+        Return the ``percent`` percentile of ``values`` (nearest rank), ``None`` if there is no value.
+
+        :param values: measured values
+        :param percent: percentile, between ``0`` and ``100``
+        :type values: list
+        :type percent: float
+        :rtype: float
+    """
+
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = int(round(percent / 100.0 * (len(values) - 1)))
+
+    return values[rank]
+
+
+class LoadClient(object):
+    """
+        Many connections to a WebSocket, opened with ``connect`` (like :meth:`WebSocketBaseTestCase.ws_connect()
+        <tornado_websockets.tests.helpers.WebSocketBaseTestCase.ws_connect>`).
+
+        Arrival times of received messages are recorded in ``arrivals``, with :func:`timeit.default_timer`.
+
+        :param connect: coroutine called with a path and keyword arguments of ``websocket_connect``
+        :param concurrency: number of connections opened at the same time
+        :type connect: callable
+        :type concurrency: int
+    """
+
+    def __init__(self, connect, concurrency=100):
+        self.connect = connect
+        self.concurrency = concurrency
+        self.connections = []
+        self.arrivals = []
+        self.error = None
+        self._expected = 0
+        self._done = None
+
+    @gen.coroutine
+    def open(self, path, count):
+        """
+            Open ``count`` connections, stops at the first connection which can not be opened (its error is kept in
+            ``error``).
+
+            :return: number of open connections
+            :rtype: int
+        """
+
+        while len(self.connections) < count and self.error is None:
+            wave = min(self.concurrency, count - len(self.connections))
+            futures = [self.connect(path, on_message_callback=self.on_message) for _ in range(wave)]
+
+            for future in futures:
+                try:
+                    self.connections.append((yield future))
+                except Exception as e:
+                    self.error = '%s: %s' % (e.__class__.__name__, e)
+
+        raise gen.Return(len(self.connections))
+
+    def on_message(self, message):
+        if message is None:
+            # Connection closed
+            return
+
+        self.arrivals.append(default_timer())
+
+        if self._done is not None and len(self.arrivals) >= self._expected:
+            done, self._done = self._done, None
+            done.set_result(None)
+
+    def expect(self, count):
+        """
+            Return a future resolved when ``count`` more messages are received, by all connections together.
+
+            :param count: number of messages
+            :type count: int
+            :rtype: tornado.concurrent.Future
+        """
+
+        done = Future()
+
+        if count <= 0:
+            done.set_result(None)
+        else:
+            self._expected = len(self.arrivals) + count
+            self._done = done
+
+        return done
+
+    def reset(self):
+        """
+            Forget recorded arrival times.
+        """
+
+        self.arrivals = []
+
+    def close(self):
+        """
+            Close every connection.
+        """
+
+        for connection in self.connections:
+            connection.close()
+
+        self.connections = []
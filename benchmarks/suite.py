@@ -0,0 +1,369 @@
+# coding: utf-8
+
+"""
+    Load-testing benchmark suite: connections, broadcast fan-out, dispatch and progress bar throughput.
+
+    Each scenario is a ``bench_*`` method of :class:`LoadTestCase`, a
+    :class:`~tornado_websockets.tests.helpers.WebSocketBaseTestCase` whose connections are opened by a local load
+    client (see :mod:`benchmarks.loadclient`) running in the server process, so results include the client side:
+
+    - ``connections``: concurrent connections a process can hold (up to ``--max-connections`` or the file
+      descriptors limit), how fast they are opened and the memory they cost,
+    - ``fanout``: latency (p50, p99, max) between an emit and its arrival on each client, for ``--fanout`` clients,
+    - ``dispatch``: messages per second handled by ``on_message`` for ``--senders`` clients,
+    - ``progressbar``: ticks per second of a :class:`~tornado_websockets.modules.ProgressBar` watched by
+      ``--watchers`` clients.
+
+    Results are written as JSON, and compared to a previous run with ``--compare``: the exit status is ``1`` if a
+    result is worse by more than ``--tolerance`` percent.
+
+    Usage::
+
+        $ python -m benchmarks.suite --output before.json
+        $ python -m benchmarks.suite --output after.json --compare before.json
+        $ python -m benchmarks.suite --scenarios fanout --fanout 1000 10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import platform
+import resource
+import sys
+import unittest
+from timeit import default_timer
+
+import tornado
+import tornado.web
+from mock import patch
+from tornado import gen
+from tornado.testing import gen_test
+
+import tornado_websockets
+from benchmarks.loadclient import LoadClient, percentile
+from tornado_websockets.modules import ProgressBar
+from tornado_websockets.tests.helpers import WebSocketBaseTestCase
+from tornado_websockets.websocket import WebSocket
+from tornado_websockets.websockethandler import WebSocketHandler
+
+SCENARIOS = ('connections', 'fanout', 'dispatch', 'progressbar')
+
+# File descriptors kept for the server socket, logs, ...
+RESERVED_FDS = 64
+
+# Seconds, opening 10k connections takes a while
+TIMEOUT = 1800
+
+
+def connection_limit():
+    """
+        Raise the soft limit of file descriptors to the hard limit, and return how many connections the load client
+        can open: each one costs two descriptors, the client one and the server one.
+
+        :rtype: int
+    """
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+
+    return max(0, (soft - RESERVED_FDS) // 2)
+
+
+def max_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def milliseconds(value):
+    return round(value * 1e3, 3) if value is not None else None
+
+
+class LoadTestCase(WebSocketBaseTestCase):
+    """
+        Scenarios of the suite, they store their results in ``results`` (indexed by scenario) instead of asserting.
+    """
+
+    options = None
+    results = {}
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def get_app(self, add_handler):
+        self.ws = WebSocket('/load')
+        self.received = 0
+
+        # Its « open » hook broadcasts to every client, it would slow down other scenarios
+        self.progress_ws = WebSocket('/progress')
+        self.progressbar = ProgressBar('load', min=0, max=self.options.ticks)
+        self.progress_ws.bind(self.progressbar)
+
+        @self.ws.on
+        def message(socket, data):
+            self.received += 1
+
+        @self.ws.on
+        def ping(socket, data):
+            socket.emit('pong', {})
+
+        return tornado.web.Application([
+            ('/ws/load', WebSocketHandler, {'websocket': self.ws}),
+            ('/ws/progress', WebSocketHandler, {'websocket': self.progress_ws}),
+        ])
+
+    @gen.coroutine
+    def open(self, count, ws=None):
+        """
+            Open ``count`` connections to ``ws`` (``self.ws`` by default) with a load client, and wait for the server
+            to register them.
+        """
+
+        ws = ws or self.ws
+        client = LoadClient(self.ws_connect, self.options.concurrency)
+        yield client.open('/ws' + ws.path, count)
+
+        while ws.handlers.count() < len(client.connections):
+            yield gen.sleep(0.01)
+
+        raise gen.Return(client)
+
+    @gen.coroutine
+    def close(self, client, ws=None):
+        ws = ws or self.ws
+        client.close()
+
+        while ws.handlers.count():
+            yield gen.sleep(0.01)
+
+    @gen_test(timeout=TIMEOUT)
+    def bench_connections(self):
+        limit = connection_limit()
+        count = min(self.options.max_connections, limit)
+        rss = max_rss_kb()
+
+        start = default_timer()
+        client = yield self.open(count)
+        elapsed = default_timer() - start
+        opened = len(client.connections)
+
+        self.results['connections'] = {
+            'connections': opened,
+            'limit': limit,
+            'error': client.error,
+            'seconds': round(elapsed, 3),
+            'connections_per_second': round(opened / elapsed, 1) if elapsed else None,
+            'rss_kb_per_connection': round(float(max_rss_kb() - rss) / opened, 2) if opened else None,
+        }
+
+        yield self.close(client)
+
+    @gen_test(timeout=TIMEOUT)
+    def bench_fanout(self):
+        results = self.results['fanout'] = {}
+        limit = connection_limit()
+
+        for clients in self.options.fanout:
+            if clients > limit:
+                results[str(clients)] = {'skipped': 'only %d connections allowed by file descriptors limit' % limit}
+                continue
+
+            client = yield self.open(clients)
+            latencies = []
+
+            # Warm up
+            self.ws.emit('fanout', {})
+            yield client.expect(clients)
+
+            for i in range(self.options.broadcasts):
+                client.reset()
+                received = client.expect(clients)
+                start = default_timer()
+                self.ws.emit('fanout', {'broadcast': i})
+                yield received
+                latencies.extend(arrival - start for arrival in client.arrivals)
+
+            results[str(clients)] = {
+                'clients': len(client.connections),
+                'broadcasts': self.options.broadcasts,
+                'latency_p50_ms': milliseconds(percentile(latencies, 50)),
+                'latency_p99_ms': milliseconds(percentile(latencies, 99)),
+                'latency_max_ms': milliseconds(max(latencies)),
+            }
+
+            yield self.close(client)
+
+    @gen_test(timeout=TIMEOUT)
+    def bench_dispatch(self):
+        senders = self.options.senders
+        count = self.options.messages
+        client = yield self.open(senders)
+        message = json.dumps({'event': 'message', 'data': {'username': 'bench', 'message': 'hello'}})
+        ping = json.dumps({'event': 'ping'})
+
+        # Each client waits for the « pong » of its « ping », sent after all its messages
+        pongs = client.expect(senders)
+        start = default_timer()
+
+        for connection in client.connections:
+            for _ in range(count):
+                connection.write_message(message)
+
+            connection.write_message(ping)
+
+        yield pongs
+        elapsed = default_timer() - start
+
+        self.results['dispatch'] = {
+            'senders': senders,
+            'messages': self.received,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(self.received / elapsed, 1),
+        }
+
+        yield self.close(client)
+
+    @gen_test(timeout=TIMEOUT)
+    def bench_progressbar(self):
+        watchers = self.options.watchers
+        ticks = self.options.ticks
+        client = yield self.open(watchers, self.progress_ws)
+
+        # The « open » hook of the progress bar broadcasts 3 events to the clients connected so far
+        while len(client.arrivals) < 3 * watchers * (watchers + 1) // 2:
+            yield gen.sleep(0.01)
+
+        client.reset()
+
+        # Each tick emits 3 events, and the last one emits « done » too
+        events = (3 * ticks + 1) * watchers
+        received = client.expect(events)
+        start = default_timer()
+
+        for _ in range(ticks):
+            self.progressbar.tick()
+
+        yield received
+        elapsed = default_timer() - start
+
+        self.results['progressbar'] = {
+            'watchers': watchers,
+            'ticks': ticks,
+            'seconds': round(elapsed, 3),
+            'ticks_per_second': round(ticks / elapsed, 1),
+            'events_per_second': round(events / elapsed, 1),
+        }
+
+        yield self.close(client, self.progress_ws)
+
+
+def flatten(results, prefix=''):
+    values = {}
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+
+    return values
+
+
+# Compared results, parameters of scenarios (number of clients, ...) are not
+HIGHER_IS_BETTER = ('_per_second', 'connections.connections')
+LOWER_IS_BETTER = ('_ms', '_per_connection')
+
+
+def compare(previous, current, tolerance):
+    """
+        Print the change of each result between two runs.
+
+        :return: names of results worse by more than ``tolerance`` percent
+        :rtype: list
+    """
+
+    before, after = flatten(previous['results']), flatten(current['results'])
+    regressions = []
+
+    print()
+    print('%-40s %14s %14s %9s' % ('result', 'previous', 'current', 'change'))
+
+    for name in sorted(set(before) & set(after)):
+        lower_is_better = name.endswith(LOWER_IS_BETTER)
+
+        if not before[name] or not (lower_is_better or name.endswith(HIGHER_IS_BETTER)):
+            continue
+
+        change = 100.0 * (after[name] - before[name]) / before[name]
+        worse = change > tolerance if lower_is_better else change < -tolerance
+
+        if worse:
+            regressions.append(name)
+
+        print('%-40s %14s %14s %+8.1f%%%s' % (
+            name, before[name], after[name], change, '  REGRESSION' if worse else ''
+        ))
+
+    return regressions
+
+
+def main(args):
+    LoadTestCase.options = args
+    LoadTestCase.results = {}
+
+    suite = unittest.TestSuite(LoadTestCase('bench_' + scenario) for scenario in args.scenarios)
+    outcome = unittest.TextTestRunner(verbosity=2).run(suite)
+
+    document = {
+        'date': datetime.datetime.now().isoformat(),
+        'version': tornado_websockets.__version__,
+        'python': platform.python_version(),
+        'tornado': tornado.version,
+        'platform': platform.platform(),
+        'options': dict((key, value) for key, value in vars(args).items() if key not in ('output', 'compare')),
+        'results': LoadTestCase.results,
+    }
+
+    print(json.dumps(document['results'], indent=2, sort_keys=True))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(document, output, indent=2, sort_keys=True)
+
+    if not outcome.wasSuccessful():
+        return 2
+
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(json.load(previous), document, args.tolerance)
+
+        if regressions:
+            print('\n%d regression(s) above %g%%: %s' % (len(regressions), args.tolerance, ', '.join(regressions)))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--output', help='JSON file where results are written')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare results with')
+    parser.add_argument('--tolerance', type=float, default=10, help='allowed change in percent before a regression')
+    parser.add_argument('--concurrency', type=int, default=100, help='connections opened at the same time')
+    parser.add_argument('--max-connections', type=int, default=10000, help='connections of « connections »')
+    parser.add_argument('--fanout', type=int, nargs='+', default=[1000, 10000], help='clients of « fanout »')
+    parser.add_argument('--broadcasts', type=int, default=20, help='broadcasts per « fanout » run')
+    parser.add_argument('--senders', type=int, default=10, help='clients of « dispatch »')
+    parser.add_argument('--messages', type=int, default=5000, help='messages per client of « dispatch »')
+    parser.add_argument('--watchers', type=int, default=100, help='clients of « progressbar »')
+    parser.add_argument('--ticks', type=int, default=200, help='ticks of « progressbar »')
+
+    sys.exit(main(parser.parse_args()))
@@ -18,8 +18,15 @@ setup(
         'Django>=1.8',
         'tornado>=4.3',
         'six>=1.10',
+        'futures>=3.0; python_version < "3"',
     ],
-    packages=find_packages(exclude=['node_modules', 'bower_components', '.idea']),
+    extras_require={
+        'msgpack': ['msgpack>=0.5'],
+        'cbor': ['cbor2>=4.0'],
+        'orjson': ['orjson>=3.0'],
+        'ujson': ['ujson>=2.0'],
+    },
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*', 'node_modules', 'bower_components', '.idea']),
     include_package_data=True,
     license='GPLv3 License',
     classifiers=[
@@ -7,10 +7,16 @@
 
 from django.views.generic import TemplateView
 
+from tornado_websockets.modules import History
 from tornado_websockets.websocket import WebSocket
 
 tws = WebSocket('/my_chat')
 
+# The last 100 messages of the last hour, replayed when a client joins the chat, one frame per message for the
+# stock dtws-client which does not read batch frames
+history = History(size=100, max_age=3600, replay_on_open=False, batch_replay=False)
+tws.bind(history)
+
 
 class MyChat(TemplateView):
     """
@@ -18,7 +24,6 @@ class MyChat(TemplateView):
     """
 
     template_name = 'testapp/index.html'
-    messages = []
 
     def __init__(self, **kwargs):
         super(MyChat, self).__init__(**kwargs)
@@ -28,8 +33,8 @@ class MyChat(TemplateView):
 
     @tws.on
     def connection(self, socket, data):
-        # Send an history of the chat
-        [socket.emit('new_message', __) for __ in self.messages]
+        # Send the history of the chat, or the messages after « since » for a reconnecting client
+        history.replay(socket, data.get('since'))
         tws.emit('new_connection', '%s just joined the webchat.' % data.get('username', '<Anonymous>'))
 
     @tws.on
@@ -39,8 +44,7 @@ class MyChat(TemplateView):
             'message': data.get('message', 'Empty message')
         }
 
-        tws.emit('new_message', message)
-        self.messages.append(message)
+        history.publish('new_message', message)
 
     @tws.on
     def clear_history(self, socket, data):
@@ -49,4 +53,4 @@ class MyChat(TemplateView):
             Used only for client-side JavaScript unit tests
         """
 
-        self.messages = []
+        history.clear()
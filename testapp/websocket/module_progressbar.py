@@ -23,11 +23,11 @@ def reset():
 
 
 @progressbar.on
-@gen.engine  # Make this function asynchronous for Tornado's IOLoop
+@gen.coroutine  # Make this function asynchronous for Tornado's IOLoop
 def start():
     for value in range(0, progressbar.max):
         yield gen.sleep(.1)  # like time.sleep(), but asynchronous
-        progressbar.tick(label="[%d/%d] Tâche %d terminée" % (progress_bar.current + 1, progress_bar.max, value))
+        progressbar.tick(label="[%d/%d] Tâche %d terminée" % (progressbar.current + 1, progressbar.max, value))
 
 
 class MyProgressBar(TemplateView):
@@ -3,12 +3,41 @@ __version__ = '.'.join(__version_info__)
 
 
 def django_app():
+    """
+        Tornado handler running Django views on the IOLoop, with ``runtornado --watchdog`` a view blocking the IOLoop
+        is logged, see :class:`~tornado_websockets.watchdog.Watchdog`.
+    """
     import django.core.handlers.wsgi
     import tornado.wsgi
 
+    from tornado_websockets.watchdog import WatchedWSGIApplication
+
+    django.setup()
+
+    app = tornado.wsgi.WSGIContainer(WatchedWSGIApplication(django.core.handlers.wsgi.WSGIHandler()))
+    app = ('.*', tornado.web.FallbackHandler, dict(fallback=app))
+
+    return app
+
+
+def threaded_django_app(threads=None, queue=None):
+    """
+        Like :func:`django_app`, but Django views run in a pool of threads so they never block the IOLoop and a
+        ``503 Service Unavailable`` is returned when the pool and its queue are full.
+
+        :param threads: size of the thread pool, ``TORNADO['wsgi_threads']`` (10) by default
+        :param queue: number of requests which can wait for a thread, ``TORNADO['wsgi_queue']`` (100) by default
+        :type threads: int
+        :type queue: int
+    """
+    import django
+    import tornado.web
+
+    from tornado_websockets.wsgi import DjangoWSGIContainer
+
     django.setup()
 
-    app = tornado.wsgi.WSGIContainer(django.core.handlers.wsgi.WSGIHandler())
+    app = DjangoWSGIContainer(threads, queue)
     app = ('.*', tornado.web.FallbackHandler, dict(fallback=app))
 
     return app
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+"""
+    Admission control: limits on the number of connections, checked before the WebSocket handshake.
+"""
+
+import tornado.web
+
+
+class Admission(object):
+    """
+        Counts connections and rejects new ones above a maximum, in total and per remote IP. Used for the whole
+        process (see :attr:`TornadoWrapper.admission <tornado_websockets.tornadowrapper.TornadoWrapper.admission>`)
+        and for each :class:`~tornado_websockets.websocket.WebSocket` with admission settings.
+
+        Connections are counted from the ``connect`` hooks until they are closed, so handshakes in progress count
+        too. Checking and counting a connection costs a few dictionary operations.
+
+        Statistics:
+
+        - ``connections``: number of counted connections,
+        - ``per_ip``: number of counted connections by remote IP,
+        - ``rejected``: number of rejected connections.
+
+        :param max_connections: maximum number of connections, ``None`` for no limit
+        :param max_per_ip: maximum number of connections from the same remote IP, ``None`` for no limit
+        :type max_connections: int
+        :type max_per_ip: int
+    """
+
+    def __init__(self, max_connections=None, max_per_ip=None):
+        if max_connections is not None and max_connections < 1:
+            raise ValueError('Param « max_connections » should be at least 1, got %r.' % max_connections)
+
+        if max_per_ip is not None and max_per_ip < 1:
+            raise ValueError('Param « max_per_ip » should be at least 1, got %r.' % max_per_ip)
+
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.connections = 0
+        self.per_ip = {}
+        self.rejected = 0
+
+    def admit(self, ip):
+        """
+            Count a new connection from ``ip``, or reject it if a maximum is reached.
+
+            :param ip: remote IP of the client
+            :type ip: str
+            :raise: ``tornado.web.HTTPError`` (503) above ``max_connections``, (429) above ``max_per_ip``.
+        """
+
+        if self.max_connections is not None and self.connections >= self.max_connections:
+            self.rejected += 1
+            raise tornado.web.HTTPError(503, 'Too many connections.')
+
+        count = self.per_ip.get(ip, 0)
+
+        if self.max_per_ip is not None and count >= self.max_per_ip:
+            self.rejected += 1
+            raise tornado.web.HTTPError(429, 'Too many connections from %s.' % ip)
+
+        self.connections += 1
+        self.per_ip[ip] = count + 1
+
+    def release(self, ip):
+        """
+            Forget a connection counted by :meth:`admit`.
+
+            :param ip: remote IP of the client
+            :type ip: str
+        """
+
+        count = self.per_ip.get(ip)
+
+        if count is None:
+            return
+
+        self.connections -= 1
+
+        if count > 1:
+            self.per_ip[ip] = count - 1
+        else:
+            del self.per_ip[ip]
+
+    def __repr__(self):
+        return '<Admission: %d connection(s), %d rejected>' % (self.connections, self.rejected)
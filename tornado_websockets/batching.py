@@ -0,0 +1,143 @@
+# coding: utf-8
+
+"""
+    Server-side batching: messages emitted to a client during one IOLoop iteration (or a time window) are sent in a
+    single frame.
+"""
+
+import tornado.ioloop
+import tornado.websocket
+
+from .frame import build_frame
+
+
+class Batcher(object):
+    """
+        Gathers messages sent to the clients of a :class:`~tornado_websockets.websocket.WebSocket`, then sends to
+        each client one frame holding the array of its messages, serialized by the codec of the client (see
+        :meth:`Codec.join() <tornado_websockets.codec.Codec.join>`).
+
+        Messages are flushed at the next IOLoop iteration if ``window`` is ``0``, otherwise ``window`` seconds after
+        the first message. A client which received only one message gets it as usual, not in an array. Clients which
+        received the same messages share the same frame.
+
+        Statistics:
+
+        - ``messages``: number of messages sent,
+        - ``frames``: number of frames sent, so ``messages - frames`` frames were saved,
+        - ``average_latency``: average delay in seconds between the first message of a flush and the flush.
+
+        :param window: time window in seconds, ``0`` for one IOLoop iteration
+        :param compression: compression settings of the WebSocket, identical batches are compressed once
+        :type window: float
+        :type compression: tornado_websockets.compression.Compression
+    """
+
+    def __init__(self, window=0, compression=None):
+        if window < 0:
+            raise ValueError('Batch window can not be negative, got %r.' % window)
+
+        self.window = window
+        self.compression = compression
+        self.pending = {}
+        self.started_at = None
+        self.messages = 0
+        self.frames = 0
+        self.flushes = 0
+        self.latency = 0.0
+
+    @property
+    def average_latency(self):
+        """
+            Average delay in seconds between the first message of a flush and the flush.
+
+            :rtype: float
+        """
+
+        return self.latency / self.flushes if self.flushes else 0.0
+
+    def add(self, handler, payload):
+        """
+            Add a message to the next batch of ``handler``.
+
+            :param handler: client
+            :param payload: encoded message
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+            :type payload: bytes
+        """
+
+        messages = self.pending.get(handler)
+
+        if messages is None:
+            if not self.pending:
+                self.schedule()
+
+            messages = self.pending[handler] = []
+
+        messages.append(payload)
+
+    def schedule(self):
+        io_loop = tornado.ioloop.IOLoop.current()
+        self.started_at = io_loop.time()
+
+        if self.window:
+            io_loop.call_later(self.window, self.flush)
+        else:
+            io_loop.add_callback(self.flush)
+
+    def flush(self):
+        """
+            Send pending messages, one frame per client.
+        """
+
+        pending, self.pending = self.pending, {}
+
+        if not pending:
+            return
+
+        if self.compression is None:
+            self.send_frames(pending)
+        else:
+            with self.compression.sharing():
+                self.send_frames(pending)
+
+        self.flushes += 1
+        self.latency += tornado.ioloop.IOLoop.current().time() - self.started_at
+
+    def send_frames(self, pending):
+        """
+            Send the pending messages of each client in one frame.
+        """
+
+        # Messages are shared by the clients of a broadcast, so identical batches are found by their messages ids
+        frames = {}
+
+        for handler, payloads in pending.items():
+            codec = handler.codec
+            key = (codec,) + tuple(id(payload) for payload in payloads)
+            cached = frames.get(key)
+
+            if cached is None:
+                payload = payloads[0] if len(payloads) == 1 else codec.join(payloads)
+                cached = frames[key] = (payload, build_frame(payload, codec.opcode))
+
+            try:
+                handler.outbound.send(cached[0], cached[1])
+            except tornado.websocket.WebSocketClosedError:
+                continue
+
+            self.messages += len(payloads)
+            self.frames += 1
+
+    def discard(self, handler):
+        """
+            Forget pending messages of a closed client.
+
+            :param handler: client
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        self.pending.pop(handler, None)
+
+    def __repr__(self):
+        return '<Batcher: %d message(s) in %d frame(s)>' % (self.messages, self.frames)
@@ -0,0 +1,612 @@
+# coding: utf-8
+
+"""
+    Broadcast backends, used by :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` to reach
+    clients connected to other processes.
+"""
+
+import abc
+import errno
+import functools
+import logging
+import os
+import socket
+import stat
+import struct
+import tempfile
+import time
+from collections import deque
+
+import six
+import tornado.ioloop
+
+logger = logging.getLogger(__name__)
+
+# A batch is an origin id and flags followed by records, a record is a header followed by path, room, event and
+# payload. A record larger than the limit of the bus is split in several messages, flagged with MORE but the last.
+ORIGIN_SIZE = 8
+BATCH_HEADER = struct.Struct('!%dsB' % ORIGIN_SIZE)
+RECORD_HEADER = struct.Struct('!HHHI')
+NO_VALUE = 0xFFFF
+MORE = 0x01
+
+
+def _encode_optional(value):
+    if value is None:
+        return b'', NO_VALUE
+
+    value = value.encode('utf-8')
+    return value, len(value)
+
+
+def encode_record(path, room, payload, event=None):
+    """
+        Serialize a published message to a bus record.
+
+        :param path: path of the WebSocket
+        :param room: room name, or ``None`` for every client
+        :param payload: encoded message
+        :param event: event name of the message, or ``None``
+        :type path: str
+        :type room: str
+        :type payload: bytes
+        :type event: str
+        :rtype: bytes
+    """
+
+    path = path.encode('utf-8')
+    room, room_length = _encode_optional(room)
+    event, event_length = _encode_optional(event)
+
+    return RECORD_HEADER.pack(len(path), room_length, event_length, len(payload)) + path + room + event + payload
+
+
+def encode_batch(origin, records):
+    """
+        Serialize published messages to a single bus message.
+
+        :param origin: id of the publishing backend
+        :param records: list of ``(path, room, payload, event)``, ``room`` and ``event`` can be ``None``
+        :type origin: bytes
+        :type records: list
+        :rtype: bytes
+    """
+
+    return BATCH_HEADER.pack(origin, 0) + b''.join(encode_record(*record) for record in records)
+
+
+def decode_batch(message):
+    """
+        Deserialize a bus message built by :func:`encode_batch`.
+
+        :param message: bus message
+        :type message: bytes
+        :return: ``(origin, records)``
+        :rtype: tuple
+        :raise: ``ValueError`` if the message is truncated or malformed.
+    """
+
+    if len(message) < BATCH_HEADER.size:
+        raise ValueError('Bus message of %d bytes is too short.' % len(message))
+
+    origin, flags = BATCH_HEADER.unpack_from(message)
+
+    if flags & MORE:
+        raise ValueError('Bus message of %d bytes is a part of a larger message.' % len(message))
+
+    offset = BATCH_HEADER.size
+    records = []
+
+    while offset < len(message):
+        if offset + RECORD_HEADER.size > len(message):
+            raise ValueError('Bus message of %d bytes is truncated.' % len(message))
+
+        lengths = RECORD_HEADER.unpack_from(message, offset)
+        offset += RECORD_HEADER.size
+
+        if offset + sum(length for length in lengths[:3] if length != NO_VALUE) + lengths[3] > len(message):
+            raise ValueError('Bus message of %d bytes is truncated.' % len(message))
+
+        values = []
+
+        for length in lengths[:3]:
+            if length == NO_VALUE:
+                values.append(None)
+            else:
+                values.append(message[offset:offset + length].decode('utf-8'))
+                offset += length
+
+        path, room, event = values
+        records.append((path, room, message[offset:offset + lengths[3]], event))
+        offset += lengths[3]
+
+    return origin, records
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BroadcastBackend(object):
+    """
+        Base class of broadcast backends.
+
+        :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` publishes each encoded message through
+        the backend of :class:`~tornado_websockets.tornadowrapper.TornadoWrapper`, which delivers it to the clients
+        of the current process and, depending on the backend, to the other processes.
+    """
+
+    # True when publish() only reaches the current process, so there is nothing to publish without local clients
+    local = False
+
+    def __init__(self):
+        self.websockets = {}
+
+    def start(self, websockets):
+        """
+            Called by :meth:`TornadoWrapper.loop() <tornado_websockets.tornadowrapper.TornadoWrapper.loop>` in each
+            process (so after a fork), before its IOLoop starts.
+
+            :param websockets: WebSocket instances indexed by their path
+            :type websockets: dict
+        """
+
+        self.websockets = websockets
+
+    def stop(self):
+        """
+            Release resources used by the backend.
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def publish(self, websocket, room, payload, event=None):
+        """
+            Publish an encoded message for every client of ``websocket`` (or of one of its rooms).
+
+            :param websocket: WebSocket which emits the message
+            :param room: room name, or ``None`` for every client
+            :param payload: encoded message
+            :param event: event name of the message, used to coalesce messages of slow clients
+            :type websocket: tornado_websockets.websocket.WebSocket
+            :type room: str
+            :type payload: bytes
+            :type event: str
+        """
+
+        pass
+
+    def deliver(self, path, room, payload, event=None):
+        """
+            Deliver a message received from another process to the clients of this process.
+        """
+
+        websocket = self.websockets.get(path)
+
+        if websocket is not None:
+            websocket.deliver(payload, room, event)
+
+
+class LocalBackend(BroadcastBackend):
+    """
+        In-process backend, messages only reach clients connected to the current process. This is the default
+        backend.
+    """
+
+    local = True
+
+    def publish(self, websocket, room, payload, event=None):
+        websocket.deliver(payload, room, event)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class PubSubAdapter(object):
+    """
+        Interface of a publish/subscribe transport used by :class:`PubSubBackend`, like a Redis channel.
+
+        Messages published by an adapter should be received by the adapters of the other processes, receiving its
+        own messages is allowed.
+    """
+
+    # Maximum size of a message, None if there is no limit. Larger messages are split in several messages, so an
+    # adapter with a limit should deliver the messages of a process in order.
+    max_message_size = None
+
+    @abc.abstractmethod
+    def subscribe(self, callback):
+        """
+            Start receiving messages, ``callback`` should be called on the IOLoop with each received message.
+
+            :param callback: function called with a message (bytes)
+            :type callback: callable
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def publish(self, message):
+        """
+            Send a message to the other processes.
+
+            :param message: message to send
+            :type message: bytes
+        """
+
+        pass
+
+    def close(self):
+        """
+            Stop receiving messages and release resources.
+        """
+
+        pass
+
+
+class PubSubBackend(BroadcastBackend):
+    """
+        Backend publishing messages to other processes through a :class:`PubSubAdapter`.
+
+        Messages are delivered immediately to the clients of the current process. Messages published during the same
+        IOLoop iteration are sent to other processes in a single batch, so a burst of broadcasts only costs one
+        adapter publish. A message larger than the limit of the adapter is split in several adapter publishes.
+
+        :param adapter: transport between processes
+        :type adapter: PubSubAdapter
+    """
+
+    def __init__(self, adapter):
+        super(PubSubBackend, self).__init__()
+
+        self.adapter = adapter
+        self.origin = None
+        self.io_loop = None
+        self._pending = []
+        # Parts of large messages being received, by origin
+        self._parts = {}
+
+    def start(self, websockets):
+        super(PubSubBackend, self).start(websockets)
+
+        # Not in __init__, backends are usually created before forking workers
+        self.origin = os.urandom(ORIGIN_SIZE)
+        self.io_loop = tornado.ioloop.IOLoop.current()
+        self.adapter.subscribe(self.on_message)
+
+    def stop(self):
+        self.flush()
+        self.adapter.close()
+
+    def publish(self, websocket, room, payload, event=None):
+        websocket.deliver(payload, room, event)
+
+        if not self._pending:
+            (self.io_loop or tornado.ioloop.IOLoop.current()).add_callback(self.flush)
+
+        self._pending.append((websocket.path, room, payload, event))
+
+    def flush(self):
+        """
+            Publish pending messages, split in several batches if the adapter limits the size of a message. A
+            message larger than this limit is split in several parts, published after the previous messages.
+        """
+
+        records, self._pending = self._pending, []
+        header = BATCH_HEADER.pack(self.origin, 0)
+        max_size = self.adapter.max_message_size
+        chunks, size = [], len(header)
+
+        for record in records:
+            chunk = encode_record(*record)
+
+            if max_size and len(header) + len(chunk) > max_size:
+                if chunks:
+                    self.adapter.publish(header + b''.join(chunks))
+                    chunks, size = [], len(header)
+
+                self.publish_parts(chunk, max_size - len(header))
+                continue
+
+            if chunks and max_size and size + len(chunk) > max_size:
+                self.adapter.publish(header + b''.join(chunks))
+                chunks, size = [], len(header)
+
+            chunks.append(chunk)
+            size += len(chunk)
+
+        if chunks:
+            self.adapter.publish(header + b''.join(chunks))
+
+    def publish_parts(self, chunk, part_size):
+        for offset in range(0, len(chunk), part_size):
+            flags = MORE if offset + part_size < len(chunk) else 0
+            self.adapter.publish(BATCH_HEADER.pack(self.origin, flags) + chunk[offset:offset + part_size])
+
+    def reassemble(self, message):
+        """
+            Return a received message, or the whole message once its last part is received, ``None`` before.
+        """
+
+        if len(message) < BATCH_HEADER.size:
+            return message
+
+        origin, flags = BATCH_HEADER.unpack_from(message)
+
+        if not flags & MORE and origin not in self._parts:
+            return message
+
+        self._parts.setdefault(origin, []).append(message[BATCH_HEADER.size:])
+
+        if flags & MORE:
+            return None
+
+        return BATCH_HEADER.pack(origin, 0) + b''.join(self._parts.pop(origin))
+
+    def on_message(self, message):
+        message = self.reassemble(message)
+
+        if message is None:
+            return
+
+        try:
+            origin, records = decode_batch(message)
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.error('Broadcast bus: a message was dropped: %s', e)
+            return
+
+        if origin == self.origin:
+            return
+
+        for path, room, payload, event in records:
+            self.deliver(path, room, payload, event)
+
+
+class UnixSocketPubSub(PubSubAdapter):
+    """
+        Adapter sending messages between processes of the same machine with Unix datagram sockets, so it does not
+        need any outside service.
+
+        Each process binds a socket in ``directory``, and publishing a message sends it to every other socket of
+        this directory. Sockets of dead processes are removed.
+
+        Each peer is sent messages through its own connected socket. When a peer is slow and its receive queue is
+        full, messages are queued for this peer and sent when it reads again, in order. At most
+        ``max_queued_bytes`` are queued per peer, older messages are dropped beyond.
+
+        Anyone who can write in ``directory`` can broadcast to every client, so it is created with mode ``0700`` and
+        refused if it is not a directory owned by the current user and only accessible by this user.
+
+        :param directory: directory shared by all processes, created if needed
+        :param rescan_interval: how often (in seconds) the directory is scanned to find new processes
+        :param name: name of the socket of this process, its pid by default
+        :param max_queued_bytes: maximum size of the messages queued for a slow peer
+        :type directory: str
+        :type rescan_interval: float
+        :type name: str
+        :type max_queued_bytes: int
+    """
+
+    max_message_size = 65536
+
+    def __init__(self, directory, rescan_interval=1.0, name=None, max_queued_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.name = name
+        self.max_queued_bytes = max_queued_bytes
+        self.path = None
+        self.socket = None
+        self.io_loop = None
+        self._peers = []
+        self._scanned_at = 0
+        # Connected socket, and queued messages of slow peers with their size, by path
+        self._sockets = {}
+        self._queues = {}
+        self._queued_bytes = {}
+
+    @classmethod
+    def for_port(cls, port):
+        """
+            Return an adapter using a directory in the temporary directory, dedicated to the current user and the
+            given server port.
+        """
+
+        return cls(os.path.join(tempfile.gettempdir(), 'tornado_websockets-%d-%d' % (os.getuid(), port)))
+
+    def check_directory(self):
+        """
+            Create the directory with mode ``0700`` if needed, and check nobody else can use it.
+
+            :raise: ``OSError`` if the directory is not owned by the current user or is accessible by other users.
+        """
+
+        try:
+            os.makedirs(self.directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # lstat(), a symbolic link created by someone else is not followed
+        info = os.lstat(self.directory)
+
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise OSError(errno.EPERM, 'Broadcast bus directory should be owned by the current user with mode 0700',
+                          self.directory)
+
+    def subscribe(self, callback):
+        self.check_directory()
+
+        self.path = os.path.join(self.directory, '%s.sock' % (self.name or os.getpid()))
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.socket.bind(self.path)
+
+        def on_readable(fd, events):
+            while True:
+                try:
+                    message = self.socket.recv(self.max_message_size)
+                except socket.error as e:
+                    if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        return
+                    raise
+
+                callback(message)
+
+        self.io_loop = tornado.ioloop.IOLoop.current()
+        self.io_loop.add_handler(self.socket.fileno(), on_readable, tornado.ioloop.IOLoop.READ)
+
+    def peers(self):
+        """
+            Return paths of the sockets of other processes, the directory is scanned at most every
+            ``rescan_interval`` seconds.
+
+            :rtype: list
+        """
+
+        now = time.time()
+
+        if now - self._scanned_at > self.rescan_interval:
+            self._scanned_at = now
+            self._peers = [
+                os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory))
+                if name.endswith('.sock') and os.path.join(self.directory, name) != self.path
+            ]
+
+            for peer in set(self._sockets) - set(self._peers):
+                self.disconnect(peer)
+
+        return self._peers
+
+    def publish(self, message):
+        # A copy, dead peers are removed from the list
+        for peer in list(self.peers()):
+            if peer in self._queues:
+                # Sent after the messages already queued for this peer
+                self.enqueue(peer, message)
+            else:
+                self.send(peer, message)
+
+    def connect(self, peer):
+        """
+            Return the socket connected to a peer, ``None`` if the peer is dead.
+        """
+
+        peer_socket = self._sockets.get(peer)
+
+        if peer_socket is not None:
+            return peer_socket
+
+        peer_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        peer_socket.setblocking(False)
+
+        try:
+            peer_socket.connect(peer)
+        except socket.error as e:
+            peer_socket.close()
+            self.remove(peer, e)
+            return None
+
+        self._sockets[peer] = peer_socket
+
+        return peer_socket
+
+    def send(self, peer, message):
+        """
+            Send a message to a peer, or queue it if the receive queue of the peer is full. Return ``False`` if it
+            was queued.
+        """
+
+        for _ in range(2):
+            peer_socket = self.connect(peer)
+
+            if peer_socket is None:
+                return True
+
+            try:
+                peer_socket.send(message)
+                return True
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                    self.enqueue(peer, message, front=True)
+                    return False
+
+                # The peer may have been restarted, connect again once
+                self.disconnect(peer)
+
+                if e.args[0] not in (errno.ECONNREFUSED, errno.ENOENT):
+                    logger.error('Broadcast bus: can not send a message to %s: %s.', peer, e)
+                    return True
+
+        return True
+
+    def enqueue(self, peer, message, front=False):
+        queue = self._queues.get(peer)
+
+        if queue is None:
+            queue = self._queues[peer] = deque()
+            self._queued_bytes[peer] = 0
+            on_writable = functools.partial(self.on_writable, peer)
+            self.io_loop.add_handler(self._sockets[peer].fileno(), on_writable, tornado.ioloop.IOLoop.WRITE)
+
+        if front:
+            queue.appendleft(message)
+        else:
+            queue.append(message)
+
+        self._queued_bytes[peer] += len(message)
+
+        while self._queued_bytes[peer] > self.max_queued_bytes and len(queue) > 1:
+            self._queued_bytes[peer] -= len(queue.popleft())
+            logger.warning('Broadcast bus: %s is overloaded, a message was dropped.', peer)
+
+    def on_writable(self, peer, fd, events):
+        queue = self._queues.pop(peer)
+        del self._queued_bytes[peer]
+        self.io_loop.remove_handler(fd)
+
+        while queue:
+            if not self.send(peer, queue.popleft()):
+                # Queued again, with the remaining messages after it
+                self._queues[peer].extend(queue)
+                self._queued_bytes[peer] += sum(len(message) for message in queue)
+                return
+
+    def disconnect(self, peer):
+        peer_socket = self._sockets.pop(peer, None)
+
+        if peer_socket is None:
+            return
+
+        if self._queues.pop(peer, None) is not None:
+            del self._queued_bytes[peer]
+            self.io_loop.remove_handler(peer_socket.fileno())
+
+        peer_socket.close()
+
+    def remove(self, peer, error):
+        if error.args[0] not in (errno.ECONNREFUSED, errno.ENOENT):
+            logger.error('Broadcast bus: can not connect to %s: %s.', peer, error)
+            return
+
+        # Dead process
+        self.disconnect(peer)
+
+        if peer in self._peers:
+            self._peers.remove(peer)
+
+        if error.args[0] == errno.ECONNREFUSED and os.path.exists(peer):
+            os.unlink(peer)
+
+    def close(self):
+        if self.socket is None:
+            return
+
+        for peer in list(self._sockets):
+            self.disconnect(peer)
+
+        self.io_loop.remove_handler(self.socket.fileno())
+        self.socket.close()
+        self.socket = None
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,240 @@
+# coding: utf-8
+
+"""
+    Wire formats of event/data envelopes. A client chooses its codec when it connects, JSON is the default.
+"""
+
+import abc
+import struct
+
+import six
+
+from . import jsonbackend
+from .frame import OPCODE_BINARY, OPCODE_TEXT, encode_event
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
+# Prefix of WebSocket subprotocols naming a codec, like « dtws.msgpack »
+SUBPROTOCOL_PREFIX = 'dtws.'
+
+
+@six.add_metaclass(abc.ABCMeta)
+class Codec(object):
+    """
+        Base class of codecs, which serialize event/data envelopes to WebSocket messages and back.
+
+        A codec is registered with :func:`register_codec`, then a client asks for it by its ``name`` with the
+        ``dtws.<name>`` subprotocol or the ``codec`` query parameter.
+    """
+
+    # Name used to negotiate the codec
+    name = None
+
+    # Name of the format in warnings sent to clients
+    label = None
+
+    # True if messages are sent in binary frames
+    binary = False
+
+    @property
+    def opcode(self):
+        return OPCODE_BINARY if self.binary else OPCODE_TEXT
+
+    @property
+    def subprotocol(self):
+        return SUBPROTOCOL_PREFIX + self.name
+
+    @abc.abstractmethod
+    def encode(self, envelope):
+        """
+            Serialize an envelope.
+
+            :param envelope: ``{'event': event, 'data': data}``
+            :type envelope: dict
+            :rtype: bytes
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def decode(self, message):
+        """
+            Deserialize a message sent by a client.
+
+            :param message: received message
+            :type message: bytes or str
+            :rtype: dict
+            :raise: ``ValueError`` if the message is not valid.
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def join(self, payloads):
+        """
+            Serialize already encoded envelopes to an array, without encoding them again. Used for batch frames.
+
+            :param payloads: encoded envelopes
+            :type payloads: list
+            :rtype: bytes
+        """
+
+        pass
+
+    def encode_event(self, event, data):
+        """
+            Serialize an event/data combinaison.
+
+            :rtype: bytes
+        """
+
+        return self.encode({'event': event, 'data': data})
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.name)
+
+
+class JSONCodec(Codec):
+    """
+        Default codec, envelopes are sent as JSON text, with the JSON backend selected by
+        :func:`~tornado_websockets.jsonbackend.set_backend`.
+    """
+
+    name = 'json'
+    label = 'JSON'
+
+    def encode(self, envelope):
+        return jsonbackend.backend.dumps(envelope)
+
+    def decode(self, message):
+        return jsonbackend.backend.loads(message)
+
+    def join(self, payloads):
+        return b'[' + b','.join(payloads) + b']'
+
+    def encode_event(self, event, data):
+        return encode_event(event, data)
+
+
+class MessagePackCodec(Codec):
+    """
+        Binary codec using `MessagePack <https://msgpack.org>`_, needs the ``msgpack`` package.
+    """
+
+    name = 'msgpack'
+    label = 'MessagePack'
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError('MessagePackCodec needs the « msgpack » package: pip install msgpack')
+
+    def encode(self, envelope):
+        return msgpack.packb(envelope, use_bin_type=True)
+
+    def decode(self, message):
+        try:
+            return msgpack.unpackb(message, raw=False)
+        except Exception as e:
+            raise ValueError('Invalid MessagePack message: %s' % e)
+
+    def join(self, payloads):
+        count = len(payloads)
+
+        if count < 16:
+            header = struct.pack('!B', 0x90 | count)
+        elif count <= 0xFFFF:
+            header = struct.pack('!BH', 0xdc, count)
+        else:
+            header = struct.pack('!BI', 0xdd, count)
+
+        return header + b''.join(payloads)
+
+
+class CBORCodec(Codec):
+    """
+        Binary codec using `CBOR <https://cbor.io>`_ (RFC 7049), needs the ``cbor2`` package.
+    """
+
+    name = 'cbor'
+    label = 'CBOR'
+    binary = True
+
+    def __init__(self):
+        if cbor2 is None:
+            raise ImportError('CBORCodec needs the « cbor2 » package: pip install cbor2')
+
+    def encode(self, envelope):
+        return cbor2.dumps(envelope)
+
+    def decode(self, message):
+        try:
+            return cbor2.loads(message)
+        except Exception as e:
+            raise ValueError('Invalid CBOR message: %s' % e)
+
+    def join(self, payloads):
+        count = len(payloads)
+
+        if count < 24:
+            header = struct.pack('!B', 0x80 | count)
+        elif count <= 0xFF:
+            header = struct.pack('!BB', 0x98, count)
+        elif count <= 0xFFFF:
+            header = struct.pack('!BH', 0x99, count)
+        else:
+            header = struct.pack('!BI', 0x9a, count)
+
+        return header + b''.join(payloads)
+
+
+JSON = JSONCodec()
+
+# Registered codecs indexed by their name
+codecs = {JSON.name: JSON}
+
+
+def register_codec(codec):
+    """
+        Register a codec so clients can ask for it, a codec with the same name is replaced.
+
+        :param codec: codec instance
+        :type codec: Codec
+        :raise: ``TypeError`` if ``codec`` is not a :class:`Codec`.
+    """
+
+    if not isinstance(codec, Codec):
+        raise TypeError('Expected an instance of Codec, got %r.' % codec)
+
+    codecs[codec.name] = codec
+
+
+def get_codec(name):
+    """
+        Return the codec registered with ``name``, or ``None``.
+
+        :param name: codec name, or subprotocol (``dtws.<name>``)
+        :type name: str
+        :rtype: Codec
+    """
+
+    if name.startswith(SUBPROTOCOL_PREFIX):
+        name = name[len(SUBPROTOCOL_PREFIX):]
+
+    return codecs.get(name)
+
+
+# Binary codecs are available as soon as their package is installed
+if msgpack is not None:
+    register_codec(MessagePackCodec())
+
+if cbor2 is not None:
+    register_codec(CBORCodec())
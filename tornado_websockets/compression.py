@@ -0,0 +1,175 @@
+# coding: utf-8
+
+"""
+    Per-message compression (permessage-deflate, RFC 7692) settings of a WebSocket.
+"""
+
+import contextlib
+import zlib
+
+from .frame import build_frame
+
+RSV1 = 0x40
+
+EXTENSION = 'permessage-deflate'
+
+# Smallest window accepted by every zlib version for raw deflate streams
+MIN_WINDOW_BITS = 9
+
+
+class Compression(object):
+    """
+        Compression settings of the clients of a :class:`~tornado_websockets.websocket.WebSocket`, used only with
+        clients which offer the ``permessage-deflate`` extension.
+
+        Messages smaller than ``min_size`` bytes are sent uncompressed: deflating them costs CPU for a few saved
+        bytes, if any.
+
+        With ``context_takeover``, each connection keeps its own compression context between messages: messages are
+        smaller, but a broadcast is compressed once per client. Without it (``server_no_context_takeover`` is
+        negotiated), each message is compressed on its own, so a broadcast is compressed once per codec and the same
+        frame is written to every client using it, see :meth:`sharing`.
+
+        Statistics:
+
+        - ``uncompressed``: number of messages sent uncompressed because of ``min_size``,
+        - ``compressions``: number of frames compressed for several clients,
+        - ``shared``: number of times such a frame was reused for another client.
+
+        :param level: zlib compression level, from ``1`` (fastest) to ``9`` (smallest)
+        :param mem_level: zlib memory level, from ``1`` to ``9``
+        :param window_bits: maximum size of the compression window (``2 ** window_bits`` bytes), from ``9`` to
+                            ``15``, smaller windows save memory on both sides
+        :param min_size: size of a message, in bytes, below which it is sent uncompressed
+        :param context_takeover: ``False`` to compress each message independently
+        :type level: int
+        :type mem_level: int
+        :type window_bits: int
+        :type min_size: int
+        :type context_takeover: bool
+    """
+
+    def __init__(self, level=6, mem_level=8, window_bits=zlib.MAX_WBITS, min_size=256, context_takeover=True):
+        if not 0 <= level <= 9:
+            raise ValueError('Param « level » should be between 0 and 9, got %r.' % level)
+
+        if not 1 <= mem_level <= 9:
+            raise ValueError('Param « mem_level » should be between 1 and 9, got %r.' % mem_level)
+
+        if not MIN_WINDOW_BITS <= window_bits <= zlib.MAX_WBITS:
+            raise ValueError('Param « window_bits » should be between %d and %d, got %r.' % (
+                MIN_WINDOW_BITS, zlib.MAX_WBITS, window_bits
+            ))
+
+        if min_size < 0:
+            raise ValueError('Param « min_size » can not be negative, got %r.' % min_size)
+
+        self.level = level
+        self.mem_level = mem_level
+        self.window_bits = window_bits
+        self.min_size = min_size
+        self.context_takeover = context_takeover
+
+        self.uncompressed = 0
+        self.compressions = 0
+        self.shared = 0
+
+        # Compressed frames of the current broadcast, indexed by payload, opcode and compressor parameters
+        self._frames = None
+
+    def options(self):
+        """
+            Compression options given to Tornado, see
+            :meth:`WebSocketHandler.get_compression_options()
+            <tornado_websockets.websockethandler.WebSocketHandler.get_compression_options>`.
+
+            :rtype: dict
+        """
+
+        return {
+            'compression_level': self.level,
+            'mem_level': self.mem_level,
+        }
+
+    def negotiate(self, extensions):
+        """
+            Add the server parameters of these settings to the ``permessage-deflate`` offers of a client, before
+            Tornado accepts one and echoes its parameters in the handshake response.
+
+            :param extensions: extensions offered by the client, as parsed by Tornado: a list of
+                               ``(name, parameters)``, parameters are updated in place
+            :type extensions: list
+            :rtype: list
+        """
+
+        for name, params in extensions:
+            if name != EXTENSION:
+                continue
+
+            if not self.context_takeover:
+                params['server_no_context_takeover'] = None
+
+            if self.window_bits < zlib.MAX_WBITS:
+                try:
+                    window_bits = min(int(params['server_max_window_bits']), self.window_bits)
+                except (KeyError, TypeError, ValueError):
+                    window_bits = self.window_bits
+
+                params['server_max_window_bits'] = str(window_bits)
+
+        return extensions
+
+    @contextlib.contextmanager
+    def sharing(self):
+        """
+            Share compressed frames between the clients written to in this block, used around a broadcast. Each
+            payload is compressed once per compressor parameters, whatever the order of clients and their codecs.
+        """
+
+        frames, self._frames = self._frames, {}
+
+        try:
+            yield
+        finally:
+            self._frames = frames
+
+    def frame(self, payload, frame, opcode, compressor):
+        """
+            Return the frame to write to a connection which negotiated compression.
+
+            :param payload: encoded message
+            :param frame: uncompressed frame around ``payload``, or ``None``
+            :param opcode: ``OPCODE_TEXT`` or ``OPCODE_BINARY``
+            :param compressor: compressor of the connection, created by Tornado
+            :type payload: bytes
+            :type frame: bytes
+            :type opcode: int
+            :return: the frame, or ``None`` if the message should be compressed by the connection itself: with
+                     context takeover, or outside of :meth:`sharing`
+            :rtype: bytes
+        """
+
+        if len(payload) < self.min_size:
+            self.uncompressed += 1
+            return frame if frame is not None else build_frame(payload, opcode)
+
+        if compressor._compressor is not None or self._frames is None:
+            # Context takeover, the compressed message depends on previous messages of the connection, or the
+            # message is not written to several clients
+            return None
+
+        key = (payload, opcode, compressor._compression_level, compressor._mem_level, compressor._max_wbits)
+        compressed = self._frames.get(key)
+
+        if compressed is None:
+            compressed = self._frames[key] = build_frame(compressor.compress(payload), opcode, RSV1)
+            self.compressions += 1
+        else:
+            self.shared += 1
+
+        return compressed
+
+    def __repr__(self):
+        return '<Compression: level %d, %d compression(s) shared %d time(s), %d uncompressed message(s)>' % (
+            self.level, self.compressions, self.shared, self.uncompressed
+        )
@@ -0,0 +1,158 @@
+# coding: utf-8
+
+import inspect
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import tornado.concurrent
+import tornado.ioloop
+
+# Parameters that WebSocketHandler.on_message can inject in a callback decorated by @WebSocket.on
+INJECTABLE_ARGS = ('self', 'socket', 'data')
+
+# Size of the thread pool shared by callbacks registered with @WebSocket.on(executor=True)
+EXECUTOR_THREADS = 10
+
+# An invoker is called with (context, socket, data) and only passes what its callback asks for.
+# Indexed by (wants self, wants socket, wants data).
+_INVOKER_FACTORIES = {
+    (False, False, False): lambda cb: lambda context, socket, data: cb(),
+    (False, False, True): lambda cb: lambda context, socket, data: cb(data=data),
+    (False, True, False): lambda cb: lambda context, socket, data: cb(socket=socket),
+    (False, True, True): lambda cb: lambda context, socket, data: cb(socket=socket, data=data),
+    (True, False, False): lambda cb: lambda context, socket, data: cb(self=context),
+    (True, False, True): lambda cb: lambda context, socket, data: cb(self=context, data=data),
+    (True, True, False): lambda cb: lambda context, socket, data: cb(self=context, socket=socket),
+    (True, True, True): lambda cb: lambda context, socket, data: cb(self=context, socket=socket, data=data),
+}
+
+_executor = None
+
+# IOLoop of the event being handled, set while a callback runs in an executor thread
+_executor_state = threading.local()
+
+
+def get_arg_names(callback):
+    """
+        Return names of the parameters of ``callback`` which can be passed by keyword.
+
+        :param callback: function or a class method.
+        :type callback: callable
+        :rtype: list
+    """
+
+    if not hasattr(inspect, 'signature'):  # Python 2
+        return inspect.getargspec(callback).args
+
+    return [
+        name for name, parameter in inspect.signature(callback).parameters.items()
+        if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY)
+    ]
+
+
+def compile_invoker(callback):
+    """
+        Analyse the signature of ``callback`` once, and return an invoker which will call it with only the
+        parameters it asks for among ``self``, ``socket`` and ``data``.
+
+        The returned invoker should be called with ``(context, socket, data)``, ``context`` is read at call time
+        because ``WebSocket.context`` is usually defined after the callback registration.
+
+        :param callback: function or a class method.
+        :type callback: callable
+        :rtype: callable
+    """
+
+    args = get_arg_names(callback)
+    key = tuple(name in args for name in INJECTABLE_ARGS)
+
+    return _INVOKER_FACTORIES[key](callback)
+
+
+def get_executor():
+    """
+        Return the thread pool shared by callbacks registered with ``@WebSocket.on(executor=True)``, it is created on
+        first use so no thread exists before forking workers.
+
+        :rtype: concurrent.futures.ThreadPoolExecutor
+    """
+
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(EXECUTOR_THREADS)
+
+    return _executor
+
+
+def compile_executor_invoker(invoker, executor=True):
+    """
+        Wrap an invoker so its callback runs in a thread pool instead of the IOLoop thread, the returned invoker
+        returns a ``concurrent.futures.Future``.
+
+        While the callback runs, :func:`executor_io_loop` returns the IOLoop which received the event, so
+        ``emit()`` methods can send their messages from this IOLoop.
+
+        :param invoker: invoker returned by :func:`compile_invoker`
+        :param executor: ``True`` for the shared thread pool (see :func:`get_executor`), or an executor
+        :type invoker: callable
+        :type executor: bool or concurrent.futures.Executor
+        :rtype: callable
+    """
+
+    if executor is not True and not isinstance(executor, Executor):
+        raise TypeError('Param « executor » should be True or an instance of concurrent.futures.Executor.')
+
+    def executor_invoker(context, socket, data):
+        pool = get_executor() if executor is True else executor
+
+        return pool.submit(call_for_io_loop, tornado.ioloop.IOLoop.current(), invoker, context, socket, data)
+
+    return executor_invoker
+
+
+def call_for_io_loop(io_loop, function, *args):
+    """
+        Call ``function(*args)`` outside the IOLoop thread, :func:`executor_io_loop` returns ``io_loop`` during the
+        call so ``emit()`` methods send their messages from this IOLoop.
+
+        :param io_loop: IOLoop to send messages from
+        :param function: function to call
+        :type io_loop: tornado.ioloop.IOLoop
+        :type function: callable
+    """
+
+    _executor_state.io_loop = io_loop
+
+    try:
+        return function(*args)
+    finally:
+        _executor_state.io_loop = None
+
+
+def executor_io_loop():
+    """
+        Return the IOLoop to send messages from when the current thread runs a callback registered with
+        ``@WebSocket.on(executor=...)``, otherwise ``None``.
+
+        :rtype: tornado.ioloop.IOLoop
+    """
+
+    return getattr(_executor_state, 'io_loop', None)
+
+
+def is_awaitable(result):
+    """
+        Return ``True`` if a callback returned something which should be awaited: a future (returned by a
+        ``@tornado.gen.coroutine`` callback or by an executor) or the coroutine object of an ``async def`` callback.
+
+        :rtype: bool
+    """
+
+    if result is None:
+        return False
+
+    if tornado.concurrent.is_future(result):
+        return True
+
+    return hasattr(inspect, 'isawaitable') and inspect.isawaitable(result)
@@ -0,0 +1,57 @@
+# coding: utf-8
+
+import struct
+
+from . import jsonbackend
+
+FIN = 0x80
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+
+
+def encode_event(event, data):
+    """
+        Serialize an event/data combinaison to the JSON envelope understood by dtws's client side, with the JSON
+        backend selected by :func:`~tornado_websockets.jsonbackend.set_backend`.
+
+        :param event: event name
+        :param data: associated data
+        :type event: str
+        :type data: dict
+        :rtype: bytes
+    """
+
+    return jsonbackend.backend.dumps({
+        'event': event,
+        'data': data
+    })
+
+
+def build_frame(payload, opcode=OPCODE_TEXT, flags=0):
+    """
+        Build a complete server-to-client WebSocket frame (final, unmasked, see RFC 6455 section 5.2) around an
+        already encoded payload.
+
+        The same frame can be written as-is to every connection which did not negotiate any extension, that's why
+        :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` builds it only once per broadcast.
+
+        :param payload: encoded message
+        :param opcode: ``OPCODE_TEXT`` or ``OPCODE_BINARY``
+        :param flags: reserved bits (``RSV1`` for a compressed message)
+        :type payload: bytes
+        :type opcode: int
+        :type flags: int
+        :rtype: bytes
+    """
+
+    length = len(payload)
+    first_byte = FIN | flags | opcode
+
+    if length < 126:
+        header = struct.pack('!BB', first_byte, length)
+    elif length <= 0xFFFF:
+        header = struct.pack('!BBH', first_byte, 126, length)
+    else:
+        header = struct.pack('!BBQ', first_byte, 127, length)
+
+    return header + payload
@@ -0,0 +1,271 @@
+# coding: utf-8
+
+"""
+    Server pings and idle timeouts of connections, scheduled in a hashed timer wheel shared by every WebSocket.
+"""
+
+import logging
+import math
+import weakref
+from timeit import default_timer
+
+import tornado.ioloop
+import tornado.websocket
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOLUTION = 1.0
+DEFAULT_SLOTS = 256
+
+# Close code of reaped connections, « Going Away »
+REAP_CODE = 1001
+
+# Timer wheel of each IOLoop, see current_wheel()
+_wheels = weakref.WeakKeyDictionary()
+
+
+class Timer(object):
+    """
+        Callback scheduled in a :class:`TimerWheel`, returned by :meth:`TimerWheel.schedule`.
+    """
+
+    __slots__ = ('tick', 'callback', 'args')
+
+    def __init__(self, tick, callback, args):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel(object):
+    """
+        Hashed timer wheel: timers are stored in ``slots`` buckets by their tick (``resolution`` seconds), so
+        scheduling and cancelling a timer cost a set operation, and the IOLoop has only one timeout, whatever the
+        number of timers. A timer runs at most ``resolution`` seconds late.
+
+        The wheel only ticks while it holds timers.
+
+        :param io_loop: IOLoop running the timers
+        :param resolution: duration of a tick, in seconds
+        :param slots: number of buckets, a timer further than ``slots`` ticks stays in its bucket for several turns
+        :type io_loop: tornado.ioloop.IOLoop
+        :type resolution: float
+        :type slots: int
+    """
+
+    def __init__(self, io_loop, resolution=DEFAULT_RESOLUTION, slots=DEFAULT_SLOTS):
+        if resolution <= 0:
+            raise ValueError('Param « resolution » should be positive, got %r.' % resolution)
+
+        if slots < 1:
+            raise ValueError('Param « slots » should be at least 1, got %r.' % slots)
+
+        self.io_loop = io_loop
+        self.resolution = resolution
+        self.slots = [set() for _ in range(slots)]
+        self.origin = default_timer()
+        self.position = 0
+        self.count = 0
+        self._timeout = None
+
+    def current_tick(self):
+        return int((default_timer() - self.origin) / self.resolution)
+
+    def schedule(self, delay, callback, *args):
+        """
+            Call ``callback(*args)`` in ``delay`` seconds.
+
+            :param delay: delay in seconds
+            :param callback: function to call
+            :type delay: float
+            :type callback: callable
+            :rtype: Timer
+        """
+
+        if not self.count:
+            # The wheel did not tick while it was empty
+            self.position = self.current_tick()
+
+        tick = max(self.position + 1, int(math.ceil((default_timer() + delay - self.origin) / self.resolution)))
+        timer = Timer(tick, callback, args)
+
+        self.slots[tick % len(self.slots)].add(timer)
+        self.count += 1
+
+        if self._timeout is None:
+            self.start()
+
+        return timer
+
+    def cancel(self, timer):
+        """
+            Cancel a timer, if it did not run yet.
+
+            :param timer: timer returned by :meth:`schedule`
+            :type timer: Timer
+        """
+
+        slot = self.slots[timer.tick % len(self.slots)]
+
+        if timer in slot:
+            slot.discard(timer)
+            self.count -= 1
+
+    def start(self):
+        delay = self.origin + (self.position + 1) * self.resolution - default_timer()
+        self._timeout = self.io_loop.call_later(max(0, delay), self.turn)
+
+    def turn(self):
+        """
+            Run the timers of the ticks elapsed since the previous turn.
+        """
+
+        self._timeout = None
+        current = self.current_tick()
+        size = len(self.slots)
+        due = []
+
+        # Each bucket is visited once, even if the IOLoop was blocked for more than a whole turn
+        for position in range(self.position + 1, min(current, self.position + size) + 1):
+            slot = self.slots[position % size]
+            expired = [timer for timer in slot if timer.tick <= current]
+
+            if expired:
+                slot.difference_update(expired)
+                due.extend(expired)
+
+        self.position = current
+        self.count -= len(due)
+
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logger.error('Uncaught exception in timer %r', timer.callback, exc_info=True)
+
+        if self.count and self._timeout is None:
+            self.start()
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return '<TimerWheel: %d timer(s), %d slot(s) of %g s>' % (self.count, len(self.slots), self.resolution)
+
+
+def current_wheel():
+    """
+        Return the timer wheel of the current IOLoop, created on first use.
+
+        :rtype: TimerWheel
+    """
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    wheel = _wheels.get(io_loop)
+
+    if wheel is None:
+        wheel = _wheels[io_loop] = TimerWheel(io_loop)
+
+    return wheel
+
+
+class Heartbeat(object):
+    """
+        Pings and idle timeout of the clients of a :class:`~tornado_websockets.websocket.WebSocket`.
+
+        A client which sent nothing (message or pong) for ``interval`` seconds is pinged, a client which sent nothing
+        for ``timeout`` seconds is closed with code ``1001`` and goes through the usual ``on_close`` cleanup, so a
+        dead TCP connection does not stay in ``WebSocket.handlers`` until the OS notices it.
+
+        Each client has one timer in the timer wheel of the IOLoop (see :class:`TimerWheel`), it is not rescheduled
+        when the client sends something: the time of its last message is checked when the timer runs.
+
+        Statistics:
+
+        - ``pings``: number of pings sent,
+        - ``reaped``: number of connections closed by the idle timeout.
+
+        :param interval: seconds of silence before pinging a client, ``None`` to never ping
+        :param timeout: seconds of silence before closing a connection, ``None`` to never close it
+        :type interval: float
+        :type timeout: float
+    """
+
+    def __init__(self, interval=20, timeout=60):
+        if interval is None and timeout is None:
+            raise ValueError('Params « interval » and « timeout » can not be both None.')
+
+        if interval is not None and interval <= 0:
+            raise ValueError('Param « interval » should be positive, got %r.' % interval)
+
+        if timeout is not None and timeout <= 0:
+            raise ValueError('Param « timeout » should be positive, got %r.' % timeout)
+
+        self.interval = interval
+        self.timeout = timeout
+        self.pings = 0
+        self.reaped = 0
+
+    def watch(self, handler):
+        """
+            Start watching a connection, called when it is opened.
+
+            :param handler: client
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        handler.last_seen = handler.last_ping = default_timer()
+        self.schedule(handler, current_wheel())
+
+    def forget(self, handler):
+        """
+            Stop watching a connection, called when it is closed.
+
+            :param handler: client
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        timer, handler.heartbeat_timer = handler.heartbeat_timer, None
+
+        if timer is not None:
+            current_wheel().cancel(timer)
+
+    def schedule(self, handler, wheel):
+        deadlines = []
+
+        if self.interval is not None:
+            deadlines.append(max(handler.last_seen, handler.last_ping) + self.interval)
+
+        if self.timeout is not None:
+            deadlines.append(handler.last_seen + self.timeout)
+
+        handler.heartbeat_timer = wheel.schedule(min(deadlines) - default_timer(), self.check, handler, wheel)
+
+    def check(self, handler, wheel):
+        """
+            Ping or close a connection which sent nothing for too long, called by its timer.
+        """
+
+        handler.heartbeat_timer = None
+        now = default_timer()
+
+        try:
+            if self.timeout is not None and now - handler.last_seen >= self.timeout:
+                self.reaped += 1
+                logger.info('Closing connection %d of %s, idle for %.0f s.', handler.id, handler.websocket.path,
+                            now - handler.last_seen)
+                handler.close(REAP_CODE, 'Idle timeout')
+                return
+
+            if self.interval is not None and now - max(handler.last_seen, handler.last_ping) >= self.interval:
+                handler.ping(b'')
+                handler.last_ping = now
+                self.pings += 1
+        except tornado.websocket.WebSocketClosedError:
+            # Its on_close() will clean it up
+            return
+
+        self.schedule(handler, wheel)
+
+    def __repr__(self):
+        return '<Heartbeat: %d ping(s), %d connection(s) reaped>' % (self.pings, self.reaped)
@@ -0,0 +1,109 @@
+# coding: utf-8
+
+"""
+    JSON libraries used to encode and decode event/data envelopes. The fastest installed library is used by default,
+    see :func:`set_backend`.
+"""
+
+import tornado.escape
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class JSONBackend(object):
+    """
+        A JSON library: ``dumps`` returns bytes (ready to be framed, without any str → bytes copy when the library
+        supports it), ``loads`` accepts bytes or str and raises ``ValueError`` on invalid JSON.
+
+        :param name: name used in ``TORNADO['json']`` setting
+        :param dumps: function serializing an object to bytes
+        :param loads: function deserializing bytes or str
+        :type name: str
+        :type dumps: callable
+        :type loads: callable
+    """
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return '<JSONBackend: %s>' % self.name
+
+
+def _stdlib_dumps(obj):
+    return tornado.escape.utf8(tornado.escape.json_encode(obj))
+
+
+# Available backends indexed by name, from the fastest to the slowest
+backends = {
+    'json': JSONBackend('json', _stdlib_dumps, tornado.escape.json_decode),
+}
+preferences = ['orjson', 'ujson', 'json']
+
+if orjson is not None:
+    # Integer keys are converted to strings, like the standard library does
+    backends['orjson'] = JSONBackend(
+        'orjson',
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads
+    )
+
+if ujson is not None:
+    backends['ujson'] = JSONBackend(
+        'ujson',
+        lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8'),
+        ujson.loads
+    )
+
+
+def get_backend(name='auto'):
+    """
+        Return a JSON backend.
+
+        :param name: ``'orjson'``, ``'ujson'``, ``'json'`` (standard library) or ``'auto'`` for the fastest
+                     installed one
+        :type name: str
+        :rtype: JSONBackend
+        :raise: ``ValueError`` if the backend is unknown or its library is not installed.
+    """
+
+    if name == 'auto':
+        return next(backends[name] for name in preferences if name in backends)
+
+    if name not in backends:
+        if name in preferences:
+            raise ValueError('JSON backend « %s » needs the « %s » package: pip install %s' % (name, name, name))
+
+        raise ValueError('Unknown JSON backend « %s », expected one of auto, %s.' % (name, ', '.join(preferences)))
+
+    return backends[name]
+
+
+# Backend used by frame.encode_event() and codec.JSONCodec
+backend = get_backend()
+
+
+def set_backend(name):
+    """
+        Select the JSON backend used for every envelope, emitted or received, from ``TORNADO['json']`` setting.
+
+        :param name: see :func:`get_backend`
+        :type name: str
+        :rtype: JSONBackend
+    """
+
+    global backend
+
+    backend = get_backend(name)
+
+    return backend
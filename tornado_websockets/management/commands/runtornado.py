@@ -9,12 +9,17 @@ from django.apps import AppConfig
 from django.conf import settings
 from django.core.management import BaseCommand
 
+from tornado_websockets import jsonbackend
+from tornado_websockets.admission import Admission
+from tornado_websockets.broadcast import LocalBackend, PubSubBackend, UnixSocketPubSub
 from tornado_websockets.tornadowrapper import TornadoWrapper
+from tornado_websockets.watchdog import Watchdog
 
 if django.VERSION[1] > 5:
     django.setup()
 
 DEFAULT_PORT = 8000
+DEFAULT_WORKERS = 1
 
 
 def get_port(options, configuration):
@@ -25,9 +30,80 @@ def get_port(options, configuration):
     return port
 
 
-def run(tornado_handlers, tornado_settings, port):
+def get_workers(options, configuration):
+    workers = options.get('workers')
+
+    if workers is None:
+        workers = configuration.get('workers', DEFAULT_WORKERS)
+
+    return workers
+
+
+def get_broadcast(configuration, workers, port):
+    broadcast = configuration.get('broadcast')
+
+    if broadcast is None:
+        broadcast = 'local' if workers == 1 else 'unix'
+
+    if broadcast == 'local':
+        return LocalBackend()
+
+    if broadcast == 'unix':
+        return PubSubBackend(UnixSocketPubSub.for_port(port))
+
+    # A factory, like a BroadcastBackend subclass
+    return broadcast()
+
+
+def get_watchdog(options, configuration):
+    watchdog = options.get('watchdog')
+
+    if watchdog is None:
+        watchdog = configuration.get('watchdog')
+
+    # A threshold in milliseconds
+    return watchdog
+
+
+def get_admission(configuration):
+    admission = configuration.get('admission')
+
+    return Admission(**admission) if admission is not None else None
+
+
+def describe_admission(admission):
+    if admission is None:
+        return 'Disabled'
+
+    return '%s connections, %s per IP' % (
+        admission.max_connections or 'unlimited', admission.max_per_ip or 'unlimited'
+    )
+
+
+def run(tornado_handlers, tornado_settings, port, workers=DEFAULT_WORKERS, reuse_port=False, broadcast=None,
+        metrics=None, watchdog=None, admission=None):
+    if workers != 1:
+        TornadoWrapper.fork(port, workers, reuse_port)
+    elif reuse_port:
+        TornadoWrapper.reuse_port = True
+
+    if admission is not None:
+        # Limits are counted by each worker
+        TornadoWrapper.admission = admission
+
+    if broadcast is not None:
+        TornadoWrapper.set_broadcast(broadcast)
+
+    if metrics is not None:
+        TornadoWrapper.add_metrics_handler(metrics)
+
     TornadoWrapper.start_app(tornado_handlers, tornado_settings)
     TornadoWrapper.listen(port)
+
+    if watchdog is not None:
+        # In each worker, its thread would not survive a fork
+        Watchdog(threshold=watchdog / 1000.0).start()
+
     TornadoWrapper.loop()
 
 
@@ -39,6 +115,11 @@ class Command(BaseCommand, AppConfig):
 
     def add_arguments(self, parser):
         parser.add_argument('port', nargs='?', help='Optional port number', type=int)
+        parser.add_argument('--workers', type=int, help='Number of worker processes, 0 for one per CPU')
+        parser.add_argument('--reuse-port', action='store_true', dest='reuse_port',
+                            help='Bind one socket per worker with SO_REUSEPORT')
+        parser.add_argument('--watchdog', type=float, nargs='?', const=100, metavar='MS',
+                            help='Log callbacks and views blocking the IOLoop longer than MS milliseconds (100)')
 
     def handle(self, *args, **options):
         try:
@@ -47,13 +128,42 @@ class Command(BaseCommand, AppConfig):
             self.stderr.write('runtornado: Configuration => Not found: %s.' % e)
             return
 
+        try:
+            json_backend = jsonbackend.set_backend(configuration.get('json', 'auto'))
+        except ValueError as e:
+            self.stderr.write('runtornado: JSON => %s' % e)
+            return
+
+        try:
+            admission = get_admission(configuration)
+        except ValueError as e:
+            self.stderr.write('runtornado: Admission => %s' % e)
+            return
+
         port = get_port(options, configuration)
+        workers = get_workers(options, configuration)
+        reuse_port = options.get('reuse_port') or configuration.get('reuse_port', False)
+        broadcast = get_broadcast(configuration, workers, port)
+        metrics = configuration.get('metrics')
+        watchdog = get_watchdog(options, configuration)
         tornado_handlers = configuration.get('handlers', [])
         tornado_settings = configuration.get('settings', {})
 
         self.stdout.write('runtornado: Configuration => Found.')
         self.stdout.write('runtornado: Port => %d.' % port)
+        self.stdout.write('runtornado: Workers => %d%s.' % (workers, ' (SO_REUSEPORT)' if reuse_port else ''))
+        self.stdout.write('runtornado: Broadcast => %s.' % broadcast.__class__.__name__)
+        self.stdout.write('runtornado: JSON => %s.' % json_backend.name)
+        self.stdout.write('runtornado: Metrics => %s.' % (metrics or 'Disabled'))
+        self.stdout.write('runtornado: Watchdog => %s.' % ('%g ms' % watchdog if watchdog is not None else 'Disabled'))
+        self.stdout.write('runtornado: Admission => %s.' % describe_admission(admission))
         self.stdout.write('runtornado: Handlers => Found %d initial handlers.' % len(tornado_handlers))
         self.stdout.write('runtornado: Settings => ' + json.dumps(tornado_settings))
 
-        run(tornado_handlers, tornado_settings, port)
+        if workers != 1 and tornado_settings.get('autoreload', tornado_settings.get('debug')):
+            # Tornado's autoreload can not work with multiple processes
+            tornado_settings = dict(tornado_settings, autoreload=False)
+            self.stdout.write('runtornado: Autoreload => Disabled, not compatible with several workers.')
+
+        run(tornado_handlers, tornado_settings, port, workers=workers, reuse_port=reuse_port, broadcast=broadcast,
+            metrics=metrics, watchdog=watchdog, admission=admission)
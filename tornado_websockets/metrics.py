@@ -0,0 +1,302 @@
+# coding: utf-8
+
+"""
+    Counters and histograms of each WebSocket, exposed in Prometheus text format by :class:`MetricsHandler`.
+"""
+
+import bisect
+import collections
+
+import tornado.web
+
+# Upper bounds, in seconds, of the callback duration buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# One received message out of DEFAULT_SAMPLING is sampled
+DEFAULT_SAMPLING = 64
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram(object):
+    """
+        Distribution of observed values in fixed buckets, like a Prometheus histogram.
+
+        :param buckets: sorted upper bounds of the buckets, a last bucket holds values above the last bound
+        :type buckets: tuple
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+            Add a value to its bucket.
+
+            :param value: observed value
+            :type value: float
+        """
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """
+            Return ``(upper bound, number of values lower or equal)`` for each bucket, the last bound is ``+Inf``.
+
+            :rtype: list
+        """
+
+        total = 0
+        counts = []
+
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            counts.append((bound, total))
+
+        return counts
+
+
+class WebSocketMetrics(object):
+    """
+        Metrics of a :class:`~tornado_websockets.websocket.WebSocket`, updated by the WebSocket and its
+        :class:`~tornado_websockets.websockethandler.WebSocketHandler` instances:
+
+        - ``received_messages``: messages sent by clients,
+        - ``received_bytes``: length of messages sent by clients (in characters for text messages), extrapolated from
+          sampled messages,
+        - ``decode_errors``: messages which could not be decoded by the codec of the client,
+        - ``unknown_events``: messages whose event has no callback,
+        - ``rate_limited``: messages ignored because they were above a rate limit,
+        - ``warnings``: ``warning`` events emitted to clients,
+        - ``sent_messages`` and ``sent_bytes``: messages sent to clients and their size, indexed by event. A
+          broadcast is counted once per client,
+        - ``calls``: number of calls of callbacks, indexed by event. Calls of event callbacks are extrapolated from
+          sampled messages, calls of lifecycle hooks are exact,
+        - ``durations``: duration in seconds of sampled callback calls and of lifecycle hooks, indexed by event. A
+          coroutine or a callback running in an executor is measured until it completes.
+
+        One received message out of ``sampling`` is sampled: its length is counted, and its callback call is counted
+        and timed, ``sampling`` times each. Other messages only decrement a countdown, so metrics cost a few percent of
+        the dispatch of a message (see ``benchmarks/bench_metrics.py``).
+
+        :param sampling: sample one received message out of ``sampling``, ``1`` to count and time every message
+        :type sampling: int
+    """
+
+    __slots__ = ('sampling', 'countdown', '_received_messages', 'received_bytes', 'decode_errors', 'unknown_events',
+                 'rate_limited', 'warnings', 'sent_messages', 'sent_bytes', 'calls', 'durations')
+
+    def __init__(self, sampling=DEFAULT_SAMPLING):
+        if sampling < 1:
+            raise ValueError('Param « sampling » should be at least 1, got %r.' % sampling)
+
+        self.sampling = sampling
+        # Messages received until the next sampled message, counted in received_messages once it is sampled
+        self.countdown = sampling
+        self._received_messages = 0
+        self.received_bytes = 0
+        self.decode_errors = 0
+        self.unknown_events = 0
+        self.rate_limited = 0
+        self.warnings = 0
+        self.sent_messages = {}
+        self.sent_bytes = {}
+        self.calls = collections.defaultdict(int)
+        self.durations = {}
+
+    @property
+    def received_messages(self):
+        return self._received_messages + self.sampling - self.countdown
+
+    @received_messages.setter
+    def received_messages(self, value):
+        self._received_messages = value - self.sampling + self.countdown
+
+    def sample(self, size):
+        """
+            Count ``sampling`` received messages of ``size`` bytes, called when the countdown of a received message
+            reaches zero.
+
+            :param size: length of the sampled message
+            :type size: int
+            :return: weight of the sampled message, ``sampling``
+            :rtype: int
+        """
+
+        sampling = self.sampling
+        self.countdown = sampling
+        self._received_messages += sampling
+        self.received_bytes += size * sampling
+
+        return sampling
+
+    def sent(self, event, size, count=1):
+        """
+            Count a message sent to ``count`` clients.
+
+            :param event: event name, or ``None``
+            :param size: size of the encoded message
+            :param count: number of clients
+            :type event: str
+            :type size: int
+            :type count: int
+        """
+
+        if event is None:
+            event = ''
+
+        try:
+            self.sent_messages[event] += count
+            self.sent_bytes[event] += size * count
+        except KeyError:
+            self.sent_messages[event] = count
+            self.sent_bytes[event] = size * count
+
+    def observe(self, event, duration):
+        """
+            Add the duration of a callback call to the histogram of its event.
+
+            :param event: event name
+            :param duration: duration in seconds
+            :type event: str
+            :type duration: float
+        """
+
+        histogram = self.durations.get(event)
+
+        if histogram is None:
+            histogram = self.durations[event] = Histogram()
+
+        histogram.observe(duration)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def feature_counters(websocket):
+    """
+        Return ``(family, value)`` for the counters of the heartbeat and the admission control of a WebSocket, when it
+        enables them.
+
+        :rtype: list
+    """
+
+    counters = []
+
+    if websocket.heartbeat is not None:
+        counters.append(('dtws_pings_total', websocket.heartbeat.pings))
+        counters.append(('dtws_reaped_connections_total', websocket.heartbeat.reaped))
+
+    if websocket.admission is not None:
+        counters.append(('dtws_rejected_connections_total', websocket.admission.rejected))
+
+    return counters
+
+
+def render(websockets):
+    """
+        Serialize the metrics of WebSockets to the Prometheus text exposition format.
+
+        :param websockets: WebSocket instances indexed by their path
+        :type websockets: dict
+        :rtype: str
+    """
+
+    families = [
+        ('dtws_connections', 'gauge', 'Connected clients.', []),
+        ('dtws_received_messages_total', 'counter', 'Messages received from clients.', []),
+        ('dtws_received_bytes_total', 'counter', 'Length of messages received from clients.', []),
+        ('dtws_decode_errors_total', 'counter', 'Messages which could not be decoded.', []),
+        ('dtws_unknown_events_total', 'counter', 'Messages whose event has no callback.', []),
+        ('dtws_rate_limited_total', 'counter', 'Messages ignored above a rate limit.', []),
+        ('dtws_warnings_total', 'counter', 'Warning events emitted to clients.', []),
+        ('dtws_sent_messages_total', 'counter', 'Messages sent to clients.', []),
+        ('dtws_sent_bytes_total', 'counter', 'Size of messages sent to clients.', []),
+        ('dtws_callbacks_total', 'counter', 'Calls of event callbacks.', []),
+        ('dtws_callback_duration_seconds', 'histogram', 'Duration of sampled calls of event callbacks.', []),
+        ('dtws_pings_total', 'counter', 'Pings sent to idle clients.', []),
+        ('dtws_reaped_connections_total', 'counter', 'Connections closed by the idle timeout.', []),
+        ('dtws_rejected_connections_total', 'counter', 'Connections rejected by connection limits.', []),
+    ]
+    samples = dict((name, lines) for name, _, _, lines in families)
+
+    def sample(name, labels, value, family=None):
+        labels = ','.join('%s="%s"' % (label, escape_label(label_value)) for label, label_value in labels)
+        samples[family or name].append('%s{%s} %s' % (name, labels, format_value(value)))
+
+    for path in sorted(websockets):
+        websocket = websockets[path]
+        metrics = websocket.metrics
+        labels = [('path', path)]
+
+        sample('dtws_connections', labels, websocket.handlers.count())
+
+        for name, value in feature_counters(websocket):
+            sample(name, labels, value)
+
+        if metrics is None:
+            continue
+
+        sample('dtws_received_messages_total', labels, metrics.received_messages)
+        sample('dtws_received_bytes_total', labels, metrics.received_bytes)
+        sample('dtws_decode_errors_total', labels, metrics.decode_errors)
+        sample('dtws_unknown_events_total', labels, metrics.unknown_events)
+        sample('dtws_rate_limited_total', labels, metrics.rate_limited)
+        sample('dtws_warnings_total', labels, metrics.warnings)
+
+        for event in sorted(metrics.sent_messages):
+            event_labels = labels + [('event', event)]
+            sample('dtws_sent_messages_total', event_labels, metrics.sent_messages[event])
+            sample('dtws_sent_bytes_total', event_labels, metrics.sent_bytes[event])
+
+        for event in sorted(metrics.calls):
+            sample('dtws_callbacks_total', labels + [('event', event)], metrics.calls[event])
+
+        family = 'dtws_callback_duration_seconds'
+
+        for event in sorted(metrics.durations):
+            histogram = metrics.durations[event]
+            event_labels = labels + [('event', event)]
+
+            for bound, count in histogram.cumulative_counts():
+                sample(family + '_bucket', event_labels + [('le', format_value(bound))], count, family)
+
+            sample(family + '_sum', event_labels, histogram.sum, family)
+            sample(family + '_count', event_labels, histogram.count, family)
+
+    lines = []
+
+    for name, kind, description, family_samples in families:
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        lines.extend(family_samples)
+
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+        Serves the metrics of every WebSocket of this process in Prometheus text format, registered by
+        :meth:`TornadoWrapper.add_metrics_handler()
+        <tornado_websockets.tornadowrapper.TornadoWrapper.add_metrics_handler>`.
+    """
+
+    def initialize(self, websockets):
+        self.websockets = websockets
+
+    def get(self):
+        self.set_header('Content-Type', CONTENT_TYPE)
+        self.write(render(self.websockets))
@@ -1,2 +1,5 @@
 from .module import Module
-from .progressbar import ProgressBar
+from .progressbar import ProgressBar, ProgressCounter
+from .taskprogress import TaskProgress, TaskProgressBar
+from .statesync import StateSync
+from .history import History
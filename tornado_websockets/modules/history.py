@@ -0,0 +1,195 @@
+# coding=utf-8
+from collections import deque
+from timeit import default_timer
+
+from six import string_types
+
+from tornado_websockets.codec import JSON
+from tornado_websockets.frame import build_frame, encode_event
+from tornado_websockets.modules.module import Module
+
+DEFAULT_SIZE = 1000
+
+
+class History(Module):
+    """
+        Initialize a new History module instance: the last messages broadcasted with :meth:`publish` are kept in a
+        ring buffer, so new or reconnecting clients can receive the messages they missed.
+
+        Each message gets a sequence number, added to its data (``seq``). A client receives the kept messages with
+        :meth:`replay`, when it opens its connection if ``replay_on_open`` is ``True``, or with the ``resume`` event
+        and ``{'since': seq}`` to receive only the messages after the last one it received. The
+        ``<module name>_since`` query argument of its connection does the same on open.
+
+        A replay is a single frame, like a batch (see :class:`~tornado_websockets.batching.Batcher`): a ``replay``
+        event, ``{'since': 4, 'seq': 9, 'complete': True}``, followed by the missed messages. ``complete`` is
+        ``False`` if some messages after ``since`` (or after the first message) are not kept anymore. Messages are
+        encoded once, when they are published, so a replay costs the number of missed messages. With
+        ``batch_replay=False``, the replay is sent as one frame per message instead, for clients which do not
+        read batch frames.
+
+        The buffer keeps at most ``size`` messages, and messages older than ``max_age`` seconds are dropped. Each
+        process keeps the messages it published, with its own sequence numbers, so they are only sent to clients of
+        this process: with several workers, publish from each worker the messages its clients should receive.
+
+        :param size: Maximum number of kept messages
+        :param max_age: Maximum age of kept messages in seconds, ``None`` for no limit
+        :param replay_on_open: Replay the kept messages to each new client
+        :param batch_replay: Send a replay in a single frame
+        :type size: int
+        :type max_age: float
+        :type replay_on_open: bool
+        :type batch_replay: bool
+    """
+
+    def __init__(self, name='', size=DEFAULT_SIZE, max_age=None, replay_on_open=True, batch_replay=True):
+        if name:
+            name = '_' + name
+        super(History, self).__init__('history' + name)
+
+        if size < 1:
+            raise ValueError('Param « size » should be at least 1, got %r.' % size)
+
+        if max_age is not None and max_age <= 0:
+            raise ValueError('Param « max_age » should be positive, got %r.' % max_age)
+
+        self.size = size
+        self.max_age = max_age
+        self.replay_on_open = replay_on_open
+        self.batch_replay = batch_replay
+
+        # (seq, time, encoded message) of the kept messages, the oldest first
+        self.messages = deque(maxlen=size)
+        self.seq = 0
+
+    def initialize(self):
+        @self.on
+        def open(socket):
+            since = socket.get_query_argument(self.name + '_since', None)
+
+            if since is not None or self.replay_on_open:
+                self.replay(socket, since)
+
+        @self.on
+        def resume(socket, data):
+            self.replay(socket, data.get('since'))
+
+    def publish(self, event, data=None):
+        """
+            Send an event to all clients of this process, like :meth:`WebSocket.emit()
+            <tornado_websockets.websocket.WebSocket.emit>` with ``local=True``, and keep it for :meth:`replay`.
+
+            :param event: event name
+            :param data: a dictionary or a string which will be converted to ``{'message': data}``
+            :type event: str
+            :type data: dict or str
+            :return: Sequence number of the message
+            :rtype: int
+        """
+
+        if isinstance(data, string_types):
+            data = {'message': data}
+
+        self.seq += 1
+        data = dict(data or {}, seq=self.seq)
+
+        payload = encode_event(event, data)
+
+        self.messages.append((self.seq, default_timer(), payload))
+        self.expire()
+        self._websocket.publish(payload, None, event, local=True)
+
+        return self.seq
+
+    def expire(self):
+        """
+            Drop the messages older than ``max_age``.
+        """
+
+        if self.max_age is None:
+            return
+
+        oldest = default_timer() - self.max_age
+
+        while self.messages and self.messages[0][1] < oldest:
+            self.messages.popleft()
+
+    def since(self, seq=None):
+        """
+            Return the encoded messages published after ``seq``, all the kept messages if ``seq`` is ``None``.
+
+            :param seq: Sequence number of the last message received by a client
+            :type seq: int
+            :rtype: list
+        """
+
+        self.expire()
+        missed = []
+
+        # From the newest, so it only costs the number of missed messages
+        for message in reversed(self.messages):
+            if seq is not None and message[0] <= seq:
+                break
+
+            missed.append(message[2])
+
+        missed.reverse()
+
+        return missed
+
+    def replay(self, socket, seq=None):
+        """
+            Send to a client the messages published after ``seq``, preceded by a ``replay`` event, in a single frame
+            if ``batch_replay`` is ``True``.
+
+            :param socket: Client
+            :param seq: Sequence number of the last message received by the client, ``None`` for all the kept messages
+            :type socket: tornado_websockets.websockethandler.WebSocketHandler
+            :type seq: int
+        """
+
+        if seq is not None:
+            try:
+                seq = int(seq)
+            except (TypeError, ValueError):
+                seq = None
+
+        if seq is not None and seq > self.seq:
+            # Sequence numbers of another process or before a restart
+            seq = None
+
+        missed = self.since(seq)
+        first = self.messages[0][0] if self.messages else self.seq + 1
+
+        # False if messages after « seq » are not kept anymore
+        header = {'since': seq, 'seq': self.seq, 'complete': (seq or 0) + 1 >= first}
+        payloads = [encode_event(self.name + '_replay', header)] + missed
+
+        codec = socket.codec
+
+        if codec is not JSON:
+            payloads = [codec.encode(JSON.decode(payload)) for payload in payloads]
+
+        if socket.websocket.batcher is not None or not self.batch_replay:
+            # Sent in one frame by the batcher, or one frame per message
+            for payload in payloads:
+                socket.send(payload)
+        else:
+            payload = codec.join(payloads) if len(payloads) > 1 else payloads[0]
+            socket.send(payload, build_frame(payload, codec.opcode), (self.name + '_replay', None))
+
+        if socket.websocket.metrics is not None:
+            socket.websocket.metrics.sent(self.name + '_replay', sum(len(payload) for payload in payloads))
+
+    def clear(self):
+        """
+            Drop all the kept messages, sequence numbers keep increasing.
+        """
+
+        self.messages.clear()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __repr__(self):
+        return '<History: %d message(s), seq %d>' % (len(self.messages), self.seq)
@@ -2,6 +2,8 @@ import abc
 
 import six
 
+from tornado_websockets.websocket import LIFECYCLE_HOOKS
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Module(object):
@@ -22,24 +24,34 @@ class Module(object):
     def context(self, value):
         self._websocket.context = value
 
-    def on(self, callback):
+    def on(self, callback=None, executor=False, rate_limit=None):
         """
             Shortcut for :meth:`tornado_websockets.websocket.WebSocket.on` decorator,
-            but with a specific prefix for each module.
+            but with a specific prefix for each module. A callback named ``connect``, ``open`` or ``close`` is still a
+            lifecycle hook.
 
             :param callback: function or a class method.
+            :param executor: ``True`` or an executor to run the callback outside the IOLoop thread.
+            :param rate_limit: ``None`` for no limit, otherwise the rate limit of this event for each client
             :type callback: Callable
+            :type executor: bool or concurrent.futures.Executor
+            :type rate_limit: dict
             :return: ``callback`` parameter.
         """
 
-        callback.__name__ = self.name + '_' + callback.__name__
+        if callback is None:
+            return lambda callback: self.on(callback, executor=executor, rate_limit=rate_limit)
+
+        name = callback.__name__
+        callback.__name__ = self.name + '_' + name
+        hook = name if name in LIFECYCLE_HOOKS else None
 
-        return self._websocket.on(callback)
+        return self._websocket.on(callback, executor=executor, rate_limit=rate_limit, hook=hook)
 
-    def emit(self, event, data=None):
+    def emit(self, event, data=None, room=None, local=False):
         """
             Shortcut for :meth:`tornado_websockets.websocket.WebSocket.emit` method,
             but with a specific prefix for each module.
         """
 
-        return self._websocket.emit(self.name + '_' + event, data)
+        return self._websocket.emit(self.name + '_' + event, data, room=room, local=local)
@@ -1,6 +1,54 @@
 # coding=utf-8
+import multiprocessing
+
+import tornado.ioloop
+from six import string_types
+
+from tornado_websockets.dispatch import executor_io_loop
 from tornado_websockets.modules.module import Module
 
+# Seconds between two samples of a watched ProgressCounter
+DEFAULT_SAMPLE_INTERVAL = 0.1
+
+
+class ProgressCounter(object):
+    """
+        Counter in shared memory, incremented by worker threads or processes without touching Tornado, and sampled
+        by a progress bar in the IOLoop (see :meth:`ProgressBar.watch`).
+
+        Like any ``multiprocessing.Value``, a counter is given to worker processes when they are created: as an
+        argument of ``multiprocessing.Process``, or with the ``initializer`` of a ``multiprocessing.Pool`` or
+        ``concurrent.futures.ProcessPoolExecutor``, not as an argument of a submitted task.
+
+        :param value: initial value
+        :type value: int
+    """
+
+    def __init__(self, value=0):
+        self.shared = multiprocessing.Value('q', value)
+
+    def add(self, n=1):
+        """
+            Increment the counter by ``n``, from any thread or process.
+
+            :param n: Increment
+            :type n: int
+        """
+
+        with self.shared.get_lock():
+            self.shared.value += n
+
+    @property
+    def value(self):
+        return self.shared.value
+
+    def reset(self, value=0):
+        with self.shared.get_lock():
+            self.shared.value = value
+
+    def __repr__(self):
+        return '<ProgressCounter: %d>' % self.value
+
 
 class ProgressBar(Module):
     """
@@ -9,13 +57,24 @@ class ProgressBar(Module):
         If ``min`` and ``max`` values are equal, this progress bar has its indeterminate state
         set to ``True``.
 
+        Updates can be throttled, so a progression of a million ticks does not send millions of messages to every
+        client: with ``max_rate``, at most ``max_rate`` updates are emitted per second, with ``min_step``, an update
+        is emitted when the progression advanced by at least ``min_step`` percent. Ticks in between are coalesced:
+        the next update carries the latest value and label, and the last update and ``done`` are always emitted.
+
         :param min: Minimum value
         :param max: Maximum value
+        :param max_rate: Maximum number of updates per second, ``None`` for no limit
+        :param min_step: Minimum progression between two updates, in percent, ``None`` for no limit
+        :param room: Room of the clients receiving the events, ``None`` for all the clients
         :type min: int
         :type max: int
+        :type max_rate: float
+        :type min_step: float
+        :type room: str
     """
 
-    def __init__(self, name='', min=0, max=100, indeterminate=False):
+    def __init__(self, name='', min=0, max=100, indeterminate=False, max_rate=None, min_step=None, room=None):
         if name:
             name = '_' + name
         super(ProgressBar, self).__init__('progressbar' + name)
@@ -23,42 +82,186 @@ class ProgressBar(Module):
         if max < min:
             raise ValueError('Param « min » can not be greater or equal than param « max ».')
 
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError('Param « max_rate » should be positive, got %r.' % max_rate)
+
+        if min_step is not None and not 0 < min_step <= 100:
+            raise ValueError('Param « min_step » should be between 0 and 100, got %r.' % min_step)
+
         self.min = self.current = min
         self.max = max
         self.indeterminate = indeterminate
+        self.max_rate = max_rate
+        self.min_step = min_step
+        self.room = room
+
+        # Last value emitted to clients and when, see update()
+        self.emitted = min
+        self.emitted_at = None
+        self.label = None
+        self._timeout = None
+
+        # Watched counter and its sampler, see watch()
+        self.counter = None
+        self._sampler = None
 
     def initialize(self):
         @self.on
         def open():
             self.emit_init()
 
-    def tick(self, label=None):
+    def tick(self, n=1, label=None):
         """
-            Increments progress bar's _current by ``1`` and emit ``update`` event. Can also emit ``done`` event if
-            progression is done.
+            Increments progress bar's current value by ``n`` (up to ``max``) and emit ``update`` event. Can also emit
+            ``done`` event if progression is done.
 
-            Call :meth:`~tornado_websockets.modules.progress_bar.ProgressBar.emit_update` method each time this
-            method is called.
+            Call :meth:`~tornado_websockets.modules.progress_bar.ProgressBar.update` method each time this
+            method is called, so the update is emitted or coalesced with the next ones if updates are throttled.
             Call :meth:`~tornado_websockets.modules.progress_bar.ProgressBar.emit_done` method if progression is
-            done.
+            done, after emitting the last update.
+
+            ``tick('My label')`` still increments by ``1``.
+
+            Called from a callback registered with ``@ws.on(executor=...)``, the tick is done in the IOLoop. From
+            other threads or processes, increment a :class:`ProgressCounter` instead.
 
+            :param n: Increment
             :param label: A label which can be displayed on the client screen
+            :type n: int
             :type label: str
         """
 
-        if not self.indeterminate and self.current < self.max:
-            self.current += 1
+        if isinstance(n, string_types):
+            n, label = 1, n
+
+        io_loop = executor_io_loop()
+
+        if io_loop is not None:
+            io_loop.add_callback(self.tick, n, label)
+            return
+
+        if not self.indeterminate:
+            self.current = min(self.current + n, self.max)
+
+        self.progress(label)
+
+    def watch(self, counter, interval=DEFAULT_SAMPLE_INTERVAL):
+        """
+            Follow a :class:`ProgressCounter` incremented by workers: every ``interval`` seconds, the IOLoop reads the
+            counter and, if it changed, sets the current value to ``min`` plus the counter and emits an update (which
+            can be throttled). Sampling stops when the progression is done, or with :meth:`unwatch`.
+
+            Should be called from the IOLoop, like in a callback of this module.
+
+            :param counter: counter incremented by workers
+            :param interval: seconds between two samples
+            :type counter: ProgressCounter
+            :type interval: float
+        """
+
+        if interval <= 0:
+            raise ValueError('Param « interval » should be positive, got %r.' % interval)
+
+        self.unwatch()
+        self.counter = counter
+        self._sampler = tornado.ioloop.PeriodicCallback(self.sample, interval * 1000)
+        self._sampler.start()
+
+    def unwatch(self):
+        """
+            Stop sampling the watched counter.
+        """
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+        self.counter = None
+
+    def sample(self):
+        """
+            Read the watched counter and update the progression if it changed, called by the IOLoop.
+        """
+
+        if self.counter is None:
+            return
+
+        current = max(self.min, min(self.min + self.counter.value, self.max))
+
+        if current == self.current:
+            return
 
-        self.emit_update(label)
+        self.current = current
+        self.progress(self.label)
 
+    def progress(self, label=None):
         if self.is_done():
+            self.unwatch()
+            self.label = label
+            self.flush()
             self.emit_done()
+        else:
+            self.update(label)
+
+    def update(self, label=None):
+        """
+            Emit an ``update`` event for the current value, unless updates are throttled: then the update is emitted
+            when ``min_step`` is reached and at most ``max_rate`` times per second. An update delayed by ``max_rate``
+            is emitted by the IOLoop, with the latest value and label.
+
+            :param label: A label which can be displayed on the client screen
+            :type label: str
+        """
+
+        self.label = label
+
+        if self.max_rate is None and self.min_step is None:
+            self.flush()
+            return
+
+        if self.min_step is not None and not self.indeterminate and self.max > self.min:
+            if (self.current - self.emitted) * 100.0 / (self.max - self.min) < self.min_step:
+                return
+
+        if self.max_rate is not None and self.emitted_at is not None:
+            io_loop = tornado.ioloop.IOLoop.current()
+            delay = self.emitted_at + 1.0 / self.max_rate - io_loop.time()
+
+            if delay > 0:
+                if self._timeout is None:
+                    self._timeout = io_loop.call_later(delay, self.flush)
+
+                return
+
+        self.flush()
+
+    def flush(self):
+        """
+            Emit the latest value and label now, even if updates are throttled.
+        """
+
+        self.cancel()
+        self.emit_update(self.label)
+        self.emitted = self.current
+
+        if self.max_rate is not None:
+            self.emitted_at = tornado.ioloop.IOLoop.current().time()
+
+    def cancel(self):
+        if self._timeout is not None:
+            tornado.ioloop.IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
 
     def reset(self):
         """
-            Reset progress bar's progression to its minimum value.
+            Reset progress bar's progression to its minimum value, a delayed update is cancelled and the watched
+            counter is not sampled anymore.
         """
-        self.current = self.min
+
+        self.cancel()
+        self.unwatch()
+        self.current = self.emitted = self.min
+        self.emitted_at = None
 
     def is_done(self):
         """
@@ -74,16 +277,20 @@ class ProgressBar(Module):
         if self.indeterminate:
             return False
 
-        if self.current is self.max:
+        if self.current == self.max:
             return True
 
         return False
 
-    def emit_init(self):
+    def emit(self, event, data=None):
+        return super(ProgressBar, self).emit(event, data, room=self.room)
+
+    def state(self):
         """
-            Emit ``before_init``, ``init`` and ``after_init`` events to initialize a client-side progress bar.
+            Return the data of the ``init`` event: the ``indeterminate`` state and, if progress bar is not
+            indeterminate, its ``min``, ``max`` and ``current`` values.
 
-            If progress bar is not indeterminate, ``min``, ``max`` and ``value`` values are sent with ``init`` event.
+            :rtype: dict
         """
 
         data = {'indeterminate': self.indeterminate}
@@ -95,8 +302,17 @@ class ProgressBar(Module):
                 'current': int(self.current),
             })
 
+        return data
+
+    def emit_init(self):
+        """
+            Emit ``before_init``, ``init`` and ``after_init`` events to initialize a client-side progress bar.
+
+            If progress bar is not indeterminate, ``min``, ``max`` and ``value`` values are sent with ``init`` event.
+        """
+
         self.emit('before_init')
-        self.emit('init', data)
+        self.emit('init', self.state())
         self.emit('after_init')
 
     def emit_update(self, label=None):
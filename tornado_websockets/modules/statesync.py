@@ -0,0 +1,216 @@
+# coding=utf-8
+from collections import deque
+
+from tornado_websockets.modules.module import Module
+
+DEFAULT_HISTORY = 1000
+
+
+class StateSync(Module):
+    """
+        Initialize a new StateSync module instance: a dictionary shared with every client, kept in sync with compact
+        diffs instead of the whole dictionary.
+
+        Each change increments the version of the state and broadcasts a ``diff`` event with the changed keys only:
+        ``{'since': 4, 'version': 5, 'set': {'key': 'value'}, 'unset': ['other']}`` (``set`` and ``unset`` are
+        omitted when empty). A client applies a diff if ``since`` is its version, otherwise it missed a diff and
+        sends a ``sync`` event.
+
+        A new client receives a ``snapshot`` event on open: ``{'version': 5, 'state': {...}}``. A reconnecting client
+        passes the last version it knows, with the ``sync`` event and ``{'version': 5}`` or with the
+        ``<module name>_version`` query argument of its connection, and receives one ``diff`` event merging the diffs
+        since this version. The last ``history`` diffs are kept, a client further behind receives a snapshot.
+
+        Values should be serializable and replaced instead of modified in place, changes are detected by comparing
+        them with the current values.
+
+        The state and its version belong to the process: with several workers, each one keeps its own state and
+        sends its diffs to its own clients only (see ``local`` of :meth:`WebSocket.emit()
+        <tornado_websockets.websocket.WebSocket.emit>`), so a client never receives versions of another process.
+
+        :param state: Initial state
+        :param history: Number of diffs kept for reconnecting clients
+        :type state: dict
+        :type history: int
+    """
+
+    def __init__(self, name='', state=None, history=DEFAULT_HISTORY):
+        if name:
+            name = '_' + name
+        super(StateSync, self).__init__('statesync' + name)
+
+        if history < 1:
+            raise ValueError('Param « history » should be at least 1, got %r.' % history)
+
+        self.state = dict(state or {})
+        self.version = 0
+        # (version, set, unset) of the last changes, the oldest first
+        self.changes = deque(maxlen=history)
+
+    def initialize(self):
+        @self.on
+        def open(socket):
+            version = socket.get_query_argument(self.name + '_version', None)
+            self.sync(socket, version)
+
+        @self.on
+        def sync(socket, data):
+            self.sync(socket, data.get('version'))
+
+    def __getitem__(self, key):
+        return self.state[key]
+
+    def __contains__(self, key):
+        return key in self.state
+
+    def __len__(self):
+        return len(self.state)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        """
+            Set the value of a key, shortcut for :meth:`update`.
+
+            :param key: Key
+            :param value: New value
+            :type key: str
+        """
+
+        return self.update({key: value})
+
+    def update(self, values=None, **kwargs):
+        """
+            Set the values of several keys, and broadcast a single ``diff`` event with the values which changed.
+            Nothing is broadcasted if no value changed.
+
+            :param values: New values by key
+            :type values: dict
+            :return: New version
+            :rtype: int
+        """
+
+        values = dict(values or {}, **kwargs)
+        changed = {}
+
+        for key, value in values.items():
+            if key not in self.state or self.state[key] != value:
+                changed[key] = value
+
+        return self.apply(changed, [])
+
+    def delete(self, *keys):
+        """
+            Delete keys, and broadcast a ``diff`` event if some existed.
+
+            :return: New version
+            :rtype: int
+        """
+
+        return self.apply({}, [key for key in keys if key in self.state])
+
+    def clear(self):
+        """
+            Delete all keys.
+
+            :return: New version
+            :rtype: int
+        """
+
+        return self.apply({}, list(self.state))
+
+    def apply(self, changed, removed):
+        if not changed and not removed:
+            return self.version
+
+        self.state.update(changed)
+
+        for key in removed:
+            del self.state[key]
+
+        self.version += 1
+        self.changes.append((self.version, changed, removed))
+        self.emit('diff', self.diff(self.version - 1, changed, removed), local=True)
+
+        return self.version
+
+    def diff(self, since, changed, removed):
+        data = {'since': since, 'version': self.version}
+
+        if changed:
+            data['set'] = changed
+
+        if removed:
+            data['unset'] = sorted(removed)
+
+        return data
+
+    def snapshot(self):
+        """
+            Return the data of the ``snapshot`` event.
+
+            :rtype: dict
+        """
+
+        return {'version': self.version, 'state': dict(self.state)}
+
+    def diff_since(self, version):
+        """
+            Return the data of a ``diff`` event merging the changes since ``version``, or ``None`` if they are not
+            kept anymore.
+
+            :param version: Version known by a client
+            :type version: int
+            :rtype: dict
+        """
+
+        if version > self.version:
+            return None
+
+        if version < self.version and (not self.changes or self.changes[0][0] > version + 1):
+            return None
+
+        changed = {}
+        removed = set()
+
+        for change_version, change_set, change_unset in self.changes:
+            if change_version <= version:
+                continue
+
+            for key, value in change_set.items():
+                changed[key] = value
+                removed.discard(key)
+
+            for key in change_unset:
+                changed.pop(key, None)
+                removed.add(key)
+
+        return self.diff(version, changed, removed)
+
+    def sync(self, socket, version=None):
+        """
+            Send the changes since ``version`` to a client, or a snapshot if ``version`` is ``None``, invalid or too
+            old.
+
+            :param socket: Client
+            :param version: Version known by the client
+            :type socket: tornado_websockets.websockethandler.WebSocketHandler
+            :type version: int
+        """
+
+        data = None
+
+        if version is not None:
+            try:
+                data = self.diff_since(int(version))
+            except (TypeError, ValueError):
+                pass
+
+        if data is None:
+            socket.emit(self.name + '_snapshot', self.snapshot())
+        else:
+            socket.emit(self.name + '_diff', data)
+
+    def __repr__(self):
+        return '<StateSync: %d key(s), version %d>' % (len(self.state), self.version)
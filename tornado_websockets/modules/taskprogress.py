@@ -0,0 +1,329 @@
+# coding=utf-8
+from collections import OrderedDict
+from timeit import default_timer
+
+from six import text_type
+
+from tornado_websockets.modules.module import Module
+from tornado_websockets.modules.progressbar import ProgressBar
+
+DEFAULT_MAX_TASKS = 10000
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SUBSCRIPTIONS = 100
+
+
+class TaskProgressBar(ProgressBar):
+    """
+        Progress bar of one task of a :class:`TaskProgress` module, created by :meth:`TaskProgress.create`.
+
+        Its events are sent to the subscribers of the task only, with the task id in their data (``task``).
+    """
+
+    def __init__(self, module, task_id, **options):
+        options['room'] = module.room(task_id)
+        super(TaskProgressBar, self).__init__(**options)
+
+        # Events are named after the module, like module_taskprogress_update
+        self.name = module.name
+        self._websocket = module._websocket
+        self.module = module
+        self.task_id = task_id
+
+    def initialize(self):
+        pass
+
+    def emit(self, event, data=None):
+        data = dict(data or {}, task=self.task_id)
+
+        return super(TaskProgressBar, self).emit(event, data)
+
+    def progress(self, label=None):
+        self.module.touch(self)
+        super(TaskProgressBar, self).progress(label)
+
+    def emit_done(self):
+        super(TaskProgressBar, self).emit_done()
+        self.module.finish(self.task_id)
+
+    def reset(self):
+        super(TaskProgressBar, self).reset()
+        self.module.finished.pop(self.task_id, None)
+
+
+class TaskProgress(Module):
+    """
+        Initialize a new TaskProgress module instance: one progress bar per task (an export, an import, ...),
+        each client only receives the events of the tasks it subscribed to.
+
+        A client subscribes to a task with the ``subscribe`` event and ``{'task': task_id}``, it receives the ``init``
+        event of the task right away if it exists, otherwise when it is created. It unsubscribes with the
+        ``unsubscribe`` event, or by closing its connection. The subscribers of a task are a room of the WebSocket,
+        so an update costs the number of subscribers of its task, whatever the number of tasks.
+
+        A client can only subscribe to the tasks ``authorize(socket, task_id)`` allows, every task by default: pass
+        it (or override :meth:`authorize`) when tasks belong to users. A client subscribes to at most
+        ``max_subscriptions`` tasks at the same time, so subscriptions to tasks which do not exist yet stay bounded.
+
+        Progress bars are kept in an index by task id, which stays bounded across millions of tasks: a finished task
+        is removed ``ttl`` seconds after it is done, and when there are more than ``max_tasks`` tasks, the oldest
+        finished task is removed, or the least recently used task (created, got or ticked) if none is finished.
+        Expired tasks are removed by :meth:`create`, :meth:`get` and subscriptions, so no timer runs. The
+        subscribers of a removed task leave its room.
+
+        Task ids are strings, other values are converted.
+
+        Statistics:
+
+        - ``evicted``: number of tasks removed by ``ttl`` or ``max_tasks``.
+
+        :param max_tasks: Maximum number of tasks in the index
+        :param ttl: Seconds a finished task stays in the index, ``None`` to keep it until it is evicted by
+                    ``max_tasks``
+        :param authorize: Function called with a client and a task id, returning ``True`` if the client can
+                          subscribe to the task
+        :param max_subscriptions: Maximum number of tasks a client subscribes to at the same time
+        :param options: Default options of the progress bars, see :class:`ProgressBar`
+        :type max_tasks: int
+        :type ttl: float
+        :type authorize: callable
+        :type max_subscriptions: int
+        :type options: dict
+    """
+
+    def __init__(self, name='', max_tasks=DEFAULT_MAX_TASKS, ttl=DEFAULT_TTL, authorize=None,
+                 max_subscriptions=DEFAULT_MAX_SUBSCRIPTIONS, **options):
+        if name:
+            name = '_' + name
+        super(TaskProgress, self).__init__('taskprogress' + name)
+
+        if max_tasks < 1:
+            raise ValueError('Param « max_tasks » should be at least 1, got %r.' % max_tasks)
+
+        if ttl is not None and ttl <= 0:
+            raise ValueError('Param « ttl » should be positive, got %r.' % ttl)
+
+        if max_subscriptions < 1:
+            raise ValueError('Param « max_subscriptions » should be at least 1, got %r.' % max_subscriptions)
+
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self._authorize = authorize
+        self.max_subscriptions = max_subscriptions
+        self.options = options
+
+        # Progress bars by task id, the least recently used first
+        self.tasks = OrderedDict()
+        # Expiry time of finished tasks (None without ttl), the first finished first
+        self.finished = OrderedDict()
+        self.evicted = 0
+
+    def initialize(self):
+        @self.on
+        def subscribe(socket, data):
+            self.subscribe(socket, data.get('task'))
+
+        @self.on
+        def unsubscribe(socket, data):
+            if data.get('task') is not None:
+                socket.leave(self.room(text_type(data['task'])))
+
+    def room(self, task_id):
+        """
+            Return the room of the subscribers of a task.
+
+            :param task_id: Task id
+            :type task_id: str
+            :rtype: str
+        """
+
+        return '%s:%s' % (self.name, task_id)
+
+    def authorize(self, socket, task_id):
+        """
+            Return ``True`` if a client can subscribe to a task, calls the ``authorize`` function of this module.
+
+            :param socket: Client
+            :param task_id: Task id
+            :type socket: tornado_websockets.websockethandler.WebSocketHandler
+            :type task_id: str
+            :rtype: bool
+        """
+
+        return self._authorize is None or bool(self._authorize(socket, task_id))
+
+    def subscriptions(self, socket):
+        """
+            Return the number of tasks a client subscribed to.
+
+            :rtype: int
+        """
+
+        prefix = self.name + ':'
+
+        return sum(1 for room in socket.rooms if room.startswith(prefix))
+
+    def subscribe(self, socket, task_id):
+        """
+            Subscribe a client to the events of a task if it is authorized, and send it the current state of the task
+            if it exists.
+
+            :param socket: Client
+            :param task_id: Task id
+            :type socket: tornado_websockets.websockethandler.WebSocketHandler
+            :type task_id: str
+        """
+
+        if task_id is None:
+            socket.emit_warning('The task to subscribe to is missing.')
+            return
+
+        task_id = text_type(task_id)
+        room = self.room(task_id)
+
+        if not self.authorize(socket, task_id):
+            socket.emit_warning('You are not allowed to subscribe to the task %s.' % task_id)
+            return
+
+        if room not in socket.rooms and self.subscriptions(socket) >= self.max_subscriptions:
+            socket.emit_warning('You can not subscribe to more than %d tasks.' % self.max_subscriptions)
+            return
+
+        socket.join(room)
+        progressbar = self.get(task_id)
+
+        if progressbar is None:
+            return
+
+        for event, data in (('before_init', None), ('init', progressbar.state()), ('after_init', None)):
+            socket.emit(self.name + '_' + event, dict(data or {}, task=task_id))
+
+        if progressbar.is_done():
+            socket.emit(self.name + '_done', {'task': task_id})
+
+    def create(self, task_id, **options):
+        """
+            Create the progress bar of a task, and send its ``init`` event to the clients which already subscribed
+            to it. A task with the same id is replaced.
+
+            :param task_id: Task id
+            :param options: Options of the progress bar, they override the default options of this module
+            :type task_id: str
+            :type options: dict
+            :rtype: TaskProgressBar
+        """
+
+        self.expire()
+        task_id = text_type(task_id)
+
+        # Subscribers of a replaced task stay subscribed
+        self.discard(task_id)
+
+        options = dict(self.options, **options)
+        progressbar = self.tasks[task_id] = TaskProgressBar(self, task_id, **options)
+
+        while len(self.tasks) > self.max_tasks:
+            # Finished tasks first, a running task is only evicted if every task is running
+            self.evict(next(iter(self.finished or self.tasks)))
+
+        progressbar.emit_init()
+
+        return progressbar
+
+    def get(self, task_id):
+        """
+            Return the progress bar of a task, or ``None`` if the task does not exist or was removed.
+
+            :param task_id: Task id
+            :type task_id: str
+            :rtype: TaskProgressBar
+        """
+
+        self.expire()
+        task_id = text_type(task_id)
+        progressbar = self.tasks.get(task_id)
+
+        if progressbar is not None:
+            self.touch(progressbar)
+
+        return progressbar
+
+    def touch(self, progressbar):
+        """
+            Mark the task of a progress bar as the most recently used one, called by :meth:`get` and on each
+            progression.
+        """
+
+        task_id = progressbar.task_id
+
+        if self.tasks.get(task_id) is progressbar:
+            del self.tasks[task_id]
+            self.tasks[task_id] = progressbar
+
+    def remove(self, task_id):
+        """
+            Remove a task from the index, its delayed update and its sampling of a counter are cancelled and its
+            subscribers leave its room.
+
+            :param task_id: Task id
+            :type task_id: str
+            :rtype: TaskProgressBar
+        """
+
+        task_id = text_type(task_id)
+        progressbar = self.discard(task_id)
+
+        if progressbar is not None:
+            room = self.room(task_id)
+
+            for handler in list(self._websocket.rooms.get(room) or ()):
+                self._websocket.leave(room, handler)
+
+        return progressbar
+
+    def discard(self, task_id):
+        self.finished.pop(task_id, None)
+        progressbar = self.tasks.pop(task_id, None)
+
+        if progressbar is not None:
+            progressbar.cancel()
+            progressbar.unwatch()
+
+        return progressbar
+
+    def evict(self, task_id):
+        self.remove(task_id)
+        self.evicted += 1
+
+    def finish(self, task_id):
+        """
+            Mark a task as finished and schedule its removal, called when a progress bar is done.
+        """
+
+        if task_id in self.tasks:
+            self.finished.pop(task_id, None)
+            self.finished[task_id] = default_timer() + self.ttl if self.ttl is not None else None
+
+    def expire(self):
+        """
+            Remove the finished tasks whose ``ttl`` elapsed.
+        """
+
+        if self.ttl is None:
+            # Finished tasks never expire, they are only evicted first
+            return
+
+        now = default_timer()
+
+        while self.finished:
+            task_id, expires_at = next(iter(self.finished.items()))
+
+            if expires_at > now:
+                break
+
+            self.evict(task_id)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __repr__(self):
+        return '<TaskProgress: %d task(s), %d evicted>' % (len(self.tasks), self.evicted)
@@ -0,0 +1,219 @@
+# coding: utf-8
+
+"""
+    Outbound flow control of a connection, so a slow client can not make the server buffer messages without limit.
+"""
+
+import collections
+import functools
+import logging
+
+import tornado.websocket
+
+logger = logging.getLogger(__name__)
+
+# Policies applied when the queue of a slow client is full
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+DEFAULT_HIGH_WATERMARK = 1024 * 1024
+DEFAULT_LOW_WATERMARK = 256 * 1024
+
+# « Try Again Later », sent to clients disconnected by the « disconnect » policy
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def outbound_options(high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=DEFAULT_LOW_WATERMARK, queue_limit=None,
+                     policy=DROP_OLDEST):
+    """
+        Check options of :class:`OutboundQueue` and return them with their default values, used by
+        :class:`~tornado_websockets.websocket.WebSocket` for its ``outbound`` parameter.
+
+        :param high_watermark: bytes being written to a client above which new messages are queued
+        :param low_watermark: bytes being written to a client below which queued messages are written again
+        :param queue_limit: bytes which can be queued for a client before applying ``policy``, ``high_watermark``
+                            by default
+        :param policy: ``'drop_oldest'``, ``'coalesce'`` or ``'disconnect'``
+        :type high_watermark: int
+        :type low_watermark: int
+        :type queue_limit: int
+        :type policy: str
+        :rtype: dict
+    """
+
+    if low_watermark < 0 or high_watermark < low_watermark:
+        raise ValueError('Watermarks should verify 0 <= low_watermark <= high_watermark, got %d and %d.' % (
+            low_watermark, high_watermark
+        ))
+
+    if queue_limit is None:
+        queue_limit = high_watermark
+    elif queue_limit < 0:
+        raise ValueError('Param « queue_limit » can not be negative, got %d.' % queue_limit)
+
+    if policy not in POLICIES:
+        raise ValueError('Param « policy » should be one of %s, got %r.' % (', '.join(POLICIES), policy))
+
+    return {
+        'high_watermark': high_watermark,
+        'low_watermark': low_watermark,
+        'queue_limit': queue_limit,
+        'policy': policy,
+    }
+
+
+class OutboundQueue(object):
+    """
+        Outbound messages of a :class:`~tornado_websockets.websockethandler.WebSocketHandler`.
+
+        Messages are written to the connection as long as less than ``high_watermark`` bytes are waiting to be
+        flushed to the client. Above, the client is slow: messages are queued until the pending bytes go down to
+        ``low_watermark``. When more than ``queue_limit`` bytes are queued, the policy decides what to do:
+
+        - ``'drop_oldest'``: oldest queued messages are dropped,
+        - ``'coalesce'``: a queued message is replaced by a newer message with the same coalesce key (only the last
+          progress update matters), then oldest messages are dropped if the queue is still too big. Messages
+          broadcasted by :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` are keyed by their
+          event and room, so updates of different rooms are all kept,
+        - ``'disconnect'``: the connection is closed with code ``1013``.
+
+        ``dropped_messages`` and ``dropped_bytes`` count messages which were never sent to the client.
+
+        :param handler: connection
+        :type handler: tornado_websockets.websockethandler.WebSocketHandler
+    """
+
+    def __init__(self, handler, high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=DEFAULT_LOW_WATERMARK,
+                 queue_limit=None, policy=DROP_OLDEST):
+        self.handler = handler
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.queue_limit = high_watermark if queue_limit is None else queue_limit
+        self.policy = policy
+
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.dropped_messages = 0
+        self.dropped_bytes = 0
+
+        # Queued messages indexed by their coalesce key, for the « coalesce » policy
+        self._keys = {}
+
+        # Offsets in the stream of bytes written to the connection, a write future resolves once its bytes (and so
+        # every bytes written before) are flushed
+        self._written = 0
+        self._flushed = 0
+
+    @property
+    def pending_bytes(self):
+        """
+            Bytes written to the connection but not flushed to the client yet.
+
+            :rtype: int
+        """
+
+        return self._written - self._flushed
+
+    def send(self, payload, frame=None, key=None):
+        """
+            Write a message to the connection, or queue it if the client is slow.
+
+            :param payload: encoded message
+            :param frame: complete WebSocket frame around ``payload``, or ``None`` to let Tornado frame it
+            :param key: coalesce key of the message, ``None`` if it should never replace another message
+            :type payload: bytes
+            :type frame: bytes
+            :type key: hashable
+            :raise: :class:`tornado.websocket.WebSocketClosedError` if connection is closed.
+        """
+
+        if not self.queue and self.pending_bytes < self.high_watermark:
+            self.write(payload, frame)
+            return
+
+        size = len(frame) if frame is not None else len(payload)
+        queued = self._keys.get(key) if self.policy == COALESCE and key is not None else None
+
+        if queued is not None:
+            # Keep the place of the previous message, so events stay ordered
+            self.count_dropped(queued[3])
+            self.queued_bytes += size - queued[3]
+            queued[:] = [payload, frame, key, size]
+        else:
+            message = [payload, frame, key, size]
+            self.queue.append(message)
+            self.queued_bytes += size
+
+            if self.policy == COALESCE and key is not None:
+                self._keys[key] = message
+
+        if self.queued_bytes > self.queue_limit:
+            self.overflow()
+
+    def write(self, payload, frame):
+        future = self.handler.write_now(payload, frame)
+        self._written += len(frame) if frame is not None else len(payload)
+        future.add_done_callback(functools.partial(self.on_flushed, self._written))
+
+    def on_flushed(self, offset, future):
+        if future.cancelled() or future.exception() is not None:
+            # Connection is closed, its on_close() will clear the queue
+            return
+
+        self._flushed = max(self._flushed, offset)
+
+        if self.queue and self.pending_bytes <= self.low_watermark:
+            self.drain()
+
+    def drain(self):
+        """
+            Write queued messages until the connection is above ``high_watermark`` again.
+        """
+
+        while self.queue and self.pending_bytes < self.high_watermark:
+            payload, frame, key, size = self.pop()
+
+            try:
+                self.write(payload, frame)
+            except tornado.websocket.WebSocketClosedError:
+                self.clear()
+                return
+
+    def overflow(self):
+        if self.policy == DISCONNECT:
+            logger.warning('Closing slow connection %d of %s, %d bytes are queued.',
+                           self.handler.id, self.handler.websocket.path, self.queued_bytes)
+            self.clear()
+            self.handler.close(SLOW_CONSUMER_CLOSE_CODE, 'Slow consumer')
+            return
+
+        while self.queued_bytes > self.queue_limit:
+            self.count_dropped(self.pop()[3])
+
+    def pop(self):
+        message = self.queue.popleft()
+        self.queued_bytes -= message[3]
+
+        if self._keys.get(message[2]) is message:
+            del self._keys[message[2]]
+
+        return message
+
+    def count_dropped(self, size):
+        self.dropped_messages += 1
+        self.dropped_bytes += size
+
+    def clear(self):
+        """
+            Drop every queued message, when the connection is closed.
+        """
+
+        while self.queue:
+            self.count_dropped(self.pop()[3])
+
+    def __repr__(self):
+        return '<OutboundQueue: %d pending byte(s), %d queued message(s), %d dropped message(s)>' % (
+            self.pending_bytes, len(self.queue), self.dropped_messages
+        )
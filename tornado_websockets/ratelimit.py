@@ -0,0 +1,91 @@
+# coding: utf-8
+
+"""
+    Token bucket rate limits of the messages sent by each client.
+"""
+
+from timeit import default_timer
+
+# What to do with a message above the limit
+ACTIONS = ('warn', 'drop', 'close')
+
+# Close code of clients above a limit with the « close » action, « Policy Violation »
+CLOSE_CODE = 1008
+
+
+class RateLimit(object):
+    """
+        Limits the rate of messages of each client with a token bucket: a client can send ``burst`` messages at
+        once, then ``rate`` messages per second. Used for all the messages of a client (see the ``rate_limit``
+        parameter of :class:`~tornado_websockets.websocket.WebSocket`) and for one event (see
+        :meth:`WebSocket.on() <tornado_websockets.websocket.WebSocket.on>`).
+
+        A message above the limit is not dispatched, and:
+
+        - ``'warn'``: the client receives a ``warning`` event,
+        - ``'drop'``: nothing else happens,
+        - ``'close'``: the connection is closed with code ``1008``.
+
+        The state of a bucket is a list of two floats kept by each client (``socket.buckets``), created on its first
+        message.
+
+        :param rate: messages per second
+        :param burst: maximum number of messages at once, ``rate`` (at least ``1``) by default
+        :param action: ``'warn'``, ``'drop'`` or ``'close'``
+        :type rate: float
+        :type burst: int
+        :type action: str
+    """
+
+    def __init__(self, rate, burst=None, action='warn'):
+        if rate <= 0:
+            raise ValueError('Param « rate » should be positive, got %r.' % rate)
+
+        if burst is None:
+            burst = max(1, rate)
+
+        if burst < 1:
+            raise ValueError('Param « burst » should be at least 1, got %r.' % burst)
+
+        if action not in ACTIONS:
+            raise ValueError('Param « action » should be one of %s, got %r.' % (', '.join(ACTIONS), action))
+
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.action = action
+
+    def bucket(self):
+        """
+            Return the state of a full bucket: ``[tokens, time of the last update]``.
+
+            :rtype: list
+        """
+
+        return [self.burst, default_timer()]
+
+    def consume(self, bucket):
+        """
+            Refill ``bucket`` for the time elapsed since its last update, then take a token from it.
+
+            :param bucket: state returned by :meth:`bucket`, updated in place
+            :type bucket: list
+            :return: ``False`` if the bucket is empty, so the message is above the limit
+            :rtype: bool
+        """
+
+        now = default_timer()
+        tokens = bucket[0] + (now - bucket[1]) * self.rate
+        bucket[1] = now
+
+        if tokens > self.burst:
+            tokens = self.burst
+
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+
+        bucket[0] = tokens - 1
+        return True
+
+    def __repr__(self):
+        return '<RateLimit: %g/s, burst of %g, %s>' % (self.rate, self.burst, self.action)
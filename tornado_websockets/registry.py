@@ -0,0 +1,78 @@
+# coding: utf-8
+
+
+class ConnectionRegistry(object):
+    """
+        Set of :class:`~tornado_websockets.websockethandler.WebSocketHandler` indexed by their connection id (their
+        ``id`` attribute), used for :attr:`WebSocket.handlers <tornado_websockets.websocket.WebSocket.handlers>`.
+
+        Adding, removing and finding a connection are O(1). Iterating over the registry iterates over a snapshot, so
+        connections can be added or removed while a broadcast is running. The snapshot is kept until the next change,
+        so successive broadcasts on a stable set of connections do not copy anything.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._snapshot = None
+
+    def add(self, handler):
+        """
+            Add a connection to the registry.
+
+            :param handler: connection to add
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        self._handlers[handler.id] = handler
+        self._snapshot = None
+
+    def remove(self, handler):
+        """
+            Remove a connection from the registry, if it is registered.
+
+            :param handler: connection to remove
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+            :return: ``True`` if the connection was registered, otherwise ``False``.
+            :rtype: bool
+        """
+
+        if self._handlers.pop(handler.id, None) is None:
+            return False
+
+        self._snapshot = None
+        return True
+
+    def get(self, id, default=None):
+        """
+            Return the connection identified by ``id``, or ``default`` if there is no such connection.
+
+            :param id: connection id, see ``WebSocketHandler.id``
+            :type id: int
+            :rtype: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        return self._handlers.get(id, default)
+
+    def count(self):
+        """
+            Return the number of connections.
+
+            :rtype: int
+        """
+
+        return len(self._handlers)
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def __contains__(self, handler):
+        return self._handlers.get(handler.id) is handler
+
+    def __iter__(self):
+        if self._snapshot is None:
+            self._snapshot = tuple(self._handlers.values())
+
+        return iter(self._snapshot)
+
+    def __repr__(self):
+        return '<ConnectionRegistry: %d connection(s)>' % len(self._handlers)
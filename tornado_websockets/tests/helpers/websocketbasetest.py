@@ -5,10 +5,11 @@ from tornado.websocket import websocket_connect
 
 class WebSocketBaseTestCase(AsyncHTTPTestCase):
     @gen.coroutine
-    def ws_connect(self, path, compression_options=None):
+    def ws_connect(self, path, compression_options=None, **kwargs):
         ws = yield websocket_connect(
             'ws://127.0.0.1:%d%s' % (self.get_http_port(), path),
-            compression_options=compression_options
+            compression_options=compression_options,
+            **kwargs
         )
 
         raise gen.Return(ws)
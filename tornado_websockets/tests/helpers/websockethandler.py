@@ -12,8 +12,12 @@ class WebSocketHandlerForTests(WebSocketHandler):
         self.compression_options = compression_options
 
     def get_compression_options(self):
-        return self.compression_options
+        if self.compression_options is not None:
+            return self.compression_options
+
+        return super(WebSocketHandlerForTests, self).get_compression_options()
 
     def on_close(self):
         super(WebSocketHandlerForTests, self).on_close()
-        self.close_future.set_result((self.close_code, self.close_reason))
+        if not self.close_future.done():
+            self.close_future.set_result((self.close_code, self.close_reason))
@@ -0,0 +1,72 @@
+# coding: utf-8
+
+from unittest import TestCase
+
+import tornado.web
+
+from tornado_websockets.admission import Admission
+
+
+class TestAdmission(TestCase):
+    """
+        Tests for the class « Admission ».
+    """
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « max_connections » should be at least 1, got 0.'):
+            Admission(max_connections=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « max_per_ip » should be at least 1, got -1.'):
+            Admission(max_per_ip=-1)
+
+    def test_admit_without_limits(self):
+        admission = Admission()
+
+        for _ in range(100):
+            admission.admit('127.0.0.1')
+
+        self.assertEqual(admission.connections, 100)
+        self.assertDictEqual(admission.per_ip, {'127.0.0.1': 100})
+
+    def test_max_connections(self):
+        admission = Admission(max_connections=2)
+        admission.admit('10.0.0.1')
+        admission.admit('10.0.0.2')
+
+        with self.assertRaises(tornado.web.HTTPError) as context:
+            admission.admit('10.0.0.3')
+
+        self.assertEqual(context.exception.status_code, 503)
+        self.assertEqual(admission.rejected, 1)
+        self.assertEqual(admission.connections, 2)
+
+        admission.release('10.0.0.1')
+        admission.admit('10.0.0.3')
+
+        self.assertDictEqual(admission.per_ip, {'10.0.0.2': 1, '10.0.0.3': 1})
+
+    def test_max_per_ip(self):
+        admission = Admission(max_per_ip=2)
+        admission.admit('10.0.0.1')
+        admission.admit('10.0.0.1')
+        admission.admit('10.0.0.2')
+
+        with self.assertRaises(tornado.web.HTTPError) as context:
+            admission.admit('10.0.0.1')
+
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(context.exception.log_message, 'Too many connections from 10.0.0.1.')
+        self.assertEqual(admission.connections, 3)
+
+    def test_release(self):
+        admission = Admission()
+        admission.admit('10.0.0.1')
+        admission.admit('10.0.0.1')
+
+        admission.release('10.0.0.1')
+        self.assertDictEqual(admission.per_ip, {'10.0.0.1': 1})
+
+        admission.release('10.0.0.1')
+        admission.release('10.0.0.1')
+        self.assertDictEqual(admission.per_ip, {})
+        self.assertEqual(admission.connections, 0)
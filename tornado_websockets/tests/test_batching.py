@@ -0,0 +1,92 @@
+# coding: utf-8
+
+import six
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+from tornado.websocket import WebSocketClosedError
+
+from tornado_websockets.batching import Batcher
+from tornado_websockets.codec import JSON
+from tornado_websockets.frame import build_frame
+
+if six.PY2:
+    from mock import ANY, Mock
+else:
+    from unittest.mock import ANY, Mock
+
+
+class TestBatcher(AsyncTestCase):
+    """
+        Tests for the class « Batcher ».
+    """
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            Batcher(-1)
+
+    @gen_test
+    def test_flush_at_next_iteration(self):
+        batcher = Batcher()
+        handler1, handler2, handler3 = Mock(codec=JSON), Mock(codec=JSON), Mock(codec=JSON)
+        first, second, direct = b'{"event": "first"}', b'{"event": "second"}', b'{"event": "direct"}'
+
+        for handler in (handler1, handler2, handler3):
+            batcher.add(handler, first)
+            batcher.add(handler, second)
+        batcher.add(handler3, direct)
+
+        handler1.outbound.send.assert_not_called()
+
+        yield gen.moment
+
+        payload = JSON.join([first, second])
+        handler1.outbound.send.assert_called_once_with(payload, build_frame(payload))
+        handler3.outbound.send.assert_called_once_with(JSON.join([first, second, direct]), ANY)
+
+        # Same messages, same frame
+        self.assertIs(handler1.outbound.send.call_args[0][1], handler2.outbound.send.call_args[0][1])
+
+        self.assertEqual(batcher.messages, 7)
+        self.assertEqual(batcher.frames, 3)
+        self.assertEqual(batcher.flushes, 1)
+        self.assertGreaterEqual(batcher.average_latency, 0)
+
+    @gen_test
+    def test_single_message_is_not_wrapped(self):
+        batcher = Batcher()
+        handler = Mock(codec=JSON)
+
+        batcher.add(handler, b'{"event": "alone"}')
+        yield gen.moment
+
+        handler.outbound.send.assert_called_once_with(b'{"event": "alone"}', build_frame(b'{"event": "alone"}'))
+
+    @gen_test
+    def test_flush_after_window(self):
+        batcher = Batcher(.05)
+        handler = Mock(codec=JSON)
+
+        batcher.add(handler, b'{}')
+        yield gen.moment
+
+        handler.outbound.send.assert_not_called()
+
+        yield gen.sleep(.1)
+
+        handler.outbound.send.assert_called_once_with(b'{}', build_frame(b'{}'))
+        self.assertGreaterEqual(batcher.average_latency, .05)
+
+    @gen_test
+    def test_closed_and_discarded_handlers(self):
+        batcher = Batcher()
+        closed, discarded = Mock(codec=JSON), Mock(codec=JSON)
+        closed.outbound.send.side_effect = WebSocketClosedError()
+
+        batcher.add(closed, b'{}')
+        batcher.add(discarded, b'{}')
+        batcher.discard(discarded)
+        yield gen.moment
+
+        closed.outbound.send.assert_called_once_with(b'{}', build_frame(b'{}'))
+        discarded.outbound.send.assert_not_called()
+        self.assertEqual(batcher.frames, 0)
@@ -0,0 +1,359 @@
+# coding: utf-8
+
+import errno
+import os
+import shutil
+import socket
+import tempfile
+from unittest import TestCase
+
+import six
+from tornado import gen
+from tornado.testing import AsyncTestCase, ExpectLog, gen_test
+
+from tornado_websockets.broadcast import decode_batch, encode_batch, LocalBackend, PubSubAdapter, PubSubBackend, \
+    UnixSocketPubSub, logger
+
+if six.PY2:
+    from mock import Mock, call
+else:
+    from unittest.mock import Mock, call
+
+
+class MemoryPubSub(PubSubAdapter):
+    """
+        Adapter connecting backends of the same process, like a Redis channel would do between processes.
+    """
+
+    def __init__(self, channel, max_message_size=None):
+        self.channel = channel
+        self.max_message_size = max_message_size
+        self.published = []
+
+    def subscribe(self, callback):
+        self.channel.append(callback)
+
+    def publish(self, message):
+        self.published.append(message)
+        for callback in self.channel:
+            callback(message)
+
+
+def mock_websocket(path):
+    websocket = Mock()
+    websocket.path = path
+    return websocket
+
+
+class TestBatch(TestCase):
+    """
+        Tests for bus messages serialization.
+    """
+
+    def test_encode_decode(self):
+        records = [
+            ('/chat', None, b'{"event": "message"}', 'message'),
+            ('/chat', 'room', b'', None),
+            (u'/ch\xe0t', u'r\xf6\xf6m', b'\x00\x01', u'\xe9v\xe9nement'),
+        ]
+
+        origin, decoded = decode_batch(encode_batch(b'12345678', records))
+
+        self.assertEqual(origin, b'12345678')
+        self.assertListEqual(decoded, records)
+
+    def test_decode_truncated(self):
+        message = encode_batch(b'12345678', [('/chat', None, b'x' * 100, 'message')])
+
+        for size in (4, 12, 30, len(message) - 1):
+            with self.assertRaisesRegexp(ValueError, 'Bus message of %d bytes is' % size):
+                decode_batch(message[:size])
+
+
+class TestLocalBackend(TestCase):
+    """
+        Tests for the class « LocalBackend ».
+    """
+
+    def test_publish(self):
+        backend = LocalBackend()
+        websocket = mock_websocket('/chat')
+
+        backend.publish(websocket, 'room', b'payload', 'event')
+
+        websocket.deliver.assert_called_once_with(b'payload', 'room', 'event')
+
+    def test_deliver(self):
+        backend = LocalBackend()
+        websocket = mock_websocket('/chat')
+        backend.start({'/chat': websocket})
+
+        backend.deliver('/chat', None, b'payload')
+        backend.deliver('/unknown', None, b'payload')
+
+        websocket.deliver.assert_called_once_with(b'payload', None, None)
+
+
+class TestPubSubBackend(AsyncTestCase):
+    """
+        Tests for the class « PubSubBackend », two backends emulate two processes.
+    """
+
+    def setUp(self):
+        super(TestPubSubBackend, self).setUp()
+
+        channel = []
+        self.websocket1, self.websocket2 = mock_websocket('/chat'), mock_websocket('/chat')
+        self.backend1 = PubSubBackend(MemoryPubSub(channel))
+        self.backend2 = PubSubBackend(MemoryPubSub(channel))
+        self.backend1.start({'/chat': self.websocket1})
+        self.backend2.start({'/chat': self.websocket2})
+
+    @gen_test
+    def test_publish_is_batched(self):
+        self.backend1.publish(self.websocket1, None, b'first', 'event')
+        self.backend1.publish(self.websocket1, 'room', b'second')
+
+        # Delivered immediately in the same process
+        self.websocket1.deliver.assert_has_calls([call(b'first', None, 'event'), call(b'second', 'room', None)])
+        self.websocket2.deliver.assert_not_called()
+
+        yield gen.moment
+
+        # Delivered to the other process in one adapter publish, not delivered twice to the publishing process
+        self.assertEqual(len(self.backend1.adapter.published), 1)
+        self.websocket2.deliver.assert_has_calls([call(b'first', None, 'event'), call(b'second', 'room', None)])
+        self.assertEqual(self.websocket1.deliver.call_count, 2)
+
+    @gen_test
+    def test_flush_splits_large_batches(self):
+        self.backend1.adapter.max_message_size = 100
+
+        for _ in range(3):
+            self.backend1.publish(self.websocket1, None, b'x' * 60)
+
+        yield gen.moment
+
+        self.assertEqual(len(self.backend1.adapter.published), 3)
+        self.assertEqual(self.websocket2.deliver.call_count, 3)
+
+    @gen_test
+    def test_flush_splits_too_large_messages(self):
+        self.backend1.adapter.max_message_size = 100
+        self.backend1.publish(self.websocket1, None, b'small')
+        self.backend1.publish(self.websocket1, None, b'x' * 200)
+        self.backend1.publish(self.websocket1, 'room', b'other')
+
+        yield gen.moment
+
+        # The batch before it, 3 parts of at most 100 bytes, the batch after it
+        published = self.backend1.adapter.published
+        self.assertListEqual([len(message) for message in published], [29, 100, 100, 42, 33])
+        self.websocket2.deliver.assert_has_calls([
+            call(b'small', None, None),
+            call(b'x' * 200, None, None),
+            call(b'other', 'room', None),
+        ])
+        self.assertEqual(self.websocket2.deliver.call_count, 3)
+
+    def test_parts_are_delivered_once_complete(self):
+        self.backend1.adapter = MemoryPubSub([], max_message_size=100)
+        self.backend1.publish(self.websocket1, None, b'x' * 200)
+        self.backend1.flush()
+
+        first, second, last = self.backend1.adapter.published
+
+        self.backend2.on_message(first)
+        self.backend2.on_message(second)
+        self.websocket2.deliver.assert_not_called()
+
+        with self.assertRaisesRegexp(ValueError, 'Bus message of 100 bytes is a part of a larger message.'):
+            decode_batch(first)
+
+        self.backend2.on_message(last)
+        self.websocket2.deliver.assert_called_once_with(b'x' * 200, None, None)
+
+    def test_truncated_message_is_dropped(self):
+        message = encode_batch(b'12345678', [('/chat', None, b'x' * 100, None)])
+
+        with ExpectLog(logger, 'Broadcast bus: a message was dropped: Bus message of 60 bytes is truncated.'):
+            self.backend2.on_message(message[:60])
+
+        self.websocket2.deliver.assert_not_called()
+
+
+class TestUnixSocketPubSub(AsyncTestCase):
+    """
+        Tests for the class « UnixSocketPubSub ».
+    """
+
+    def setUp(self):
+        super(TestUnixSocketPubSub, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestUnixSocketPubSub, self).tearDown()
+
+    def test_for_port(self):
+        adapter = UnixSocketPubSub.for_port(8000)
+
+        self.assertEqual(adapter.directory, os.path.join(tempfile.gettempdir(),
+                                                         'tornado_websockets-%d-8000' % os.getuid()))
+
+    def test_check_directory(self):
+        adapter = UnixSocketPubSub(os.path.join(self.directory, 'bus'))
+        adapter.check_directory()
+
+        self.assertEqual(os.stat(adapter.directory).st_mode & 0o777, 0o700)
+
+        # Other users could inject messages
+        os.chmod(adapter.directory, 0o777)
+
+        with self.assertRaisesRegexp(OSError, 'should be owned by the current user with mode 0700'):
+            adapter.check_directory()
+
+        with self.assertRaisesRegexp(OSError, 'should be owned by the current user with mode 0700'):
+            adapter.subscribe(lambda message: None)
+
+        # A symbolic link is not followed
+        os.chmod(adapter.directory, 0o700)
+        link = UnixSocketPubSub(os.path.join(self.directory, 'link'))
+        os.symlink(adapter.directory, link.directory)
+
+        with self.assertRaisesRegexp(OSError, 'should be owned by the current user with mode 0700'):
+            link.check_directory()
+
+    @gen_test
+    def test_publish_and_receive(self):
+        received1, received2 = [], []
+        adapter1 = UnixSocketPubSub(self.directory, name='worker1')
+        adapter2 = UnixSocketPubSub(self.directory, name='worker2')
+
+        adapter1.subscribe(received1.append)
+        adapter2.subscribe(received2.append)
+
+        self.assertListEqual(adapter1.peers(), [adapter2.path])
+
+        adapter1.publish(b'message')
+
+        while not received2:
+            yield gen.sleep(.01)
+
+        self.assertListEqual(received1, [])
+        self.assertListEqual(received2, [b'message'])
+
+        adapter1.close()
+        adapter2.close()
+
+        self.assertListEqual(os.listdir(self.directory), [])
+
+    def test_publish_removes_dead_peers(self):
+        adapter = UnixSocketPubSub(self.directory, name='worker')
+        adapter.subscribe(lambda message: None)
+
+        # A socket left by a killed process
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(os.path.join(self.directory, 'dead.sock'))
+        dead.close()
+
+        adapter.publish(b'message')
+
+        self.assertListEqual(adapter.peers(), [])
+        self.assertListEqual(os.listdir(self.directory), ['worker.sock'])
+
+        adapter.close()
+
+    @gen_test
+    def test_publish_after_dead_peer(self):
+        received = []
+
+        # Peers are sorted by name, live peers after a dead one should still receive the message
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(os.path.join(self.directory, 'a_dead.sock'))
+        dead.close()
+
+        live = [UnixSocketPubSub(self.directory, name=name) for name in ('b_live', 'c_live')]
+
+        for peer in live:
+            peer.subscribe(received.append)
+
+        adapter = UnixSocketPubSub(self.directory, name='worker')
+        adapter.subscribe(lambda message: None)
+        adapter.publish(b'message')
+
+        while len(received) < 2:
+            yield gen.sleep(.01)
+
+        self.assertListEqual(received, [b'message', b'message'])
+        self.assertListEqual(adapter.peers(), [peer.path for peer in live])
+
+        for peer in live + [adapter]:
+            peer.close()
+
+    @gen_test
+    def test_publish_to_slow_peer(self):
+        # A process which does not read its socket for a while, its receive queue is full after a few messages
+        slow = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        slow.bind(os.path.join(self.directory, 'slow.sock'))
+        slow.setblocking(False)
+
+        adapter = UnixSocketPubSub(self.directory, name='worker')
+        adapter.subscribe(lambda message: None)
+        messages = [str(index).encode('ascii') * 1000 for index in range(100)]
+
+        for message in messages:
+            adapter.publish(message)
+
+        self.assertIn(slow.getsockname(), adapter._queues)
+
+        # Every message is received, in order, once the process reads again
+        received = []
+
+        while len(received) < len(messages):
+            try:
+                received.append(slow.recv(adapter.max_message_size))
+            except socket.error as e:
+                self.assertIn(e.args[0], (errno.EAGAIN, errno.EWOULDBLOCK))
+                yield gen.sleep(.01)
+
+        self.assertListEqual(received, messages)
+        self.assertDictEqual(adapter._queues, {})
+
+        adapter.close()
+        slow.close()
+
+    def test_queue_of_slow_peer_is_bounded(self):
+        slow = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        slow.bind(os.path.join(self.directory, 'slow.sock'))
+
+        adapter = UnixSocketPubSub(self.directory, name='worker', max_queued_bytes=10000)
+        adapter.subscribe(lambda message: None)
+
+        with ExpectLog(logger, 'Broadcast bus: .*slow.sock is overloaded, a message was dropped.'):
+            for _ in range(100):
+                adapter.publish(b'x' * 1000)
+
+        self.assertEqual(len(adapter._queues[slow.getsockname()]), 10)
+
+        adapter.close()
+        slow.close()
+
+    @gen_test
+    def test_large_message_between_backends(self):
+        websocket1, websocket2 = mock_websocket('/chat'), mock_websocket('/chat')
+        backend1 = PubSubBackend(UnixSocketPubSub(self.directory, name='worker1'))
+        backend2 = PubSubBackend(UnixSocketPubSub(self.directory, name='worker2'))
+        backend1.start({'/chat': websocket1})
+        backend2.start({'/chat': websocket2})
+
+        payload = os.urandom(200000)
+        backend1.publish(websocket1, 'room', payload, 'event')
+
+        while not websocket2.deliver.called:
+            yield gen.sleep(.01)
+
+        websocket2.deliver.assert_called_once_with(payload, 'room', 'event')
+
+        backend1.stop()
+        backend2.stop()
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+from unittest import TestCase, skipIf
+
+from tornado_websockets.codec import JSON, CBORCodec, Codec, JSONCodec, MessagePackCodec, cbor2, codecs, get_codec, \
+    msgpack, register_codec
+from tornado_websockets.frame import OPCODE_BINARY, OPCODE_TEXT, encode_event
+
+
+class TestCodec(TestCase):
+    """
+        Tests for the module « codec ».
+    """
+
+    envelopes = [
+        {'event': 'message', 'data': {'message': u'H\xe9llo', 'user': 'foo'}},
+        {'event': 'update', 'data': {'current': 42, 'values': [1.5, -2, 3]}},
+    ]
+
+    def assertCodec(self, codec, decode_array):
+        for envelope in self.envelopes:
+            self.assertDictEqual(codec.decode(codec.encode(envelope)), envelope)
+            self.assertDictEqual(codec.decode(codec.encode_event(envelope['event'], envelope['data'])), envelope)
+
+        for count in (1, 15, 16, 23, 24, 255, 256, 70000):
+            payloads = [codec.encode(self.envelopes[i % 2]) for i in range(count)]
+            self.assertListEqual(decode_array(codec.join(payloads)), [self.envelopes[i % 2] for i in range(count)])
+
+        with self.assertRaises(ValueError):
+            codec.decode(b'\xc1\xff not valid')
+
+    def test_json(self):
+        self.assertCodec(JSON, JSON.decode)
+        self.assertEqual(JSON.opcode, OPCODE_TEXT)
+        self.assertEqual(JSON.subprotocol, 'dtws.json')
+        self.assertEqual(JSON.encode_event('event', {}), encode_event('event', {}))
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        codec = MessagePackCodec()
+
+        self.assertCodec(codec, lambda message: msgpack.unpackb(message, raw=False))
+        self.assertEqual(codec.opcode, OPCODE_BINARY)
+
+    @skipIf(cbor2 is None, 'cbor2 is not installed')
+    def test_cbor(self):
+        codec = CBORCodec()
+
+        self.assertCodec(codec, cbor2.loads)
+        self.assertEqual(codec.opcode, OPCODE_BINARY)
+
+    def test_register_and_get_codec(self):
+        class UpperJSONCodec(JSONCodec):
+            name = 'upper'
+
+        codec = UpperJSONCodec()
+        register_codec(codec)
+
+        try:
+            self.assertIs(get_codec('upper'), codec)
+            self.assertIs(get_codec('dtws.upper'), codec)
+            self.assertIs(get_codec('json'), JSON)
+            self.assertIsNone(get_codec('unknown'))
+        finally:
+            del codecs['upper']
+
+        with self.assertRaises(TypeError):
+            register_codec('json')
+
+        with self.assertRaises(TypeError):
+            Codec()
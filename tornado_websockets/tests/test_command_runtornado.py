@@ -1,5 +1,7 @@
 # coding: utf-8
 
+import os
+
 import django
 from django.conf import settings
 from django.core.management import call_command
@@ -7,7 +9,11 @@ from django.test import TestCase
 from django.utils.six import StringIO
 from mock import patch, ANY
 
+from tornado_websockets import jsonbackend
+from tornado_websockets.admission import Admission
+from tornado_websockets.broadcast import LocalBackend, PubSubBackend, UnixSocketPubSub
 from tornado_websockets.management.commands import runtornado
+from tornado_websockets.tornadowrapper import TornadoWrapper
 
 django.setup()
 
@@ -19,6 +25,7 @@ class TestCommandRuntornado(TestCase):
 
     def setUp(self):
         self.TORNADO = settings.TORNADO
+        settings.TORNADO = dict(self.TORNADO)
 
     def tearDown(self):
         settings.TORNADO = self.TORNADO
@@ -57,13 +64,15 @@ class TestCommandRuntornado(TestCase):
 
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with([], ANY, ANY)
+        stub.assert_called_with([], ANY, ANY, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     @patch('tornado_websockets.management.commands.runtornado.run')
     def test_with_handlers(self, stub):
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with(ANY, ANY, ANY)
+        stub.assert_called_with(ANY, ANY, ANY, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     '''
         Tests for settings behavior.
@@ -75,13 +84,16 @@ class TestCommandRuntornado(TestCase):
 
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with(ANY, {}, ANY)
+        stub.assert_called_with(ANY, {}, ANY, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     @patch('tornado_websockets.management.commands.runtornado.run')
     def test_with_settings(self, stub):
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with(ANY, {'autoreload': True, 'debug': True}, ANY)
+        stub.assert_called_with(ANY, {'autoreload': True, 'debug': True}, ANY,
+                                workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     '''
         Tests for port behavior.
@@ -93,7 +105,8 @@ class TestCommandRuntornado(TestCase):
 
         call_command('runtornado', '8080', stdout=StringIO())
 
-        stub.assert_called_with(ANY, ANY, 8080)
+        stub.assert_called_with(ANY, ANY, 8080, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     @patch('tornado_websockets.management.commands.runtornado.run')
     def test_get_port_from_settings(self, stub):
@@ -101,7 +114,8 @@ class TestCommandRuntornado(TestCase):
 
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with(ANY, ANY, 1234)
+        stub.assert_called_with(ANY, ANY, 1234, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
 
     @patch('tornado_websockets.management.commands.runtornado.run')
     def test_get_port_with_default_port(self, stub):
@@ -109,7 +123,199 @@ class TestCommandRuntornado(TestCase):
 
         call_command('runtornado', stdout=StringIO())
 
-        stub.assert_called_with(ANY, ANY, 8000)
+        stub.assert_called_with(ANY, ANY, 8000, workers=ANY, reuse_port=ANY, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
+
+    '''
+        Tests for workers behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_workers_with_default_workers(self, stub):
+        call_command('runtornado', stdout=StringIO())
+
+        stub.assert_called_with(ANY, ANY, ANY, workers=1, reuse_port=False, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_workers_from_settings(self, stub):
+        settings.TORNADO['workers'] = 4
+        settings.TORNADO['reuse_port'] = True
+
+        call_command('runtornado', stdout=StringIO())
+
+        stub.assert_called_with(ANY, ANY, ANY, workers=4, reuse_port=True, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_workers_from_options(self, stub):
+        settings.TORNADO['workers'] = 4
+
+        call_command('runtornado', '--workers', '2', '--reuse-port', stdout=StringIO())
+
+        stub.assert_called_with(ANY, ANY, ANY, workers=2, reuse_port=True, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_workers_disable_autoreload(self, stub):
+        out = StringIO()
+
+        call_command('runtornado', '--workers', '2', stdout=out)
+
+        stub.assert_called_with(ANY, {'autoreload': False, 'debug': True}, ANY,
+                                workers=2, reuse_port=False, broadcast=ANY, metrics=ANY, watchdog=ANY,
+                                admission=ANY)
+        self.assertIn('Autoreload => Disabled', out.getvalue())
+
+    '''
+        Tests for broadcast behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_broadcast_with_one_worker(self, stub):
+        call_command('runtornado', stdout=StringIO())
+
+        self.assertIsInstance(stub.call_args[1]['broadcast'], LocalBackend)
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_broadcast_with_workers(self, stub):
+        call_command('runtornado', '8080', '--workers', '2', stdout=StringIO())
+
+        broadcast = stub.call_args[1]['broadcast']
+        self.assertIsInstance(broadcast, PubSubBackend)
+        self.assertIsInstance(broadcast.adapter, UnixSocketPubSub)
+        self.assertTrue(broadcast.adapter.directory.endswith('tornado_websockets-%d-8080' % os.getuid()))
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_get_broadcast_from_settings(self, stub):
+        settings.TORNADO['broadcast'] = 'local'
+        call_command('runtornado', '--workers', '2', stdout=StringIO())
+
+        self.assertIsInstance(stub.call_args[1]['broadcast'], LocalBackend)
+
+        backend = LocalBackend()
+        settings.TORNADO['broadcast'] = lambda: backend
+        call_command('runtornado', stdout=StringIO())
+
+        self.assertIs(stub.call_args[1]['broadcast'], backend)
+
+    '''
+        Tests for JSON backend behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_json_backend_from_settings(self, stub):
+        settings.TORNADO['json'] = 'json'
+        out = StringIO()
+
+        try:
+            call_command('runtornado', stdout=out)
+        finally:
+            jsonbackend.set_backend('auto')
+
+        self.assertIn('runtornado: JSON => json.', out.getvalue())
+        stub.assert_called()
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_unknown_json_backend(self, stub):
+        settings.TORNADO['json'] = 'simplejson'
+        err = StringIO()
+
+        call_command('runtornado', stdout=StringIO(), stderr=err)
+
+        self.assertIn('runtornado: JSON => Unknown JSON backend « simplejson »', err.getvalue())
+        stub.assert_not_called()
+
+    '''
+        Tests for metrics behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_metrics_disabled_by_default(self, stub):
+        out = StringIO()
+
+        call_command('runtornado', stdout=out)
+
+        self.assertIsNone(stub.call_args[1]['metrics'])
+        self.assertIn('runtornado: Metrics => Disabled.', out.getvalue())
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_metrics_from_settings(self, stub):
+        settings.TORNADO['metrics'] = '/metrics'
+        out = StringIO()
+
+        call_command('runtornado', stdout=out)
+
+        self.assertEqual(stub.call_args[1]['metrics'], '/metrics')
+        self.assertIn('runtornado: Metrics => /metrics.', out.getvalue())
+
+    '''
+        Tests for watchdog behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_watchdog_disabled_by_default(self, stub):
+        out = StringIO()
+
+        call_command('runtornado', stdout=out)
+
+        self.assertIsNone(stub.call_args[1]['watchdog'])
+        self.assertIn('runtornado: Watchdog => Disabled.', out.getvalue())
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_watchdog_from_options(self, stub):
+        out = StringIO()
+
+        call_command('runtornado', '--watchdog', stdout=out)
+        self.assertEqual(stub.call_args[1]['watchdog'], 100)
+        self.assertIn('runtornado: Watchdog => 100 ms.', out.getvalue())
+
+        call_command('runtornado', '--watchdog', '20', stdout=StringIO())
+        self.assertEqual(stub.call_args[1]['watchdog'], 20)
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_watchdog_from_settings(self, stub):
+        settings.TORNADO['watchdog'] = 50
+
+        call_command('runtornado', stdout=StringIO())
+
+        self.assertEqual(stub.call_args[1]['watchdog'], 50)
+
+    '''
+        Tests for admission behavior.
+    '''
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_admission_disabled_by_default(self, stub):
+        out = StringIO()
+
+        call_command('runtornado', stdout=out)
+
+        self.assertIsNone(stub.call_args[1]['admission'])
+        self.assertIn('runtornado: Admission => Disabled.', out.getvalue())
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_admission_from_settings(self, stub):
+        settings.TORNADO['admission'] = {'max_connections': 10000, 'max_per_ip': 100}
+        out = StringIO()
+
+        call_command('runtornado', stdout=out)
+
+        admission = stub.call_args[1]['admission']
+        self.assertIsInstance(admission, Admission)
+        self.assertEqual(admission.max_connections, 10000)
+        self.assertEqual(admission.max_per_ip, 100)
+        self.assertIn('runtornado: Admission => 10000 connections, 100 per IP.', out.getvalue())
+
+    @patch('tornado_websockets.management.commands.runtornado.run')
+    def test_invalid_admission(self, stub):
+        settings.TORNADO['admission'] = {'max_per_ip': 0}
+        err = StringIO()
+
+        call_command('runtornado', stdout=StringIO(), stderr=err)
+
+        self.assertIn('runtornado: Admission => Param « max_per_ip » should be at least 1, got 0.', err.getvalue())
+        stub.assert_not_called()
 
     '''
         Test for run()
@@ -128,3 +334,66 @@ class TestCommandRuntornado(TestCase):
         start_app.assert_called_with(handlers, settings)
         listen.assert_called_with(port)
         loop.assert_called()
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    def test_run_with_admission(self, start_app, listen, loop):
+        admission = Admission(max_connections=10)
+
+        with patch.object(TornadoWrapper, 'admission', None):
+            runtornado.run([], {}, 1234, admission=admission)
+
+            self.assertIs(TornadoWrapper.admission, admission)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.fork')
+    def test_run_with_workers(self, fork, start_app, listen, loop):
+        runtornado.run([], {}, 1234, workers=4, reuse_port=True)
+
+        fork.assert_called_with(1234, 4, True)
+        start_app.assert_called_with([], {})
+        listen.assert_called_with(1234)
+        loop.assert_called()
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.fork')
+    def test_run_without_workers(self, fork, start_app, listen, loop):
+        runtornado.run([], {}, 1234)
+
+        fork.assert_not_called()
+        listen.assert_called_with(1234)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.set_broadcast')
+    def test_run_with_broadcast(self, set_broadcast, start_app, listen, loop):
+        backend = LocalBackend()
+
+        runtornado.run([], {}, 1234, broadcast=backend)
+
+        set_broadcast.assert_called_with(backend)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_metrics_handler')
+    def test_run_with_metrics(self, add_metrics_handler, start_app, listen, loop):
+        runtornado.run([], {}, 1234, metrics='/metrics')
+
+        add_metrics_handler.assert_called_with('/metrics')
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.loop')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.listen')
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.start_app')
+    @patch('tornado_websockets.management.commands.runtornado.Watchdog')
+    def test_run_with_watchdog(self, watchdog, start_app, listen, loop):
+        runtornado.run([], {}, 1234, watchdog=20)
+
+        watchdog.assert_called_with(threshold=0.02)
+        watchdog.return_value.start.assert_called()
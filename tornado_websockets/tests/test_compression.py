@@ -0,0 +1,129 @@
+# coding: utf-8
+
+import zlib
+from unittest import TestCase
+
+from tornado.websocket import _PerMessageDeflateCompressor
+
+from tornado_websockets.compression import RSV1, Compression
+from tornado_websockets.frame import OPCODE_BINARY, OPCODE_TEXT, build_frame
+
+
+def inflate(frame, window_bits=zlib.MAX_WBITS):
+    # Header of a frame smaller than 126 bytes is 2 bytes long
+    decompressor = zlib.decompressobj(-window_bits)
+
+    return decompressor.decompress(frame[2:] + b'\x00\x00\xff\xff')
+
+
+class TestCompression(TestCase):
+    """
+        Tests for the class « Compression ».
+    """
+
+    payload = b'{"event": "message", "data": {"message": "' + b'hello ' * 50 + b'"}}'
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « level » should be between 0 and 9, got 10.'):
+            Compression(level=10)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « mem_level » should be between 1 and 9, got 0.'):
+            Compression(mem_level=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « window_bits » should be between 9 and 15, got 8.'):
+            Compression(window_bits=8)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « min_size » can not be negative, got -1.'):
+            Compression(min_size=-1)
+
+    def test_options(self):
+        self.assertDictEqual(Compression(level=1, mem_level=9).options(), {'compression_level': 1, 'mem_level': 9})
+
+    def test_negotiate(self):
+        compression = Compression(window_bits=10, context_takeover=False)
+        extensions = [
+            ('permessage-deflate', {}),
+            ('permessage-deflate', {'server_max_window_bits': '9'}),
+            ('x-unknown', {}),
+        ]
+
+        self.assertIs(compression.negotiate(extensions), extensions)
+        self.assertListEqual(extensions, [
+            ('permessage-deflate', {'server_no_context_takeover': None, 'server_max_window_bits': '10'}),
+            ('permessage-deflate', {'server_no_context_takeover': None, 'server_max_window_bits': '9'}),
+            ('x-unknown', {}),
+        ])
+
+    def test_negotiate_with_defaults(self):
+        extensions = [('permessage-deflate', {'client_max_window_bits': '12'})]
+
+        Compression().negotiate(extensions)
+        self.assertListEqual(extensions, [('permessage-deflate', {'client_max_window_bits': '12'})])
+
+    def test_frame_below_min_size(self):
+        compression = Compression(min_size=len(self.payload) + 1)
+        compressor = _PerMessageDeflateCompressor(False, None)
+        frame = build_frame(self.payload)
+
+        self.assertIs(compression.frame(self.payload, frame, OPCODE_TEXT, compressor), frame)
+        self.assertEqual(compression.frame(self.payload, None, OPCODE_TEXT, compressor), frame)
+        self.assertEqual(compression.uncompressed, 2)
+
+    def test_frame_with_context_takeover(self):
+        compression = Compression(min_size=0)
+        compressor = _PerMessageDeflateCompressor(True, None)
+
+        self.assertIsNone(compression.frame(self.payload, None, OPCODE_TEXT, compressor))
+        self.assertEqual(compression.compressions, 0)
+
+    def test_shared_frame(self):
+        compression = Compression(min_size=0, context_takeover=False)
+        compressors = [_PerMessageDeflateCompressor(False, None) for _ in range(3)]
+
+        with compression.sharing():
+            frames = [compression.frame(self.payload, None, OPCODE_TEXT, compressor) for compressor in compressors]
+
+        self.assertIs(frames[0], frames[1])
+        self.assertIs(frames[0], frames[2])
+        self.assertEqual(compression.compressions, 1)
+        self.assertEqual(compression.shared, 2)
+
+        self.assertEqual(frames[0][0], 0x80 | RSV1 | OPCODE_TEXT)
+        self.assertLess(len(frames[0]), len(self.payload))
+        self.assertEqual(inflate(frames[0]), self.payload)
+
+    def test_shared_frame_per_parameters(self):
+        compression = Compression(min_size=0, context_takeover=False)
+
+        with compression.sharing():
+            text = compression.frame(self.payload, None, OPCODE_TEXT, _PerMessageDeflateCompressor(False, None))
+            again = compression.frame(self.payload, None, OPCODE_TEXT, _PerMessageDeflateCompressor(False, None))
+            binary = compression.frame(self.payload, None, OPCODE_BINARY, _PerMessageDeflateCompressor(False, None))
+            small_window = compression.frame(self.payload, None, OPCODE_TEXT, _PerMessageDeflateCompressor(False, 9))
+
+        self.assertIs(again, text)
+        self.assertEqual(binary[0], 0x80 | RSV1 | OPCODE_BINARY)
+        self.assertEqual(inflate(small_window, 9), self.payload)
+        self.assertEqual(compression.compressions, 3)
+
+    def test_shared_frames_of_several_payloads(self):
+        compression = Compression(min_size=0, context_takeover=False)
+        other = self.payload + b' '
+
+        # Clients of several codecs, in any order
+        with compression.sharing():
+            frames = [
+                compression.frame(payload, None, OPCODE_TEXT, _PerMessageDeflateCompressor(False, None))
+                for payload in (self.payload, other, self.payload, other)
+            ]
+
+        self.assertIs(frames[0], frames[2])
+        self.assertIs(frames[1], frames[3])
+        self.assertEqual(inflate(frames[1]), other)
+        self.assertEqual(compression.compressions, 2)
+        self.assertEqual(compression.shared, 2)
+
+        # Outside of a broadcast, the connection compresses the message
+        compressor = _PerMessageDeflateCompressor(False, None)
+        self.assertIsNone(compression.frame(self.payload, None, OPCODE_TEXT, compressor))
+        self.assertEqual(compression.compressions, 2)
@@ -0,0 +1,113 @@
+# coding: utf-8
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+
+from tornado_websockets.dispatch import compile_executor_invoker, compile_invoker, executor_io_loop, get_arg_names, \
+    get_executor, is_awaitable
+
+
+class TestDispatch(TestCase):
+    """
+        Tests for the module « dispatch ».
+    """
+
+    def test_get_arg_names(self):
+        def func(socket, data):
+            pass
+
+        class MyClass(object):
+            def method(self, socket):
+                pass
+
+        self.assertListEqual(get_arg_names(func), ['socket', 'data'])
+        self.assertListEqual(get_arg_names(MyClass.method), ['self', 'socket'])
+
+    def test_compile_invoker_without_args(self):
+        calls = []
+
+        def func():
+            calls.append(())
+
+        compile_invoker(func)('context', 'socket', {'foo': 'bar'})
+
+        self.assertListEqual(calls, [()])
+
+    def test_compile_invoker_with_args(self):
+        def func(data, socket):
+            return socket, data
+
+        invoker = compile_invoker(func)
+
+        self.assertEqual(invoker('context', 'socket', {'foo': 'bar'}), ('socket', {'foo': 'bar'}))
+
+    def test_compile_invoker_with_context(self):
+        class MyClass(object):
+            def method(self, socket, data):
+                return self, socket, data
+
+        invoker = compile_invoker(MyClass.method)
+
+        self.assertEqual(invoker('context', 'socket', {}), ('context', 'socket', {}))
+        self.assertEqual(invoker(None, 'socket', {}), (None, 'socket', {}))
+
+    def test_compile_invoker_ignores_other_args(self):
+        def func(data, other='default'):
+            return data, other
+
+        invoker = compile_invoker(func)
+
+        self.assertEqual(invoker('context', 'socket', {}), ({}, 'default'))
+
+
+class TestExecutorInvoker(AsyncTestCase):
+    """
+        Tests for callbacks running in an executor.
+    """
+
+    @gen_test
+    def test_compile_executor_invoker(self):
+        def func(socket, data):
+            return threading.current_thread(), executor_io_loop(), socket, data
+
+        invoker = compile_executor_invoker(compile_invoker(func))
+        thread, io_loop, socket, data = yield invoker('context', 'socket', {'foo': 'bar'})
+
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertIs(io_loop, self.io_loop)
+        self.assertEqual((socket, data), ('socket', {'foo': 'bar'}))
+        self.assertIsNone(executor_io_loop())
+
+    @gen_test
+    def test_compile_executor_invoker_with_executor(self):
+        executor = ThreadPoolExecutor(1)
+
+        def func():
+            return threading.current_thread().name
+
+        name = yield compile_executor_invoker(compile_invoker(func), executor)(None, None, {})
+        shared = yield compile_executor_invoker(compile_invoker(func), True)(None, None, {})
+
+        self.assertNotEqual(name, shared)
+        self.assertIs(get_executor(), get_executor())
+
+        executor.shutdown()
+
+    def test_compile_executor_invoker_with_invalid_executor(self):
+        with self.assertRaises(TypeError):
+            compile_executor_invoker(compile_invoker(lambda: None), 'executor')
+
+    def test_is_awaitable(self):
+        @gen.coroutine
+        def coroutine():
+            pass
+
+        self.assertFalse(is_awaitable(None))
+        self.assertFalse(is_awaitable({'foo': 'bar'}))
+        self.assertTrue(is_awaitable(Future()))
+        self.assertTrue(is_awaitable(coroutine()))
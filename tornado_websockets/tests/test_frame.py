@@ -0,0 +1,44 @@
+# coding: utf-8
+
+import struct
+from unittest import TestCase
+
+from tornado.escape import json_decode
+
+from tornado_websockets.frame import build_frame, encode_event, OPCODE_BINARY
+
+
+class TestFrame(TestCase):
+    """
+        Tests for the module « frame ».
+    """
+
+    def test_encode_event(self):
+        payload = encode_event('my_event', {'my': 'data'})
+
+        self.assertIsInstance(payload, bytes)
+        self.assertDictEqual(json_decode(payload), {'event': 'my_event', 'data': {'my': 'data'}})
+
+    def test_build_frame_short_payload(self):
+        frame = build_frame(b'hello')
+
+        self.assertEqual(frame, b'\x81\x05hello')
+
+    def test_build_frame_medium_payload(self):
+        payload = b'a' * 126
+        frame = build_frame(payload)
+
+        self.assertEqual(frame[:4], b'\x81\x7e' + struct.pack('!H', 126))
+        self.assertEqual(frame[4:], payload)
+
+    def test_build_frame_long_payload(self):
+        payload = b'a' * 0x10000
+        frame = build_frame(payload)
+
+        self.assertEqual(frame[:10], b'\x81\x7f' + struct.pack('!Q', 0x10000))
+        self.assertEqual(frame[10:], payload)
+
+    def test_build_frame_opcode_and_flags(self):
+        frame = build_frame(b'', opcode=OPCODE_BINARY, flags=0x40)
+
+        self.assertEqual(frame, b'\xc2\x00')
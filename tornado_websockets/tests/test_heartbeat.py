@@ -0,0 +1,181 @@
+# coding: utf-8
+
+import logging
+import time
+from timeit import default_timer
+
+from mock import Mock
+from tornado import gen
+from tornado.testing import AsyncTestCase, ExpectLog, gen_test
+from tornado.websocket import WebSocketClosedError
+
+from tornado_websockets import heartbeat
+from tornado_websockets.heartbeat import Heartbeat, TimerWheel, current_wheel, logger
+
+
+class TestTimerWheel(AsyncTestCase):
+    """
+        Tests for the class « TimerWheel ».
+    """
+
+    def setUp(self):
+        super(TestTimerWheel, self).setUp()
+        self.wheel = TimerWheel(self.io_loop, resolution=0.01, slots=4)
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « resolution » should be positive, got 0.'):
+            TimerWheel(self.io_loop, resolution=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « slots » should be at least 1, got 0.'):
+            TimerWheel(self.io_loop, slots=0)
+
+    @gen_test
+    def test_schedule(self):
+        calls = []
+
+        self.wheel.schedule(0.02, calls.append, 'first')
+        self.wheel.schedule(0, calls.append, 'now')
+        # Further than the 4 slots of the wheel
+        self.wheel.schedule(0.1, calls.append, 'later')
+        self.assertEqual(len(self.wheel), 3)
+
+        yield gen.sleep(0.05)
+        self.assertListEqual(calls, ['now', 'first'])
+
+        yield gen.sleep(0.1)
+        self.assertListEqual(calls, ['now', 'first', 'later'])
+        self.assertEqual(len(self.wheel), 0)
+        self.assertIsNone(self.wheel._timeout)
+
+    @gen_test
+    def test_cancel(self):
+        callback = Mock()
+        timer = self.wheel.schedule(0.01, callback)
+
+        self.wheel.cancel(timer)
+        self.wheel.cancel(timer)
+        self.assertEqual(len(self.wheel), 0)
+
+        yield gen.sleep(0.03)
+        callback.assert_not_called()
+
+    @gen_test
+    def test_blocked_io_loop(self):
+        callback = Mock()
+        self.wheel.schedule(0.01, callback)
+        self.wheel.schedule(0.03, callback)
+
+        time.sleep(0.1)
+        yield gen.sleep(0.02)
+
+        self.assertEqual(callback.call_count, 2)
+
+    @gen_test
+    def test_failing_callback(self):
+        callback = Mock()
+        self.wheel.schedule(0, Mock(side_effect=ValueError))
+        self.wheel.schedule(0, callback)
+
+        with ExpectLog(logger, 'Uncaught exception in timer'):
+            yield gen.sleep(0.03)
+
+        callback.assert_called_once_with()
+
+    def test_current_wheel(self):
+        wheel = current_wheel()
+
+        self.assertIs(wheel.io_loop, self.io_loop)
+        self.assertIs(current_wheel(), wheel)
+
+
+class TestHeartbeat(AsyncTestCase):
+    """
+        Tests for the class « Heartbeat ».
+    """
+
+    def setUp(self):
+        super(TestHeartbeat, self).setUp()
+        heartbeat._wheels[self.io_loop] = TimerWheel(self.io_loop, resolution=0.01)
+
+        self.handler = Mock(id=1, heartbeat_timer=None)
+        self.handler.websocket.path = '/heartbeat'
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Params « interval » and « timeout » can not be both None.'):
+            Heartbeat(interval=None, timeout=None)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « interval » should be positive, got 0.'):
+            Heartbeat(interval=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « timeout » should be positive, got -1.'):
+            Heartbeat(timeout=-1)
+
+    @gen_test
+    def test_ping(self):
+        beat = Heartbeat(interval=0.02, timeout=None)
+        beat.watch(self.handler)
+
+        self.assertIsNotNone(self.handler.heartbeat_timer)
+
+        yield gen.sleep(0.035)
+        self.handler.ping.assert_called_once_with(b'')
+        self.assertEqual(beat.pings, 1)
+
+        beat.forget(self.handler)
+        self.assertIsNone(self.handler.heartbeat_timer)
+        self.assertEqual(len(current_wheel()), 0)
+
+    def test_check(self):
+        beat = Heartbeat(interval=1, timeout=2)
+        wheel = current_wheel()
+
+        # An active client is not pinged
+        self.handler.last_seen = self.handler.last_ping = default_timer() - 0.5
+        beat.check(self.handler, wheel)
+        beat.forget(self.handler)
+        self.handler.ping.assert_not_called()
+
+        self.handler.last_seen = self.handler.last_ping = default_timer() - 1.5
+        beat.check(self.handler, wheel)
+        beat.forget(self.handler)
+        self.handler.ping.assert_called_once_with(b'')
+
+        # Pinged less than « interval » ago
+        beat.check(self.handler, wheel)
+        self.assertEqual(beat.pings, 1)
+        self.assertEqual(len(wheel), 1)
+        beat.forget(self.handler)
+
+        self.handler.last_seen = default_timer() - 2.2
+
+        with ExpectLog(logger, 'Closing connection 1 of /heartbeat, idle for 2 s.', level=logging.INFO):
+            beat.check(self.handler, wheel)
+
+        self.handler.close.assert_called_once_with(1001, 'Idle timeout')
+        self.assertEqual(beat.reaped, 1)
+        self.assertEqual(len(wheel), 0)
+
+    @gen_test
+    def test_reap(self):
+        beat = Heartbeat(interval=0.01, timeout=0.03)
+        beat.watch(self.handler)
+
+        with ExpectLog(logger, 'Closing connection 1 of /heartbeat, idle for 0 s.', level=logging.INFO):
+            yield gen.sleep(0.06)
+
+        self.handler.close.assert_called_once_with(1001, 'Idle timeout')
+        self.assertEqual(beat.reaped, 1)
+        self.assertGreaterEqual(beat.pings, 1)
+        self.assertIsNone(self.handler.heartbeat_timer)
+
+    @gen_test
+    def test_closed_connection(self):
+        beat = Heartbeat(interval=0.01, timeout=None)
+        self.handler.ping.side_effect = WebSocketClosedError
+        beat.watch(self.handler)
+
+        yield gen.sleep(0.03)
+
+        self.handler.ping.assert_called_once_with(b'')
+        self.assertEqual(beat.pings, 0)
+        self.assertEqual(len(current_wheel()), 0)
@@ -0,0 +1,62 @@
+# coding: utf-8
+
+from unittest import TestCase, skipIf
+
+from tornado_websockets import jsonbackend
+from tornado_websockets.codec import JSON
+from tornado_websockets.frame import encode_event
+from tornado_websockets.jsonbackend import get_backend, orjson, set_backend, ujson
+
+
+class TestJSONBackend(TestCase):
+    """
+        Tests for the module « jsonbackend ».
+    """
+
+    envelope = {'event': 'message', 'data': {'message': u'H\xe9llo </script>', 'values': [1, 2.5, None, True]}}
+
+    def tearDown(self):
+        set_backend('auto')
+
+    def assertBackend(self, name):
+        backend = get_backend(name)
+        encoded = backend.dumps(self.envelope)
+
+        self.assertEqual(backend.name, name)
+        self.assertIsInstance(encoded, bytes)
+        self.assertDictEqual(backend.loads(encoded), self.envelope)
+        self.assertDictEqual(backend.loads(encoded.decode('utf-8')), self.envelope)
+        self.assertDictEqual(backend.loads(backend.dumps({1: 'int key'})), {'1': 'int key'})
+
+        with self.assertRaises(ValueError):
+            backend.loads(b'{"event": ')
+
+    def test_json(self):
+        self.assertBackend('json')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson(self):
+        self.assertBackend('orjson')
+
+    @skipIf(ujson is None, 'ujson is not installed')
+    def test_ujson(self):
+        self.assertBackend('ujson')
+
+    def test_auto(self):
+        expected = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+
+        self.assertEqual(get_backend().name, expected)
+        self.assertEqual(get_backend('auto').name, expected)
+
+    def test_unknown_backend(self):
+        with self.assertRaisesRegexp(ValueError, 'Unknown JSON backend « simplejson »'):
+            get_backend('simplejson')
+
+    def test_set_backend(self):
+        backend = set_backend('json')
+
+        self.assertIs(jsonbackend.backend, backend)
+
+        # Envelopes, emitted and received, use the selected backend
+        self.assertEqual(encode_event('event', {}), b'{"event": "event", "data": {}}')
+        self.assertEqual(JSON.encode({'event': 'event', 'data': {}}), b'{"event": "event", "data": {}}')
@@ -0,0 +1,179 @@
+# coding: utf-8
+
+from unittest import TestCase
+
+import tornado.web
+from mock import patch
+from tornado.testing import AsyncHTTPTestCase
+
+from tornado_websockets.admission import Admission
+from tornado_websockets.heartbeat import Heartbeat
+from tornado_websockets.metrics import CONTENT_TYPE, Histogram, MetricsHandler, WebSocketMetrics, render
+from tornado_websockets.websocket import WebSocket
+
+
+class TestHistogram(TestCase):
+    """
+        Tests for the class « Histogram ».
+    """
+
+    def test_sample(self):
+        metrics = WebSocketMetrics(sampling=4)
+
+        for _ in range(3):
+            metrics.countdown -= 1
+
+        self.assertEqual(metrics.received_messages, 3)
+        self.assertEqual(metrics.received_bytes, 0)
+
+        # The 4th message is sampled, it stands for 4 messages
+        metrics.countdown -= 1
+        self.assertEqual(metrics.sample(10), 4)
+        metrics.countdown -= 1
+
+        self.assertEqual(metrics.received_messages, 5)
+        self.assertEqual(metrics.received_bytes, 40)
+
+        metrics.received_messages += 1
+        self.assertEqual(metrics.received_messages, 6)
+
+    def test_observe(self):
+        histogram = Histogram((0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0, 3.0):
+            histogram.observe(value)
+
+        self.assertListEqual(histogram.counts, [2, 1, 2])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+        self.assertListEqual(histogram.cumulative_counts(), [(0.1, 2), (1.0, 3), (float('inf'), 5)])
+
+
+class TestWebSocketMetrics(TestCase):
+    """
+        Tests for the class « WebSocketMetrics » and the function « render ».
+    """
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def setUp(self, add_handler):
+        self.ws = WebSocket('/metrics_test')
+        self.ws_without_metrics = WebSocket('/metrics_test_disabled', metrics=False)
+
+    def test_init(self):
+        self.assertIsInstance(self.ws.metrics, WebSocketMetrics)
+        self.assertIsNone(self.ws_without_metrics.metrics)
+
+    def test_init_with_invalid_sampling(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « sampling » should be at least 1, got 0.'):
+            WebSocketMetrics(sampling=0)
+
+    def test_sent(self):
+        metrics = WebSocketMetrics()
+
+        metrics.sent('message', 10)
+        metrics.sent('message', 20)
+        metrics.sent(None, 5)
+        metrics.sent('broadcast', 5, 3)
+
+        self.assertDictEqual(metrics.sent_messages, {'message': 2, '': 1, 'broadcast': 3})
+        self.assertDictEqual(metrics.sent_bytes, {'message': 30, '': 5, 'broadcast': 15})
+
+    def test_sample(self):
+        metrics = WebSocketMetrics(sampling=4)
+
+        for _ in range(3):
+            metrics.countdown -= 1
+
+        self.assertEqual(metrics.received_messages, 3)
+        self.assertEqual(metrics.received_bytes, 0)
+
+        # The 4th message is sampled, it stands for 4 messages
+        metrics.countdown -= 1
+        self.assertEqual(metrics.sample(10), 4)
+        metrics.countdown -= 1
+
+        self.assertEqual(metrics.received_messages, 5)
+        self.assertEqual(metrics.received_bytes, 40)
+
+        metrics.received_messages += 1
+        self.assertEqual(metrics.received_messages, 6)
+
+    def test_observe(self):
+        metrics = WebSocketMetrics()
+
+        metrics.observe('message', 0.002)
+        metrics.observe('message', 0.2)
+
+        self.assertEqual(metrics.durations['message'].count, 2)
+
+    def test_render(self):
+        metrics = self.ws.metrics
+        metrics.received_messages += 1
+        metrics.received_bytes += 12
+        metrics.decode_errors += 1
+        metrics.rate_limited += 3
+        metrics.calls['message'] += 1
+        metrics.sent('say "hi"', 40)
+        metrics.observe('message', 0.0001)
+
+        text = render({'/metrics_test': self.ws, '/metrics_test_disabled': self.ws_without_metrics})
+
+        self.assertIn('# TYPE dtws_connections gauge\n'
+                      'dtws_connections{path="/metrics_test"} 0\n'
+                      'dtws_connections{path="/metrics_test_disabled"} 0\n', text)
+        self.assertIn('dtws_received_messages_total{path="/metrics_test"} 1\n', text)
+        self.assertIn('dtws_received_bytes_total{path="/metrics_test"} 12\n', text)
+        self.assertIn('dtws_decode_errors_total{path="/metrics_test"} 1\n', text)
+        self.assertIn('dtws_rate_limited_total{path="/metrics_test"} 3\n', text)
+        self.assertIn('dtws_sent_bytes_total{path="/metrics_test",event="say \\"hi\\""} 40\n', text)
+        self.assertIn('dtws_callbacks_total{path="/metrics_test",event="message"} 1\n', text)
+        self.assertIn('# TYPE dtws_callback_duration_seconds histogram\n', text)
+        self.assertIn('dtws_callback_duration_seconds_bucket{path="/metrics_test",event="message",le="0.0005"} 1\n',
+                      text)
+        self.assertIn('dtws_callback_duration_seconds_bucket{path="/metrics_test",event="message",le="+Inf"} 1\n',
+                      text)
+        self.assertIn('dtws_callback_duration_seconds_count{path="/metrics_test",event="message"} 1\n', text)
+        self.assertNotIn('dtws_received_messages_total{path="/metrics_test_disabled"}', text)
+        self.assertNotIn('dtws_pings_total{', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_render_heartbeat(self):
+        self.ws.heartbeat = Heartbeat()
+        self.ws.heartbeat.pings = 3
+        self.ws.heartbeat.reaped = 1
+
+        text = render({'/metrics_test': self.ws})
+
+        self.assertIn('dtws_pings_total{path="/metrics_test"} 3\n', text)
+        self.assertIn('dtws_reaped_connections_total{path="/metrics_test"} 1\n', text)
+
+    def test_render_admission(self):
+        self.ws.admission = Admission(max_connections=1)
+        self.ws.admission.rejected = 2
+
+        text = render({'/metrics_test': self.ws})
+
+        self.assertIn('dtws_rejected_connections_total{path="/metrics_test"} 2\n', text)
+
+
+class TestMetricsHandler(AsyncHTTPTestCase):
+    """
+        Tests for the class « MetricsHandler ».
+    """
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def get_app(self, add_handler):
+        self.ws = WebSocket('/metrics_handler_test')
+
+        return tornado.web.Application([
+            ('/metrics', MetricsHandler, {'websockets': {self.ws.path: self.ws}}),
+        ])
+
+    def test_get(self):
+        self.ws.metrics.received_messages += 1
+
+        response = self.fetch('/metrics')
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers['Content-Type'], CONTENT_TYPE)
+        self.assertIn(b'dtws_received_messages_total{path="/metrics_handler_test"} 1\n', response.body)
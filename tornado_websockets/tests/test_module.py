@@ -76,6 +76,17 @@ class TestModule(TestCase):
 
         self.assertDictEqual(ws.events, {'module_mymodule_bar_func_b': func_b})
 
+        # Prefixed callbacks are still lifecycle hooks
+        @moduleBar.on
+        def close():
+            pass
+
+        @moduleBar.on
+        def window_close():
+            pass
+
+        self.assertListEqual([name for name, invoker in ws.hooks['close']], ['module_mymodule_bar_close'])
+
     @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
     def test_emit(self, add_handler):
         ws = WebSocket('foo')
@@ -102,4 +113,4 @@ class TestModule(TestCase):
 
         moduleBar.emit('my_event', {'my': 'data'})
 
-        ws.emit.assert_called_with('module_mymodule_bar_my_event', {'my': 'data'})
+        ws.emit.assert_called_with('module_mymodule_bar_my_event', {'my': 'data'}, room=None, local=False)
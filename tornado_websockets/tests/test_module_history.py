@@ -0,0 +1,193 @@
+# coding=utf-8
+from unittest import TestCase
+
+import six
+import tornado.web
+from tornado.concurrent import Future
+from tornado.escape import json_decode, json_encode
+from tornado.testing import gen_test
+
+from tornado_websockets.batching import Batcher
+from tornado_websockets.codec import JSON
+from tornado_websockets.modules import History
+from tornado_websockets.tests.helpers import WebSocketBaseTestCase
+from tornado_websockets.tests.helpers import WebSocketHandlerForTests
+from tornado_websockets.websocket import WebSocket
+
+if six.PY2:
+    from mock import patch, Mock
+else:
+    from unittest.mock import patch, Mock
+
+
+class TestModuleHistory(TestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def setUp(self, add_handler):
+        self.ws = WebSocket('history')
+        self.module_h = History('chat', size=3)
+        self.ws.bind(self.module_h)
+        self.ws.publish = Mock()
+
+    def socket(self):
+        socket = Mock(codec=JSON)
+        socket.websocket.batcher = None
+        socket.websocket.metrics = None
+
+        return socket
+
+    def replayed(self, socket):
+        payload = socket.send.call_args[0][0]
+
+        return json_decode(payload)
+
+    def test_construct_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « size » should be at least 1, got 0.'):
+            History(size=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « max_age » should be positive, got 0.'):
+            History(max_age=0)
+
+    def test_publish(self):
+        self.assertEqual(self.module_h.publish('new_message', {'message': 'Hello'}), 1)
+        self.assertEqual(self.module_h.publish('new_message', 'World'), 2)
+
+        # The kept message is published, it is not encoded again
+        payload = self.module_h.messages[-1][2]
+        self.assertDictEqual(json_decode(payload), {'event': 'new_message', 'data': {'message': 'World', 'seq': 2}})
+        self.ws.publish.assert_called_with(payload, None, 'new_message', local=True)
+        self.assertIs(self.ws.publish.call_args[0][0], payload)
+        self.assertEqual(len(self.module_h), 2)
+
+        # Only the last 3 messages are kept
+        for _ in range(3):
+            self.module_h.publish('new_message')
+
+        self.assertEqual(len(self.module_h), 3)
+        self.assertEqual(repr(self.module_h), '<History: 3 message(s), seq 5>')
+
+    @patch('tornado_websockets.modules.history.default_timer')
+    def test_max_age(self, default_timer):
+        module_h = History(max_age=10)
+        module_h._websocket = Mock()
+
+        default_timer.return_value = 100
+        module_h.publish('a')
+        default_timer.return_value = 105
+        module_h.publish('b')
+
+        default_timer.return_value = 112
+        self.assertEqual(len(module_h.since()), 1)
+        self.assertEqual(len(module_h), 1)
+
+    def test_replay(self):
+        for message in ('a', 'b', 'c', 'd'):
+            self.module_h.publish('new_message', message)
+
+        socket = self.socket()
+        self.module_h.replay(socket, 2)
+
+        # One frame holding the header and the missed messages
+        self.assertListEqual(self.replayed(socket), [
+            {'event': 'module_history_chat_replay', 'data': {'since': 2, 'seq': 4, 'complete': True}},
+            {'event': 'new_message', 'data': {'message': 'c', 'seq': 3}},
+            {'event': 'new_message', 'data': {'message': 'd', 'seq': 4}},
+        ])
+        self.assertEqual(socket.send.call_args[0][2], ('module_history_chat_replay', None))
+
+        # The first message is not kept anymore
+        self.module_h.replay(socket, '0')
+        replayed = self.replayed(socket)
+
+        self.assertDictEqual(replayed[0]['data'], {'since': 0, 'seq': 4, 'complete': False})
+        self.assertEqual(len(replayed), 4)
+
+        # Nothing was missed, or unknown sequence numbers
+        self.module_h.replay(socket, 4)
+        self.assertDictEqual(self.replayed(socket), {
+            'event': 'module_history_chat_replay',
+            'data': {'since': 4, 'seq': 4, 'complete': True},
+        })
+
+        self.module_h.replay(socket, 42)
+        replayed = self.replayed(socket)
+
+        self.assertDictEqual(replayed[0]['data'], {'since': None, 'seq': 4, 'complete': False})
+        self.assertEqual(len(replayed), 4)
+
+    def test_replay_with_batcher(self):
+        self.module_h.publish('new_message', 'a')
+
+        socket = self.socket()
+        socket.websocket.batcher = Batcher()
+        self.module_h.replay(socket)
+
+        self.assertEqual(socket.send.call_count, 2)
+        self.assertDictEqual(json_decode(socket.send.call_args[0][0]), {
+            'event': 'new_message',
+            'data': {'message': 'a', 'seq': 1},
+        })
+
+    def test_replay_without_batch(self):
+        module_h = History('chat', batch_replay=False)
+        self.ws.bind(module_h)
+
+        for message in ('a', 'b'):
+            module_h.publish('new_message', message)
+
+        # One frame per message, for clients which do not read batch frames
+        socket = self.socket()
+        module_h.replay(socket)
+
+        self.assertListEqual([json_decode(args[0][0]) for args in socket.send.call_args_list], [
+            {'event': 'module_history_chat_replay', 'data': {'since': None, 'seq': 2, 'complete': True}},
+            {'event': 'new_message', 'data': {'message': 'a', 'seq': 1}},
+            {'event': 'new_message', 'data': {'message': 'b', 'seq': 2}},
+        ])
+
+    def test_clear(self):
+        self.module_h.publish('new_message', 'a')
+        self.module_h.clear()
+
+        self.assertEqual(len(self.module_h), 0)
+        self.assertEqual(self.module_h.publish('new_message', 'b'), 2)
+
+
+class TestModuleHistoryCommunication(WebSocketBaseTestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def get_app(self, add_handler):
+        self.ws = WebSocket('history')
+        self.module_h = History()
+        self.ws.bind(self.module_h)
+        self.close_future = Future()
+
+        return tornado.web.Application([
+            ('/ws/history', WebSocketHandlerForTests, {'websocket': self.ws, 'close_future': self.close_future}),
+        ])
+
+    @gen_test
+    def test_replay_on_open(self):
+        self.module_h.publish('new_message', 'a')
+        self.module_h.publish('new_message', 'b')
+
+        ws_connection = yield self.ws_connect('/ws/history?module_history_since=1')
+
+        response = yield ws_connection.read_message()
+        self.assertListEqual(json_decode(response), [
+            {'event': 'module_history_replay', 'data': {'since': 1, 'seq': 2, 'complete': True}},
+            {'event': 'new_message', 'data': {'message': 'b', 'seq': 2}},
+        ])
+
+        self.module_h.publish('new_message', 'c')
+        response = yield ws_connection.read_message()
+
+        self.assertDictEqual(json_decode(response), {'event': 'new_message', 'data': {'message': 'c', 'seq': 3}})
+
+        ws_connection.write_message(json_encode({'event': 'module_history_resume', 'data': {'since': 2}}))
+        response = yield ws_connection.read_message()
+
+        self.assertListEqual(json_decode(response), [
+            {'event': 'module_history_replay', 'data': {'since': 2, 'seq': 3, 'complete': True}},
+            {'event': 'new_message', 'data': {'message': 'c', 'seq': 3}},
+        ])
+
+        self.close(ws_connection)
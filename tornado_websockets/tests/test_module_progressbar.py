@@ -1,13 +1,17 @@
 # coding=utf-8
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
 import six
 import tornado.web
+from tornado import gen
 from tornado.concurrent import Future
 from tornado.escape import json_decode
-from tornado.testing import gen_test
+from tornado.testing import AsyncTestCase, gen_test
 
-from tornado_websockets.modules import ProgressBar
+from tornado_websockets.modules import ProgressBar, ProgressCounter
 from tornado_websockets.tests.helpers import WebSocketBaseTestCase
 from tornado_websockets.tests.helpers import WebSocketHandlerForTests
 from tornado_websockets.websocket import WebSocket
@@ -32,6 +36,13 @@ class TestModuleProgressBar(TestCase):
         with self.assertRaisesRegexp(ValueError, '« min » .* not be greater or equal .* « max »'):
             ProgressBar(min=1, max=0)
 
+    def test_construct_with_invalid_throttling(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « max_rate » should be positive, got 0.'):
+            ProgressBar(max_rate=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « min_step » should be between 0 and 100, got 101.'):
+            ProgressBar(min_step=101)
+
     def test_construct_should_be_indeterminate(self):
         module_pb = ProgressBar(indeterminate=True)
 
@@ -82,6 +93,40 @@ class TestModuleProgressBar(TestCase):
         self.assertTrue(module_pb.is_done())
         module_pb.emit_done.assert_called_with()
 
+    def test_tick_by_n(self):
+        module_pb = ProgressBar(min=0, max=10)
+        module_pb.emit_update = Mock()
+        module_pb.emit_done = Mock()
+
+        module_pb.tick(4, label='Copying')
+        self.assertEqual(module_pb.current, 4)
+        module_pb.emit_update.assert_called_with('Copying')
+
+        # Does not go beyond « max »
+        module_pb.tick(20)
+        self.assertEqual(module_pb.current, 10)
+        self.assertTrue(module_pb.is_done())
+        module_pb.emit_done.assert_called_once_with()
+
+    def test_min_step(self):
+        module_pb = ProgressBar(min=0, max=200, min_step=5)
+        module_pb.emit_update = Mock()
+        module_pb.emit_done = Mock()
+
+        for i in range(199):
+            module_pb.tick(label='Item %d' % i)
+
+        # One update every 10 ticks (5 %)
+        self.assertEqual(module_pb.emit_update.call_count, 19)
+        module_pb.emit_update.assert_called_with('Item 189')
+        module_pb.emit_done.assert_not_called()
+
+        # The last update is always emitted
+        module_pb.tick(label='Last')
+        self.assertEqual(module_pb.emit_update.call_count, 20)
+        module_pb.emit_update.assert_called_with('Last')
+        module_pb.emit_done.assert_called_once_with()
+
     def test_reset(self):
         module_pb = ProgressBar()
         module_pb.emit_update = Mock()
@@ -123,14 +168,14 @@ class TestModuleProgressBar(TestCase):
 
         module_pb.emit_init()
 
-        call1 = call('module_progressbar_before_init', None)
+        call1 = call('module_progressbar_before_init', None, room=None, local=False)
         call2 = call('module_progressbar_init', {
             'indeterminate': False,
             'min': 0,
             'max': 100,
             'current': 0
-        })
-        call3 = call('module_progressbar_after_init', None)
+        }, room=None, local=False)
+        call3 = call('module_progressbar_after_init', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
 
@@ -144,11 +189,11 @@ class TestModuleProgressBar(TestCase):
 
         module_pb.emit_init()
 
-        call1 = call('module_progressbar_before_init', None)
+        call1 = call('module_progressbar_before_init', None, room=None, local=False)
         call2 = call('module_progressbar_init', {
             'indeterminate': True
-        })
-        call3 = call('module_progressbar_after_init', None)
+        }, room=None, local=False)
+        call3 = call('module_progressbar_after_init', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
 
@@ -163,11 +208,11 @@ class TestModuleProgressBar(TestCase):
         # 1st try, without label
         module_pb.tick()
 
-        call1 = call('module_progressbar_before_update', None)
+        call1 = call('module_progressbar_before_update', None, room=None, local=False)
         call2 = call('module_progressbar_update', {
             'current': 1
-        })
-        call3 = call('module_progressbar_after_update', None)
+        }, room=None, local=False)
+        call3 = call('module_progressbar_after_update', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
         ws.emit.reset_mock()
@@ -175,12 +220,12 @@ class TestModuleProgressBar(TestCase):
         # 2nd and last try, with label
         module_pb.tick('My label')
 
-        call1 = call('module_progressbar_before_update', None)
+        call1 = call('module_progressbar_before_update', None, room=None, local=False)
         call2 = call('module_progressbar_update', {
             'current': 2,
             'label': 'My label'
-        })
-        call3 = call('module_progressbar_after_update', None)
+        }, room=None, local=False)
+        call3 = call('module_progressbar_after_update', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
 
@@ -195,9 +240,9 @@ class TestModuleProgressBar(TestCase):
         # 1st try, without label
         module_pb.tick()
 
-        call1 = call('module_progressbar_before_update', None)
-        call2 = call('module_progressbar_update', {})
-        call3 = call('module_progressbar_after_update', None)
+        call1 = call('module_progressbar_before_update', None, room=None, local=False)
+        call2 = call('module_progressbar_update', {}, room=None, local=False)
+        call3 = call('module_progressbar_after_update', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
         ws.emit.reset_mock()
@@ -205,11 +250,11 @@ class TestModuleProgressBar(TestCase):
         # 2nd and last try, with label
         module_pb.tick('My label')
 
-        call1 = call('module_progressbar_before_update', None)
+        call1 = call('module_progressbar_before_update', None, room=None, local=False)
         call2 = call('module_progressbar_update', {
             'label': 'My label'
-        })
-        call3 = call('module_progressbar_after_update', None)
+        }, room=None, local=False)
+        call3 = call('module_progressbar_after_update', None, room=None, local=False)
 
         ws.emit.assert_has_calls([call1, call2, call3])
 
@@ -232,7 +277,168 @@ class TestModuleProgressBar(TestCase):
         module_pb.tick()
         self.assertEqual(module_pb.current, 2)
         self.assertEqual(module_pb.current, module_pb.max)
-        ws.emit.assert_called_with('module_progressbar_done', None)
+        ws.emit.assert_called_with('module_progressbar_done', None, room=None, local=False)
+
+
+class TestModuleProgressBarThrottling(AsyncTestCase):
+    def setUp(self):
+        super(TestModuleProgressBarThrottling, self).setUp()
+        self.module_pb = ProgressBar(min=0, max=1000, max_rate=20)
+        self.module_pb.emit_update = Mock()
+        self.module_pb.emit_done = Mock()
+
+    @gen_test
+    def test_coalesce(self):
+        for i in range(100):
+            self.module_pb.tick(label='Item %d' % i)
+
+        # The first update is emitted, the next ones are coalesced in a delayed update
+        self.module_pb.emit_update.assert_called_once_with('Item 0')
+        self.assertIsNotNone(self.module_pb._timeout)
+
+        yield gen.sleep(0.07)
+
+        self.assertEqual(self.module_pb.emit_update.call_count, 2)
+        self.module_pb.emit_update.assert_called_with('Item 99')
+        self.assertEqual(self.module_pb.emitted, 100)
+        self.assertIsNone(self.module_pb._timeout)
+
+    @gen_test
+    def test_done_is_not_delayed(self):
+        self.module_pb.tick()
+        self.module_pb.tick()
+        self.module_pb.tick(1000, label='Done')
+
+        self.assertEqual(self.module_pb.emit_update.call_count, 2)
+        self.module_pb.emit_update.assert_called_with('Done')
+        self.module_pb.emit_done.assert_called_once_with()
+        self.assertIsNone(self.module_pb._timeout)
+
+        yield gen.sleep(0.07)
+        self.assertEqual(self.module_pb.emit_update.call_count, 2)
+
+    @gen_test
+    def test_reset_cancels_update(self):
+        self.module_pb.tick()
+        self.module_pb.tick()
+        self.module_pb.reset()
+
+        self.assertIsNone(self.module_pb._timeout)
+        self.assertEqual(self.module_pb.emitted, 0)
+
+        yield gen.sleep(0.07)
+        self.module_pb.emit_update.assert_called_once_with(None)
+
+
+def add_to_counter(counter, times):
+    for _ in range(times):
+        counter.add()
+
+
+class TestProgressCounter(TestCase):
+    def test_add_and_reset(self):
+        counter = ProgressCounter()
+        self.assertEqual(counter.value, 0)
+
+        counter.add()
+        counter.add(9)
+        self.assertEqual(counter.value, 10)
+        self.assertEqual(repr(counter), '<ProgressCounter: 10>')
+
+        counter.reset()
+        self.assertEqual(counter.value, 0)
+
+    def test_threads(self):
+        counter = ProgressCounter()
+        threads = [threading.Thread(target=add_to_counter, args=(counter, 1000)) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.value, 4000)
+
+    def test_processes(self):
+        counter = ProgressCounter()
+        processes = [multiprocessing.Process(target=add_to_counter, args=(counter, 100)) for _ in range(2)]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
+
+        self.assertEqual(counter.value, 200)
+
+
+class TestModuleProgressBarWatch(AsyncTestCase):
+    def setUp(self):
+        super(TestModuleProgressBarWatch, self).setUp()
+        self.module_pb = ProgressBar(min=10, max=20)
+        self.module_pb.emit_update = Mock()
+        self.module_pb.emit_done = Mock()
+        self.counter = ProgressCounter()
+
+    def test_watch_with_invalid_interval(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « interval » should be positive, got 0.'):
+            self.module_pb.watch(self.counter, interval=0)
+
+    @gen_test
+    def test_sample(self):
+        self.module_pb.watch(self.counter, interval=0.01)
+
+        # Nothing is emitted while the counter does not change
+        yield gen.sleep(0.03)
+        self.module_pb.emit_update.assert_not_called()
+
+        self.counter.add(3)
+        self.counter.add(2)
+        yield gen.sleep(0.03)
+
+        self.assertEqual(self.module_pb.current, 15)
+        self.module_pb.emit_update.assert_called_once_with(None)
+
+        # Done stops the sampling, above « max » is clamped
+        self.counter.add(100)
+        yield gen.sleep(0.03)
+
+        self.assertEqual(self.module_pb.current, 20)
+        self.assertEqual(self.module_pb.emit_update.call_count, 2)
+        self.module_pb.emit_done.assert_called_once_with()
+        self.assertIsNone(self.module_pb.counter)
+        self.assertIsNone(self.module_pb._sampler)
+
+    @gen_test
+    def test_reset_unwatches(self):
+        self.module_pb.watch(self.counter, interval=0.01)
+        self.module_pb.reset()
+        self.counter.add(5)
+
+        yield gen.sleep(0.03)
+        self.module_pb.emit_update.assert_not_called()
+        self.assertEqual(self.module_pb.current, 10)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    @gen_test
+    def test_tick_from_executor(self, add_handler):
+        ws = WebSocket('pb_executor')
+        ws.bind(self.module_pb)
+        threads = []
+        self.module_pb.emit_update.side_effect = lambda label: threads.append(threading.current_thread())
+
+        @ws.on(executor=ThreadPoolExecutor(1))
+        def work():
+            self.module_pb.tick(2, label='Working')
+
+        yield ws.invokers['work'](None, None, {})
+        yield gen.moment
+
+        # The tick was done in the IOLoop thread
+        self.assertEqual(self.module_pb.current, 12)
+        self.module_pb.emit_update.assert_called_once_with('Working')
+        self.assertListEqual(threads, [threading.current_thread()])
 
 
 class TestModuleProgressBarCommunication(WebSocketBaseTestCase):
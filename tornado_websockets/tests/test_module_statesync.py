@@ -0,0 +1,188 @@
+# coding=utf-8
+from unittest import TestCase
+
+import six
+import tornado.web
+from tornado.concurrent import Future
+from tornado.escape import json_decode, json_encode
+from tornado.testing import gen_test
+
+from tornado_websockets.modules import StateSync
+from tornado_websockets.tests.helpers import WebSocketBaseTestCase
+from tornado_websockets.tests.helpers import WebSocketHandlerForTests
+from tornado_websockets.websocket import WebSocket
+
+if six.PY2:
+    from mock import patch, Mock
+else:
+    from unittest.mock import patch, Mock
+
+
+class TestModuleStateSync(TestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def setUp(self, add_handler):
+        self.ws = WebSocket('state')
+        self.module_ss = StateSync('dashboard', state={'users': 1}, history=3)
+        self.ws.bind(self.module_ss)
+        self.ws.emit = Mock()
+
+    def test_construct(self):
+        self.assertEqual(self.module_ss.name, 'module_statesync_dashboard')
+        self.assertEqual(self.module_ss.version, 0)
+        self.assertEqual(self.module_ss['users'], 1)
+        self.assertIn('module_statesync_dashboard_open', self.ws.events)
+        self.assertIn('module_statesync_dashboard_sync', self.ws.events)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « history » should be at least 1, got 0.'):
+            StateSync(history=0)
+
+    def test_update(self):
+        self.assertEqual(self.module_ss.update({'users': 2, 'cpu': 0.5}), 1)
+
+        self.ws.emit.assert_called_once_with('module_statesync_dashboard_diff', {
+            'since': 0,
+            'version': 1,
+            'set': {'users': 2, 'cpu': 0.5},
+        }, room=None, local=True)
+
+        # Only changed values are sent
+        self.ws.emit.reset_mock()
+        self.assertEqual(self.module_ss.update(users=2, cpu=0.7), 2)
+
+        self.ws.emit.assert_called_once_with('module_statesync_dashboard_diff', {
+            'since': 1,
+            'version': 2,
+            'set': {'cpu': 0.7},
+        }, room=None, local=True)
+
+        # Nothing changed
+        self.ws.emit.reset_mock()
+        self.assertEqual(self.module_ss.set('cpu', 0.7), 2)
+        self.ws.emit.assert_not_called()
+
+    def test_delete_and_clear(self):
+        self.module_ss.set('cpu', 0.5)
+        self.ws.emit.reset_mock()
+
+        self.assertEqual(self.module_ss.delete('cpu', 'unknown'), 2)
+        self.ws.emit.assert_called_once_with('module_statesync_dashboard_diff', {
+            'since': 1,
+            'version': 2,
+            'unset': ['cpu'],
+        }, room=None, local=True)
+
+        self.assertEqual(self.module_ss.delete('cpu'), 2)
+
+        self.assertEqual(self.module_ss.clear(), 3)
+        self.assertEqual(len(self.module_ss), 0)
+        self.assertEqual(repr(self.module_ss), '<StateSync: 0 key(s), version 3>')
+
+    def test_diff_since(self):
+        self.module_ss.set('cpu', 0.5)
+        self.module_ss.set('users', 2)
+        self.module_ss.delete('cpu')
+
+        self.assertDictEqual(self.module_ss.diff_since(1), {
+            'since': 1,
+            'version': 3,
+            'set': {'users': 2},
+            'unset': ['cpu'],
+        })
+        self.assertDictEqual(self.module_ss.diff_since(0), {
+            'since': 0,
+            'version': 3,
+            'set': {'users': 2},
+            'unset': ['cpu'],
+        })
+        self.assertDictEqual(self.module_ss.diff_since(3), {'since': 3, 'version': 3})
+
+        # From the future
+        self.assertIsNone(self.module_ss.diff_since(4))
+
+        # Only 3 diffs are kept
+        self.module_ss.set('cpu', 0.1)
+        self.assertIsNone(self.module_ss.diff_since(0))
+        self.assertDictEqual(self.module_ss.diff_since(1), {
+            'since': 1,
+            'version': 4,
+            'set': {'users': 2, 'cpu': 0.1},
+        })
+
+    def test_sync(self):
+        socket = Mock()
+        self.module_ss.set('cpu', 0.5)
+
+        self.module_ss.sync(socket)
+        socket.emit.assert_called_with('module_statesync_dashboard_snapshot', {
+            'version': 1,
+            'state': {'users': 1, 'cpu': 0.5},
+        })
+
+        self.module_ss.sync(socket, 'invalid')
+        socket.emit.assert_called_with('module_statesync_dashboard_snapshot', {
+            'version': 1,
+            'state': {'users': 1, 'cpu': 0.5},
+        })
+
+        self.module_ss.sync(socket, 0)
+        socket.emit.assert_called_with('module_statesync_dashboard_diff', {
+            'since': 0,
+            'version': 1,
+            'set': {'cpu': 0.5},
+        })
+
+
+class TestModuleStateSyncCommunication(WebSocketBaseTestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def get_app(self, add_handler):
+        self.ws = WebSocket('state')
+        self.module_ss = StateSync(state={'users': 0})
+        self.ws.bind(self.module_ss)
+        self.close_future = Future()
+
+        return tornado.web.Application([
+            ('/ws/module/state', WebSocketHandlerForTests, {'websocket': self.ws, 'close_future': self.close_future}),
+        ])
+
+    @gen_test
+    def test_snapshot_then_diffs(self):
+        ws_connection = yield self.ws_connect('/ws/module/state')
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {
+            'event': 'module_statesync_snapshot',
+            'data': {'version': 0, 'state': {'users': 0}},
+        })
+
+        self.module_ss.set('users', 1)
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {
+            'event': 'module_statesync_diff',
+            'data': {'since': 0, 'version': 1, 'set': {'users': 1}},
+        })
+
+        ws_connection.write_message(json_encode({'event': 'module_statesync_sync', 'data': {'version': 0}}))
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {
+            'event': 'module_statesync_diff',
+            'data': {'since': 0, 'version': 1, 'set': {'users': 1}},
+        })
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_reconnect_with_version(self):
+        self.module_ss.set('users', 1)
+        self.module_ss.set('cpu', 0.5)
+
+        ws_connection = yield self.ws_connect('/ws/module/state?module_statesync_version=1')
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {
+            'event': 'module_statesync_diff',
+            'data': {'since': 1, 'version': 2, 'set': {'cpu': 0.5}},
+        })
+
+        self.close(ws_connection)
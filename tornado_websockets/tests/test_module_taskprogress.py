@@ -0,0 +1,335 @@
+# coding=utf-8
+from unittest import TestCase
+
+import six
+import tornado.web
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.escape import json_decode, json_encode
+from tornado.testing import gen_test
+
+from tornado_websockets.modules import TaskProgress, TaskProgressBar
+from tornado_websockets.tests.helpers import WebSocketBaseTestCase
+from tornado_websockets.tests.helpers import WebSocketHandlerForTests
+from tornado_websockets.websocket import WebSocket
+
+if six.PY2:
+    from mock import patch, Mock, call
+else:
+    from unittest.mock import patch, Mock, call
+
+
+class TestModuleTaskProgress(TestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def setUp(self, add_handler):
+        self.ws = WebSocket('tasks')
+        self.module_tp = TaskProgress('export', max_tasks=3, ttl=60, max=10)
+        self.ws.bind(self.module_tp)
+        self.ws.emit = Mock()
+
+    def test_construct_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « max_tasks » should be at least 1, got 0.'):
+            TaskProgress(max_tasks=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « ttl » should be positive, got 0.'):
+            TaskProgress(ttl=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « max_subscriptions » should be at least 1, got 0.'):
+            TaskProgress(max_subscriptions=0)
+
+    def test_initialize(self):
+        self.assertEqual(self.module_tp.name, 'module_taskprogress_export')
+        self.assertIn('module_taskprogress_export_subscribe', self.ws.events)
+        self.assertIn('module_taskprogress_export_unsubscribe', self.ws.events)
+
+    def test_create(self):
+        progressbar = self.module_tp.create(42, min_step=10)
+
+        self.assertIsInstance(progressbar, TaskProgressBar)
+        self.assertEqual(progressbar.task_id, '42')
+        self.assertEqual(progressbar.max, 10)
+        self.assertEqual(progressbar.min_step, 10)
+        self.assertIs(self.module_tp.get('42'), progressbar)
+        self.assertIs(self.module_tp.get(42), progressbar)
+
+        room = 'module_taskprogress_export:42'
+        self.assertEqual(progressbar.room, room)
+        self.ws.emit.assert_has_calls([
+            call('module_taskprogress_export_before_init', {'task': '42'}, room=room, local=False),
+            call('module_taskprogress_export_init', {
+                'indeterminate': False,
+                'min': 0,
+                'max': 10,
+                'current': 0,
+                'task': '42',
+            }, room=room, local=False),
+            call('module_taskprogress_export_after_init', {'task': '42'}, room=room, local=False),
+        ])
+
+        self.ws.emit.reset_mock()
+        progressbar.tick(label='Exporting')
+
+        self.ws.emit.assert_has_calls([
+            call('module_taskprogress_export_update', {'current': 1, 'label': 'Exporting', 'task': '42'},
+                 room=room, local=False),
+        ])
+
+    def test_create_replaces_task(self):
+        first = self.module_tp.create('a')
+        second = self.module_tp.create('a')
+
+        self.assertIsNot(first, second)
+        self.assertIs(self.module_tp.get('a'), second)
+        self.assertEqual(len(self.module_tp), 1)
+        self.assertEqual(self.module_tp.evicted, 0)
+
+    def test_evict_least_recently_used(self):
+        for task_id in 'abc':
+            self.module_tp.create(task_id)
+
+        # « a » is used, so « b » is the least recently used task
+        self.module_tp.get('a')
+        self.module_tp.create('d')
+
+        self.assertListEqual(list(self.module_tp.tasks), ['c', 'a', 'd'])
+        self.assertIsNone(self.module_tp.get('b'))
+        self.assertEqual(self.module_tp.evicted, 1)
+        self.assertEqual(repr(self.module_tp), '<TaskProgress: 3 task(s), 1 evicted>')
+
+        # « c » progresses, so « a » is the least recently used task
+        self.module_tp.tasks['c'].tick()
+        self.module_tp.create('e')
+
+        self.assertListEqual(list(self.module_tp.tasks), ['d', 'c', 'e'])
+
+    def test_evict_finished_tasks_first(self):
+        running = self.module_tp.create('a')
+        self.module_tp.create('b').tick(10)
+        self.module_tp.create('c').tick(10)
+
+        # « a » is the least recently used task, but it is still running
+        self.module_tp.create('d')
+
+        self.assertListEqual(list(self.module_tp.tasks), ['a', 'c', 'd'])
+        self.assertListEqual(list(self.module_tp.finished), ['c'])
+
+        running.tick(10)
+        self.assertEqual(running.current, 10)
+        self.assertListEqual(list(self.module_tp.finished), ['c', 'a'])
+
+    def test_evict_finished_tasks_first_without_ttl(self):
+        module_tp = TaskProgress(max_tasks=2, ttl=None, max=10)
+        self.ws.bind(module_tp)
+
+        running = module_tp.create('a')
+        module_tp.create('b').tick(10)
+        module_tp.create('c')
+
+        self.assertListEqual(list(module_tp.tasks), ['a', 'c'])
+        self.assertIs(module_tp.get('a'), running)
+
+        # Finished tasks are kept until they are evicted
+        module_tp.tasks['c'].tick(10)
+        module_tp.expire()
+        self.assertListEqual(list(module_tp.finished), ['c'])
+
+    @patch('tornado_websockets.modules.taskprogress.default_timer')
+    def test_expire_finished_tasks(self, default_timer):
+        default_timer.return_value = 1000
+        progressbar = self.module_tp.create('a')
+        self.module_tp.create('b')
+
+        progressbar.tick(10)
+        self.assertDictEqual(dict(self.module_tp.finished), {'a': 1060})
+
+        default_timer.return_value = 1059
+        self.assertIs(self.module_tp.get('a'), progressbar)
+
+        default_timer.return_value = 1060
+        self.assertIsNone(self.module_tp.get('a'))
+        self.assertIsNotNone(self.module_tp.get('b'))
+        self.assertDictEqual(dict(self.module_tp.finished), {})
+        self.assertEqual(self.module_tp.evicted, 1)
+
+    @patch('tornado_websockets.modules.taskprogress.default_timer')
+    def test_reset_keeps_finished_task(self, default_timer):
+        default_timer.return_value = 1000
+        progressbar = self.module_tp.create('a')
+
+        progressbar.tick(10)
+        progressbar.reset()
+
+        default_timer.return_value = 2000
+        self.assertIs(self.module_tp.get('a'), progressbar)
+
+    def test_remove(self):
+        progressbar = self.module_tp.create('a')
+        progressbar.cancel = Mock()
+        progressbar.unwatch = Mock()
+
+        handler = Mock(rooms=set())
+        self.ws.join(progressbar.room, handler)
+
+        self.assertIs(self.module_tp.remove('a'), progressbar)
+        self.assertIsNone(self.module_tp.remove('a'))
+
+        progressbar.cancel.assert_called_once_with()
+        progressbar.unwatch.assert_called_once_with()
+        self.assertEqual(len(self.module_tp), 0)
+
+        # Its subscribers left its room
+        self.assertSetEqual(handler.rooms, set())
+        self.assertDictEqual(self.ws.rooms, {})
+
+    def socket(self, user):
+        socket = Mock(rooms=set(), context={'user': user})
+        socket.join.side_effect = lambda room: self.ws.join(room, socket)
+
+        return socket
+
+    def test_subscribe_authorize(self):
+        module_tp = TaskProgress(authorize=lambda socket, task_id: task_id.startswith(socket.context['user']))
+        self.ws.bind(module_tp)
+        module_tp.create('alice-1')
+
+        alice, bob = self.socket('alice'), self.socket('bob')
+
+        module_tp.subscribe(alice, 'alice-1')
+        module_tp.subscribe(bob, 'alice-1')
+
+        self.assertSetEqual(alice.rooms, {'module_taskprogress:alice-1'})
+        self.assertSetEqual(bob.rooms, set())
+        bob.emit_warning.assert_called_once_with('You are not allowed to subscribe to the task alice-1.')
+        bob.emit.assert_not_called()
+
+    def test_subscribe_is_bounded(self):
+        module_tp = TaskProgress(max_subscriptions=2)
+        self.ws.bind(module_tp)
+        socket = self.socket('alice')
+
+        # Tasks which do not exist yet
+        for task_id in ('a', 'b', 'c'):
+            module_tp.subscribe(socket, task_id)
+
+        self.assertSetEqual(socket.rooms, {'module_taskprogress:a', 'module_taskprogress:b'})
+        socket.emit_warning.assert_called_once_with('You can not subscribe to more than 2 tasks.')
+
+        # Subscribing again to a task, or after an unsubscription, is allowed
+        module_tp.subscribe(socket, 'b')
+        self.ws.leave('module_taskprogress:a', socket)
+        module_tp.subscribe(socket, 'c')
+
+        self.assertSetEqual(socket.rooms, {'module_taskprogress:b', 'module_taskprogress:c'})
+        self.assertEqual(socket.emit_warning.call_count, 1)
+        self.assertEqual(len(self.ws.rooms), 2)
+
+    def test_replace_keeps_subscribers(self):
+        progressbar = self.module_tp.create('a')
+        handler = Mock(rooms=set())
+        self.ws.join(progressbar.room, handler)
+
+        self.module_tp.create('a')
+
+        self.assertSetEqual(handler.rooms, {progressbar.room})
+
+
+class TestModuleTaskProgressCommunication(WebSocketBaseTestCase):
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def get_app(self, add_handler):
+        self.ws = WebSocket('tasks')
+        self.module_tp = TaskProgress(max=4)
+        self.ws.bind(self.module_tp)
+        self.close_future = Future()
+
+        return tornado.web.Application([
+            ('/ws/module/tasks', WebSocketHandlerForTests, {'websocket': self.ws, 'close_future': self.close_future}),
+        ])
+
+    def subscribe(self, ws_connection, task_id):
+        ws_connection.write_message(json_encode({
+            'event': 'module_taskprogress_subscribe',
+            'data': {'task': task_id},
+        }))
+
+    @gen_test
+    def test_subscribe(self):
+        progressbar = self.module_tp.create('a')
+        progressbar.tick()
+        other = self.module_tp.create('b')
+
+        ws_connection = yield self.ws_connect('/ws/module/tasks')
+        self.subscribe(ws_connection, 'a')
+
+        # The current state of the task is sent to the new subscriber only
+        events = []
+
+        for _ in range(3):
+            response = yield ws_connection.read_message()
+            events.append(json_decode(response))
+
+        self.assertListEqual(events, [
+            {'event': 'module_taskprogress_before_init', 'data': {'task': 'a'}},
+            {'event': 'module_taskprogress_init', 'data': {
+                'indeterminate': False, 'min': 0, 'max': 4, 'current': 1, 'task': 'a'
+            }},
+            {'event': 'module_taskprogress_after_init', 'data': {'task': 'a'}},
+        ])
+
+        # Updates of other tasks are not sent
+        other.tick()
+        progressbar.tick(label='Half')
+
+        events = []
+
+        for _ in range(3):
+            response = yield ws_connection.read_message()
+            events.append(json_decode(response))
+
+        self.assertDictEqual(events[1], {
+            'event': 'module_taskprogress_update',
+            'data': {'current': 2, 'label': 'Half', 'task': 'a'},
+        })
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_subscribe_before_create(self):
+        ws_connection = yield self.ws_connect('/ws/module/tasks')
+        self.subscribe(ws_connection, 7)
+        handler = list(self.ws.handlers)[0]
+
+        while not handler.rooms:
+            yield gen.moment
+
+        self.module_tp.create(7)
+        yield ws_connection.read_message()
+        response = yield ws_connection.read_message()
+
+        self.assertDictEqual(json_decode(response)['data'], {
+            'indeterminate': False, 'min': 0, 'max': 4, 'current': 0, 'task': '7'
+        })
+
+        ws_connection.write_message(json_encode({
+            'event': 'module_taskprogress_unsubscribe',
+            'data': {'task': 7},
+        }))
+
+        while handler.rooms:
+            yield gen.moment
+
+        self.assertDictEqual(self.ws.rooms, {})
+        self.close(ws_connection)
+
+    @gen_test
+    def test_subscribe_without_task(self):
+        ws_connection = yield self.ws_connect('/ws/module/tasks')
+        ws_connection.write_message(json_encode({'event': 'module_taskprogress_subscribe', 'data': {}}))
+
+        response = yield ws_connection.read_message()
+
+        self.assertDictEqual(json_decode(response), {
+            'event': 'warning',
+            'data': {'message': 'The task to subscribe to is missing.'},
+        })
+
+        self.close(ws_connection)
@@ -0,0 +1,203 @@
+# coding: utf-8
+
+from concurrent.futures import Future
+from unittest import TestCase
+
+import six
+from tornado.iostream import StreamClosedError
+
+from tornado_websockets.outbound import OutboundQueue, outbound_options, SLOW_CONSUMER_CLOSE_CODE
+
+if six.PY2:
+    from mock import Mock
+else:
+    from unittest.mock import Mock
+
+
+class FakeHandler(object):
+    """
+        Connection whose writes are flushed when the test decides to.
+    """
+
+    id = 1
+
+    def __init__(self):
+        self.websocket = Mock(path='/test')
+        self.written = []
+        self.futures = []
+        self.close = Mock()
+
+    def write_now(self, payload, frame=None):
+        future = Future()
+        self.written.append(payload)
+        self.futures.append(future)
+        return future
+
+    def flush(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.set_result(None)
+
+
+class TestOutboundOptions(TestCase):
+    """
+        Tests for the function « outbound_options ».
+    """
+
+    def test_defaults(self):
+        options = outbound_options(high_watermark=100, low_watermark=10)
+
+        self.assertDictEqual(options, {
+            'high_watermark': 100,
+            'low_watermark': 10,
+            'queue_limit': 100,
+            'policy': 'drop_oldest',
+        })
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            outbound_options(high_watermark=10, low_watermark=100)
+
+        with self.assertRaises(ValueError):
+            outbound_options(queue_limit=-1)
+
+        with self.assertRaises(ValueError):
+            outbound_options(policy='ignore')
+
+        with self.assertRaises(TypeError):
+            outbound_options(unknown=True)
+
+
+class TestOutboundQueue(TestCase):
+    """
+        Tests for the class « OutboundQueue ».
+    """
+
+    def setUp(self):
+        self.handler = FakeHandler()
+
+    def test_fast_client(self):
+        outbound = OutboundQueue(self.handler, high_watermark=10, low_watermark=0)
+
+        for i in range(5):
+            outbound.send(b'12345')
+            self.handler.flush()
+
+        self.assertEqual(len(self.handler.written), 5)
+        self.assertEqual(outbound.pending_bytes, 0)
+        self.assertEqual(len(outbound.queue), 0)
+
+    def test_slow_client_is_paused_then_resumed(self):
+        outbound = OutboundQueue(self.handler, high_watermark=10, low_watermark=5)
+
+        outbound.send(b'12345', frame=b'..12345')
+        outbound.send(b'67890', frame=b'..67890')
+        outbound.send(b'abcde', frame=b'..abcde')
+
+        # 14 bytes are being written, above the high watermark
+        self.assertListEqual(self.handler.written, [b'12345', b'67890'])
+        self.assertEqual(outbound.pending_bytes, 14)
+        self.assertEqual(outbound.queued_bytes, 7)
+
+        self.handler.flush()
+
+        self.assertListEqual(self.handler.written, [b'12345', b'67890', b'abcde'])
+        self.assertEqual(outbound.pending_bytes, 7)
+        self.assertEqual(outbound.queued_bytes, 0)
+        self.assertEqual(outbound.dropped_messages, 0)
+
+    def test_only_last_write_is_flushed(self):
+        # Old Tornado versions only resolve the future of the last write
+        outbound = OutboundQueue(self.handler, high_watermark=10, low_watermark=0)
+
+        outbound.send(b'12345')
+        outbound.send(b'67890')
+        outbound.send(b'abcde')
+        self.handler.futures.pop().set_result(None)
+
+        # Both writes are flushed, so the queued message is written
+        self.assertEqual(outbound.pending_bytes, 5)
+        self.assertListEqual(self.handler.written, [b'12345', b'67890', b'abcde'])
+
+    def test_drop_oldest(self):
+        outbound = OutboundQueue(self.handler, high_watermark=5, low_watermark=0, queue_limit=10)
+
+        for message in (b'12345', b'first', b'secnd', b'third'):
+            outbound.send(message)
+
+        self.assertListEqual(list(message[0] for message in outbound.queue), [b'secnd', b'third'])
+        self.assertEqual(outbound.dropped_messages, 1)
+        self.assertEqual(outbound.dropped_bytes, 5)
+
+        self.handler.flush()
+        self.handler.flush()
+
+        self.assertListEqual(self.handler.written, [b'12345', b'secnd', b'third'])
+
+    def test_coalesce(self):
+        outbound = OutboundQueue(self.handler, high_watermark=5, low_watermark=0, queue_limit=100, policy='coalesce')
+
+        outbound.send(b'12345', key='update')
+        outbound.send(b'update 1', key='update')
+        outbound.send(b'label', key='label')
+        outbound.send(b'update 2', key='update')
+        outbound.send(b'no event')
+        outbound.send(b'no event')
+
+        self.assertListEqual(list(message[0] for message in outbound.queue), [
+            b'update 2', b'label', b'no event', b'no event'
+        ])
+        self.assertEqual(outbound.dropped_messages, 1)
+        self.assertEqual(outbound.dropped_bytes, 8)
+        self.assertEqual(outbound.queued_bytes, 29)
+
+        # A new message is not coalesced with a message already sent
+        self.handler.flush()
+        outbound.send(b'update 3', key='update')
+
+        self.assertListEqual(list(message[0] for message in outbound.queue), [
+            b'label', b'no event', b'no event', b'update 3'
+        ])
+
+    def test_coalesce_per_key(self):
+        outbound = OutboundQueue(self.handler, high_watermark=5, low_watermark=0, queue_limit=100, policy='coalesce')
+
+        # Progress of two tasks, each one in its own room
+        outbound.send(b'12345')
+        outbound.send(b'task 1: 10%', key=('update', 'task:1'))
+        outbound.send(b'task 2: 10%', key=('update', 'task:2'))
+        outbound.send(b'task 1: done', key=('done', 'task:1'))
+        outbound.send(b'task 2: 20%', key=('update', 'task:2'))
+        outbound.send(b'task 2: done', key=('done', 'task:2'))
+
+        self.assertListEqual(list(message[0] for message in outbound.queue), [
+            b'task 1: 10%', b'task 2: 20%', b'task 1: done', b'task 2: done'
+        ])
+        self.assertEqual(outbound.dropped_messages, 1)
+
+    def test_disconnect(self):
+        outbound = OutboundQueue(self.handler, high_watermark=5, low_watermark=0, queue_limit=5, policy='disconnect')
+
+        outbound.send(b'12345')
+        outbound.send(b'first')
+        self.handler.close.assert_not_called()
+
+        outbound.send(b'secnd')
+
+        self.handler.close.assert_called_once_with(SLOW_CONSUMER_CLOSE_CODE, 'Slow consumer')
+        self.assertEqual(len(outbound.queue), 0)
+        self.assertEqual(outbound.dropped_messages, 2)
+
+    def test_closed_connection(self):
+        outbound = OutboundQueue(self.handler, high_watermark=5, low_watermark=0)
+
+        outbound.send(b'12345')
+        outbound.send(b'first')
+        self.handler.futures[0].set_exception(StreamClosedError())
+
+        self.assertEqual(len(outbound.queue), 1)
+
+        outbound.clear()
+
+        self.assertEqual(len(outbound.queue), 0)
+        self.assertEqual(outbound.dropped_messages, 1)
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+from unittest import TestCase
+
+from mock import patch
+
+from tornado_websockets.ratelimit import RateLimit
+
+
+class TestRateLimit(TestCase):
+    """
+        Tests for the class « RateLimit ».
+    """
+
+    def test_init(self):
+        rate_limit = RateLimit(rate=0.5)
+
+        self.assertEqual(rate_limit.rate, 0.5)
+        self.assertEqual(rate_limit.burst, 1)
+        self.assertEqual(rate_limit.action, 'warn')
+        self.assertEqual(RateLimit(rate=10).burst, 10)
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « rate » should be positive, got 0.'):
+            RateLimit(rate=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « burst » should be at least 1, got 0.5.'):
+            RateLimit(rate=1, burst=0.5)
+
+        with self.assertRaisesRegexp(ValueError, "Param « action » should be one of warn, drop, close, got 'ban'."):
+            RateLimit(rate=1, action='ban')
+
+    @patch('tornado_websockets.ratelimit.default_timer')
+    def test_consume(self, default_timer):
+        rate_limit = RateLimit(rate=2, burst=3)
+        default_timer.return_value = 100.0
+        bucket = rate_limit.bucket()
+
+        self.assertListEqual([rate_limit.consume(bucket) for _ in range(4)], [True, True, True, False])
+
+        # Half a second later, one token was refilled
+        default_timer.return_value = 100.5
+        self.assertTrue(rate_limit.consume(bucket))
+        self.assertFalse(rate_limit.consume(bucket))
+
+        # The bucket never holds more than « burst » tokens
+        default_timer.return_value = 200.0
+        self.assertListEqual([rate_limit.consume(bucket) for _ in range(4)], [True, True, True, False])
+        self.assertEqual(len(bucket), 2)
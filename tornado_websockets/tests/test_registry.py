@@ -0,0 +1,75 @@
+# coding: utf-8
+
+from unittest import TestCase
+
+from tornado_websockets.registry import ConnectionRegistry
+
+
+class Connection(object):
+    def __init__(self, id):
+        self.id = id
+
+
+class TestConnectionRegistry(TestCase):
+    """
+        Tests for the class « ConnectionRegistry ».
+    """
+
+    def test_add_get_count(self):
+        registry = ConnectionRegistry()
+        connection1, connection2 = Connection(1), Connection(2)
+
+        self.assertEqual(registry.count(), 0)
+        self.assertIsNone(registry.get(1))
+
+        registry.add(connection1)
+        registry.add(connection2)
+
+        self.assertEqual(registry.count(), 2)
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get(1), connection1)
+        self.assertIs(registry.get(2), connection2)
+        self.assertIn(connection1, registry)
+        self.assertNotIn(Connection(3), registry)
+
+    def test_remove(self):
+        registry = ConnectionRegistry()
+        connection = Connection(1)
+
+        registry.add(connection)
+
+        self.assertTrue(registry.remove(connection))
+        self.assertFalse(registry.remove(connection))
+        self.assertEqual(registry.count(), 0)
+        self.assertFalse(registry)
+        self.assertIsNone(registry.get(1))
+
+    def test_iterate_while_changing(self):
+        registry = ConnectionRegistry()
+        connections = [Connection(id) for id in range(5)]
+
+        for connection in connections:
+            registry.add(connection)
+
+        seen = []
+        for connection in registry:
+            seen.append(connection)
+            registry.remove(connection)
+            registry.add(Connection(connection.id + 100))
+
+        self.assertListEqual(seen, connections)
+        self.assertListEqual(sorted(connection.id for connection in registry), [100, 101, 102, 103, 104])
+
+    def test_snapshot_is_reused(self):
+        registry = ConnectionRegistry()
+        registry.add(Connection(1))
+
+        list(registry)
+        snapshot = registry._snapshot
+        list(registry)
+
+        self.assertIs(registry._snapshot, snapshot)
+
+        registry.add(Connection(2))
+
+        self.assertIsNone(registry._snapshot)
@@ -7,6 +7,7 @@ import tornado.web
 from mock import patch
 from tornado.websocket import WebSocketHandler
 
+from tornado_websockets.metrics import MetricsHandler
 from tornado_websockets.tornadowrapper import TornadoWrapper
 
 
@@ -17,7 +18,10 @@ class TestTornadoWrapper(TestCase):
 
     def tearDown(self):
         TornadoWrapper.app = None
+        TornadoWrapper.server = None
         TornadoWrapper.handlers = []
+        TornadoWrapper.sockets = None
+        TornadoWrapper.reuse_port = False
 
     '''
         Tests for TornadoWrapper.start_app()
@@ -61,6 +65,38 @@ class TestTornadoWrapper(TestCase):
         self.assertIs(stub, tornado.httpserver.HTTPServer)
         stub.assert_called_with(TornadoWrapper.app)
 
+    @patch('tornado.process.fork_processes', return_value=2)
+    @patch('tornado.netutil.bind_sockets', return_value=['socket'])
+    def test_fork_with_shared_socket(self, bind_sockets, fork_processes):
+        self.assertEqual(TornadoWrapper.fork(12345, 4), 2)
+
+        bind_sockets.assert_called_with(12345)
+        fork_processes.assert_called_with(4)
+        self.assertListEqual(TornadoWrapper.sockets, ['socket'])
+
+        with patch('tornado.httpserver.HTTPServer') as server:
+            TornadoWrapper.start_app()
+            TornadoWrapper.listen(12345)
+
+        server.return_value.add_sockets.assert_called_with(['socket'])
+        server.return_value.listen.assert_not_called()
+
+    @patch('tornado.process.fork_processes', return_value=0)
+    @patch('tornado.netutil.bind_sockets', return_value=['socket'])
+    def test_fork_with_reuse_port(self, bind_sockets, fork_processes):
+        TornadoWrapper.fork(12345, 4, reuse_port=True)
+
+        # Each worker binds its own socket
+        bind_sockets.assert_not_called()
+        fork_processes.assert_called_with(4)
+
+        with patch('tornado.httpserver.HTTPServer') as server:
+            TornadoWrapper.start_app()
+            TornadoWrapper.listen(12345)
+
+        bind_sockets.assert_called_with(12345, reuse_port=True)
+        server.return_value.add_sockets.assert_called_with(['socket'])
+
     '''
         Test for TornadoWrapper.loop()
     '''
@@ -90,6 +126,15 @@ class TestTornadoWrapper(TestCase):
         TornadoWrapper.add_handler(('my', 'tuple'))
         self.assertListEqual(TornadoWrapper.handlers, [('my', 'tuple'), ('my', 'tuple', 'in', 'a', 'list')])
 
+    def test_add_metrics_handler(self):
+        TornadoWrapper.add_metrics_handler()
+        TornadoWrapper.add_metrics_handler('/_metrics')
+
+        self.assertListEqual(TornadoWrapper.handlers, [
+            ('/_metrics', MetricsHandler, {'websockets': TornadoWrapper.websockets}),
+            ('/metrics', MetricsHandler, {'websockets': TornadoWrapper.websockets}),
+        ])
+
     def test_add_handler_with_tornado_app_instance(self):
         self.assertIsNone(TornadoWrapper.app)
         self.assertListEqual(TornadoWrapper.handlers, [])
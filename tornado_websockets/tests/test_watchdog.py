@@ -0,0 +1,149 @@
+# coding: utf-8
+
+import threading
+import time
+
+import tornado.web
+import tornado.wsgi
+from tornado import gen
+from tornado.testing import AsyncHTTPTestCase, AsyncTestCase, ExpectLog, gen_test
+
+from tornado_websockets import watchdog
+from tornado_websockets.watchdog import WatchedWSGIApplication, Watchdog, logger
+
+
+class TestWatchdog(AsyncTestCase):
+    """
+        Tests for the class « Watchdog ».
+    """
+
+    def setUp(self):
+        super(TestWatchdog, self).setUp()
+        self.watchdog = Watchdog(threshold=0.05, interval=0.01)
+
+    def tearDown(self):
+        self.watchdog.stop()
+        super(TestWatchdog, self).tearDown()
+
+    def test_init_with_invalid_params(self):
+        with self.assertRaisesRegexp(ValueError, 'Param « threshold » should be positive, got 0.'):
+            Watchdog(threshold=0)
+
+        with self.assertRaisesRegexp(ValueError, 'Param « interval » should be positive, got -1.'):
+            Watchdog(interval=-1)
+
+    def test_start_and_stop(self):
+        self.watchdog.start()
+
+        self.assertIs(watchdog.current, self.watchdog)
+        self.assertTrue(self.watchdog.thread.daemon)
+
+        self.watchdog.stop()
+
+        self.assertIsNone(watchdog.current)
+
+    @gen_test
+    def test_lag(self):
+        self.watchdog.start()
+
+        yield gen.sleep(0.02)
+
+        with ExpectLog(logger, 'IOLoop lag: a timer ran [0-9]+ ms late.'):
+            time.sleep(0.1)
+            yield gen.sleep(0.05)
+
+        self.assertGreaterEqual(self.watchdog.max_lag, 0.05)
+
+    def test_slow_callback(self):
+        self.watchdog.start()
+
+        with ExpectLog(logger, '« slow » of /path has been blocking the IOLoop for more than 50 ms, IOLoop stack:\n'
+                               '(.|\n)*in test_slow_callback\n    time.sleep'):
+            with ExpectLog(logger, '« slow » of /path blocked the IOLoop for [0-9]+ ms.'):
+                self.watchdog.begin('slow', '/path')
+                time.sleep(0.15)
+                self.watchdog.end()
+
+        self.assertEqual(self.watchdog.slow_callbacks, 1)
+
+    def test_fast_callback(self):
+        self.watchdog.start()
+
+        self.watchdog.begin('fast', '/path')
+        self.watchdog.end()
+
+        self.assertEqual(self.watchdog.slow_callbacks, 0)
+
+    def test_slow_callback_not_sampled(self):
+        # Without the watchdog thread, nothing samples the stack
+        self.watchdog.running = False
+
+        with ExpectLog(logger, '« slow » of /path blocked the IOLoop for [0-9]+ ms, no stack was sampled.'):
+            self.watchdog.begin('slow', '/path')
+            time.sleep(0.06)
+            self.watchdog.end()
+
+        self.assertEqual(self.watchdog.slow_callbacks, 1)
+
+
+class TestWatchedWSGIApplication(AsyncHTTPTestCase):
+    """
+        Tests for the class « WatchedWSGIApplication », served by a real « WSGIContainer ».
+    """
+
+    def get_app(self):
+        def application(environ, start_response):
+            if environ['PATH_INFO'] == '/slow/view':
+                time.sleep(0.1)
+
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'response']
+
+        container = tornado.wsgi.WSGIContainer(WatchedWSGIApplication(application))
+
+        return tornado.web.Application([('.*', tornado.web.FallbackHandler, dict(fallback=container))])
+
+    def tearDown(self):
+        if watchdog.current is not None:
+            watchdog.current.stop()
+
+        super(TestWatchedWSGIApplication, self).tearDown()
+
+    def start_watchdog(self):
+        # The watchdog watches the thread which starts it, the IOLoop thread of the test
+        instance = Watchdog(threshold=0.05)
+        instance.start()
+
+        return instance
+
+    def test_call_without_watchdog(self):
+        response = self.fetch('/slow/view')
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'response')
+
+    def test_fast_view(self):
+        instance = self.start_watchdog()
+        response = self.fetch('/fast/view')
+
+        self.assertEqual(response.body, b'response')
+        self.assertEqual(instance.slow_callbacks, 0)
+
+    def test_slow_view(self):
+        instance = self.start_watchdog()
+
+        with ExpectLog(logger, '« GET /slow/view\\?page=2 » of django blocked the IOLoop'):
+            response = self.fetch('/slow/view?page=2')
+
+        self.assertEqual(response.body, b'response')
+        self.assertEqual(instance.slow_callbacks, 1)
+
+    def test_call_from_another_thread(self):
+        instance = self.start_watchdog()
+        application = WatchedWSGIApplication(lambda environ, start_response: time.sleep(0.06))
+        thread = threading.Thread(target=application, args=({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/'}, None))
+
+        thread.start()
+        thread.join()
+
+        self.assertEqual(instance.slow_callbacks, 0)
@@ -3,16 +3,20 @@
 from unittest import TestCase
 
 import six
+from tornado.websocket import WebSocketClosedError
 
+from tornado_websockets.codec import JSON
 from tornado_websockets.exceptions import NotCallableError
+from tornado_websockets.frame import build_frame, encode_event
 from tornado_websockets.modules import ProgressBar
+from tornado_websockets.ratelimit import RateLimit
 from tornado_websockets.websocket import WebSocket
 from tornado_websockets.websockethandler import WebSocketHandler
 
 if six.PY2:
-    from mock import patch, Mock
+    from mock import patch, Mock, ANY
 else:
-    from unittest.mock import patch, Mock
+    from unittest.mock import patch, Mock, ANY
 
 
 class TestWebSocket(TestCase):
@@ -61,46 +65,230 @@ class TestWebSocket(TestCase):
             pass
 
         self.assertDictEqual(ws.events, {'func': func})
+        self.assertListEqual(list(ws.invokers), ['func'])
+        self.assertTrue(callable(ws.invokers['func']))
+
+        @ws.on(executor=True)
+        def blocking():
+            pass
+
+        self.assertDictEqual(ws.events, {'func': func, 'blocking': blocking})
+        self.assertTrue(callable(ws.invokers['blocking']))
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_on_with_rate_limit(self, add_handler):
+        ws = WebSocket('path', rate_limit={'rate': 100})
+
+        self.assertEqual(ws.rate_limit.rate, 100)
+        self.assertDictEqual(ws.rate_limits, {})
+
+        @ws.on(rate_limit={'rate': 1, 'burst': 5, 'action': 'drop'})
+        def message():
+            pass
+
+        self.assertIsInstance(ws.rate_limits['message'], RateLimit)
+        self.assertEqual(ws.rate_limits['message'].burst, 5)
+
+        # A new callback replaces the previous one, and its rate limit
+        ws.on(message)
+
+        self.assertDictEqual(ws.rate_limits, {})
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_on_lifecycle_hooks(self, add_handler):
+        ws = WebSocket('path')
+
+        self.assertDictEqual(ws.hooks, {'connect': [], 'open': [], 'close': []})
+
+        @ws.on
+        def open():
+            pass
+
+        @ws.on
+        def reopen():
+            pass
+
+        @ws.on(hook='close')
+        def module_foo_close():
+            pass
+
+        @ws.on
+        def disconnect():
+            pass
+
+        # Only the exact names are hooks, these are events of the application
+        @ws.on
+        def db_connect():
+            pass
+
+        @ws.on
+        def window_close():
+            pass
+
+        self.assertListEqual([name for name, invoker in ws.hooks['open']], ['open'])
+        self.assertListEqual([name for name, invoker in ws.hooks['close']], ['module_foo_close'])
+        self.assertListEqual(ws.hooks['connect'], [])
+        self.assertIn('window_close', ws.events)
+
+        with self.assertRaisesRegexp(ValueError, "Param « hook » should be one of connect, open, close, got 'stop'."):
+            ws.on(disconnect, hook='stop')
+
+        # A new callback replaces the previous one
+        previous_invoker = ws.hooks['open'][0][1]
+
+        def new_open():
+            pass
+
+        new_open.__name__ = 'open'
+        ws.on(new_open)
+
+        self.assertEqual(len(ws.hooks['open']), 1)
+        self.assertIsNot(ws.hooks['open'][0][1], previous_invoker)
+
+        # A callback registered again without its hook is not a hook anymore
+        ws.on(module_foo_close)
+        self.assertListEqual(ws.hooks['close'], [])
 
     @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
     def test_emit(self, add_handler):
         ws = WebSocket('path')
-        handler = Mock()
+        handler = Mock(codec=JSON)
 
         # Emulate WebSocketHandler class with Mock, because only Tornado can instantiate it properly
         def side_effect(websocket):
-            ws.handlers.append(handler)
+            ws.handlers.add(handler)
             handler.websocket = websocket
 
         handler.return_value = None
         handler.websocket = None
         handler.initialize.side_effect = side_effect
-        handler.emit = Mock()
+        handler.write_frame = Mock()
 
-        self.assertListEqual(ws.handlers, [])
+        self.assertListEqual(list(ws.handlers), [])
         self.assertIsNone(handler.websocket)
 
         handler.initialize(ws)
 
-        self.assertListEqual(ws.handlers, [handler])
+        self.assertListEqual(list(ws.handlers), [handler])
         self.assertEqual(handler.websocket, ws)
 
         with self.assertRaisesRegexp(TypeError, 'Param « event » should be a string.'):
             ws.emit(123)
-        handler.emit.assert_not_called()
+        handler.write_frame.assert_not_called()
 
         ws.emit('event')
-        handler.emit.assert_called_with('event', {})
-        handler.emit.reset_mock()
+        payload = encode_event('event', {})
+        handler.write_frame.assert_called_with(build_frame(payload), payload, ('event', None))
+        handler.write_frame.reset_mock()
 
         ws.emit('event', {})
-        handler.emit.assert_called_with('event', {})
-        handler.emit.reset_mock()
+        handler.write_frame.assert_called_with(build_frame(payload), payload, ('event', None))
+        handler.write_frame.reset_mock()
 
         ws.emit('event', 'my message')
-        handler.emit.assert_called_with('event', {'message': 'my message'})
-        handler.emit.reset_mock()
+        payload = encode_event('event', {'message': 'my message'})
+        handler.write_frame.assert_called_with(build_frame(payload), payload, ('event', None))
+        handler.write_frame.reset_mock()
 
         with self.assertRaisesRegexp(TypeError, 'Param « data » should be a string or a dictionary.'):
             ws.emit('event', 123)
-        handler.emit.assert_not_called()
+        handler.write_frame.assert_not_called()
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_emit_encodes_once(self, add_handler):
+        ws = WebSocket('path')
+        for handler in (Mock(codec=JSON), Mock(codec=JSON), Mock(codec=JSON)):
+            ws.handlers.add(handler)
+
+        with patch('tornado_websockets.websocket.encode_event', wraps=encode_event) as encode:
+            ws.emit('event', {'foo': 'bar'})
+
+        encode.assert_called_once_with('event', {'foo': 'bar'})
+
+        frames = set(handler.write_frame.call_args[0][0] for handler in ws.handlers)
+        self.assertEqual(len(frames), 1)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_publish(self, add_handler):
+        ws = WebSocket('path')
+        member, not_member = Mock(rooms=set(), codec=JSON), Mock(rooms=set(), codec=JSON)
+        ws.handlers.add(member)
+        ws.handlers.add(not_member)
+        ws.join('room', member)
+
+        payload = encode_event('event', {'foo': 'bar'})
+        ws.publish(payload, 'room', 'event')
+
+        member.write_frame.assert_called_once_with(build_frame(payload), payload, ('event', 'room'))
+        not_member.write_frame.assert_not_called()
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_publish_locally(self, add_handler):
+        ws = WebSocket('path')
+        handler = Mock(rooms=set(), codec=JSON)
+        ws.handlers.add(handler)
+
+        payload = encode_event('event', {'version': 1})
+
+        # Not sent to other processes
+        with patch('tornado_websockets.tornadowrapper.TornadoWrapper.broadcast') as broadcast:
+            ws.publish(payload, None, 'event', local=True)
+
+        broadcast.publish.assert_not_called()
+        handler.write_frame.assert_called_once_with(build_frame(payload), payload, ('event', None))
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_emit_skips_closed_handlers(self, add_handler):
+        ws = WebSocket('path')
+        closed, opened = Mock(codec=JSON), Mock(codec=JSON)
+        closed.write_frame.side_effect = WebSocketClosedError()
+        ws.handlers.add(closed)
+        ws.handlers.add(opened)
+
+        ws.emit('event')
+
+        closed.write_frame.assert_called_with(ANY, ANY, ANY)
+        opened.write_frame.assert_called_with(ANY, ANY, ANY)
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_join_and_leave(self, add_handler):
+        ws = WebSocket('path')
+        handler1, handler2 = Mock(rooms=set(), codec=JSON), Mock(rooms=set(), codec=JSON)
+
+        self.assertDictEqual(ws.rooms, {})
+
+        ws.join('room', handler1)
+        ws.join('room', handler2)
+        ws.join('other_room', handler1)
+
+        self.assertSetEqual(set(ws.rooms), {'room', 'other_room'})
+        self.assertSetEqual(set(ws.rooms['room']), {handler1, handler2})
+        self.assertSetEqual(handler1.rooms, {'room', 'other_room'})
+
+        ws.leave('room', handler1)
+        ws.leave('other_room', handler1)
+        ws.leave('unknown_room', handler1)
+
+        self.assertListEqual(list(ws.rooms), ['room'])
+        self.assertListEqual(list(ws.rooms['room']), [handler2])
+        self.assertSetEqual(handler1.rooms, set())
+
+    @patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler')
+    def test_emit_to_room(self, add_handler):
+        ws = WebSocket('path')
+        member, not_member = Mock(rooms=set(), codec=JSON), Mock(rooms=set(), codec=JSON)
+
+        ws.handlers.add(member)
+        ws.handlers.add(not_member)
+        ws.join('room', member)
+
+        ws.emit('event', {'foo': 'bar'}, room='room')
+
+        payload = encode_event('event', {'foo': 'bar'})
+        member.write_frame.assert_called_once_with(build_frame(payload), payload, ('event', 'room'))
+        not_member.write_frame.assert_not_called()
+
+        # Nobody is in this room
+        ws.emit('event', room='empty_room')
+
+        member.write_frame.assert_called_once_with(ANY, ANY, ANY)
@@ -1,15 +1,29 @@
+import threading
+import time
 import unittest
 
 import tornado.httpclient
 import tornado.web
 from mock import patch, ANY
+from tornado import gen
 from tornado.concurrent import Future
 from tornado.escape import json_decode, json_encode
-from tornado.testing import gen_test
-
+from tornado.testing import ExpectLog, gen_test
+
+from tornado_websockets.batching import Batcher
+from tornado_websockets.codec import get_codec, msgpack
+from tornado_websockets import heartbeat
+from tornado_websockets.admission import Admission
+from tornado_websockets.compression import Compression
+from tornado_websockets.heartbeat import Heartbeat, TimerWheel
+from tornado_websockets.metrics import WebSocketMetrics
+from tornado_websockets.ratelimit import RateLimit
+from tornado_websockets.watchdog import Watchdog
+from tornado_websockets.watchdog import logger as watchdog_logger
 from tornado_websockets.tests.app import ws as appTest
 from tornado_websockets.tests.helpers import WebSocketBaseTestCase, WebSocketHandlerForTests
-from tornado_websockets.websockethandler import WebSocketHandler
+from tornado_websockets.tornadowrapper import TornadoWrapper
+from tornado_websockets.websockethandler import WebSocketHandler, app_log
 
 
 class WebSocketHandlerTest(WebSocketBaseTestCase):
@@ -38,13 +52,17 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
 
     @gen_test
     def test_initialize(self):
-        self.assertListEqual(self.ws.handlers, [])
+        self.assertEqual(self.ws.handlers.count(), 0)
 
         ws_connection = yield self.ws_connect('/ws/test')
 
-        self.assertIsInstance(self.ws.handlers[0], WebSocketHandlerForTests)
-        self.assertIsInstance(self.ws.handlers[0], WebSocketHandler)
-        self.assertEqual(self.ws.handlers[0].websocket, self.ws)
+        self.assertIsInstance(list(self.ws.handlers)[0], WebSocketHandlerForTests)
+        self.assertIsInstance(list(self.ws.handlers)[0], WebSocketHandler)
+        self.assertEqual(list(self.ws.handlers)[0].websocket, self.ws)
+
+        handler = list(self.ws.handlers)[0]
+        self.assertIsInstance(handler.id, int)
+        self.assertIs(self.ws.handlers.get(handler.id), handler)
 
         self.close(ws_connection)
 
@@ -87,6 +105,33 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
 
         self.close(ws_connection)
 
+    @gen_test
+    def test_connect_hook_rejects_client(self):
+        @self.ws.on
+        def connect(socket):
+            raise tornado.web.HTTPError(403)
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 403: Forbidden'):
+            yield self.ws_connect('/ws/test')
+
+        self.assertEqual(self.ws.handlers.count(), 0)
+
+    @gen_test
+    def test_close_hook(self):
+        closed = []
+
+        @self.ws.on
+        def close(socket):
+            closed.append(socket)
+
+        ws_connection = yield self.ws_connect('/ws/test')
+        handler = list(self.ws.handlers)[0]
+
+        self.close(ws_connection)
+        yield self.close_future
+
+        self.assertListEqual(closed, [handler])
+
     @gen_test
     def test_on_message(self):
         ws_connection = yield self.ws_connect('/ws/test')
@@ -154,7 +199,7 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
         self.assertDictEqual(response, {
             'event': 'hello',
             'data': {
-                'socket': str(self.ws.handlers[0]),
+                'socket': str(list(self.ws.handlers)[0]),
                 'message': 'Hello from hello callback!',
                 'data_sent': {
                     'foo': 'FOO',
@@ -229,6 +274,84 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
 
         self.close(ws_connection)
 
+    @gen_test
+    def test_on_message_with_coroutine(self):
+        ws = self.ws
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        @ws.on
+        @gen.coroutine
+        def slow(socket, data):
+            yield gen.moment
+            socket.emit('slow', data)
+
+        ws_connection.write_message(json_encode({'event': 'slow', 'data': {'foo': 'bar'}}))
+
+        response = yield ws_connection.read_message()
+
+        self.assertDictEqual(json_decode(response), {
+            'event': 'slow',
+            'data': {'foo': 'bar'}
+        })
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_on_message_with_failing_coroutine(self):
+        ws = self.ws
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        @ws.on
+        @gen.coroutine
+        def failing():
+            yield gen.moment
+            raise ValueError('Oops')
+
+        with ExpectLog(app_log, 'Uncaught exception in callback « failing » of /test'):
+            ws_connection.write_message(json_encode({'event': 'failing'}))
+            response = yield ws_connection.read_message()
+
+        self.assertDictEqual(json_decode(response), {
+            'event': 'warning',
+            'data': {'message': 'An error occurred while handling « failing » event.'}
+        })
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_on_message_with_executor(self):
+        ws = self.ws
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        @ws.on(executor=True)
+        def blocking(socket, data):
+            socket.emit('from_socket', {'main_thread': threading.current_thread() is main_thread})
+            ws.emit('from_websocket')
+
+        main_thread = threading.current_thread()
+        ws_connection.write_message(json_encode({'event': 'blocking'}))
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {'event': 'from_socket', 'data': {'main_thread': False}})
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {'event': 'from_websocket', 'data': {}})
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_connect_coroutine_rejects_client(self):
+        @self.ws.on
+        @gen.coroutine
+        def connect(socket):
+            yield gen.moment
+            raise tornado.web.HTTPError(403)
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 403: Forbidden'):
+            yield self.ws_connect('/ws/test')
+
+        self.assertEqual(self.ws.handlers.count(), 0)
+
     @unittest.expectedFailure
     @gen_test(timeout=1)
     def test_on_message_when_nonexistent_event(self):
@@ -253,8 +376,27 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
         ws_connection = yield self.ws_connect('/ws/test')
 
         self.assertEqual(self.ws.events, {'hello': ANY})
-        self.assertNotEqual(self.ws.handlers, [])
-        self.ws.handlers[0].emit('my_event', {'my': 'data'})
+        self.assertEqual(self.ws.handlers.count(), 1)
+        list(self.ws.handlers)[0].emit('my_event', {'my': 'data'})
+
+        response = yield ws_connection.read_message()
+        response = json_decode(response)
+
+        self.assertDictEqual(response, {
+            'event': 'my_event',
+            'data': {
+                'my': 'data'
+            }
+        })
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_broadcast(self):
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        self.assertEqual(self.ws.handlers.count(), 1)
+        self.ws.emit('my_event', {'my': 'data'})
 
         response = yield ws_connection.read_message()
         response = json_decode(response)
@@ -268,13 +410,415 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
 
         self.close(ws_connection)
 
+    @gen_test
+    def test_rooms(self):
+        ws_connection = yield self.ws_connect('/ws/test')
+        handler = list(self.ws.handlers)[0]
+
+        handler.join('room')
+        self.assertSetEqual(handler.rooms, {'room'})
+        self.assertListEqual(list(self.ws.rooms['room']), [handler])
+
+        handler.emit_room('room', 'my_event', {'my': 'data'})
+
+        response = yield ws_connection.read_message()
+        response = json_decode(response)
+
+        self.assertDictEqual(response, {
+            'event': 'my_event',
+            'data': {
+                'my': 'data'
+            }
+        })
+
+        # Rooms are left when the connection is closed
+        self.close(ws_connection)
+        yield self.close_future
+
+        self.assertDictEqual(self.ws.rooms, {})
+        self.assertSetEqual(handler.rooms, set())
+
+    @gen_test
+    def test_batch(self):
+        ws_connection = yield self.ws_connect('/ws/test')
+        handler = list(self.ws.handlers)[0]
+        self.ws.batcher = Batcher()
+
+        self.ws.emit('first', {'foo': 'bar'})
+        handler.emit('second', {})
+
+        response = yield ws_connection.read_message()
+
+        self.assertListEqual(json_decode(response), [
+            {'event': 'first', 'data': {'foo': 'bar'}},
+            {'event': 'second', 'data': {}},
+        ])
+        self.assertEqual(self.ws.batcher.frames, 1)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_metrics(self):
+        ws_connection = yield self.ws_connect('/ws/test')
+        metrics = self.ws.metrics = WebSocketMetrics(sampling=2)
+
+        ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+        yield ws_connection.read_message()
+
+        ws_connection.write_message('not json')
+        yield ws_connection.read_message()
+
+        ws_connection.write_message(json_encode({'event': 'unknown'}))
+        ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+        yield ws_connection.read_message()
+
+        self.assertEqual(metrics.received_messages, 4)
+        self.assertEqual(metrics.decode_errors, 1)
+        self.assertEqual(metrics.unknown_events, 1)
+        self.assertEqual(metrics.warnings, 1)
+        self.assertEqual(metrics.sent_messages['warning'], 1)
+        self.assertEqual(metrics.sent_messages['hello'], 2)
+        self.assertEqual(metrics.calls['hello'], 2)
+        self.assertEqual(metrics.durations['hello'].count, 1)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_watchdog(self):
+        ws_connection = yield self.ws_connect('/ws/test')
+        watchdog = Watchdog(threshold=0.05)
+
+        @self.ws.on
+        def blocking(socket, data):
+            time.sleep(0.1)
+            socket.emit('blocking', {})
+
+        watchdog.start()
+
+        try:
+            with ExpectLog(watchdog_logger, '« blocking » of /test has been blocking the IOLoop'):
+                ws_connection.write_message(json_encode({'event': 'blocking'}))
+                yield ws_connection.read_message()
+        finally:
+            watchdog.stop()
+
+        self.assertEqual(watchdog.slow_callbacks, 1)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_heartbeat(self):
+        heartbeat._wheels[self.io_loop] = TimerWheel(self.io_loop, resolution=0.01)
+        self.ws.heartbeat = Heartbeat(interval=0.02, timeout=0.1)
+        ws_connection = yield self.ws_connect('/ws/test')
+        handler = list(self.ws.handlers)[0]
+
+        # The client answers pings, so it is never closed
+        yield gen.sleep(0.15)
+
+        self.assertGreaterEqual(self.ws.heartbeat.pings, 2)
+        self.assertEqual(self.ws.heartbeat.reaped, 0)
+
+        self.close(ws_connection)
+        yield self.close_future
+
+        self.assertIsNone(handler.heartbeat_timer)
+        self.assertEqual(len(heartbeat.current_wheel()), 0)
+
+    @gen_test
+    def test_heartbeat_idle_timeout(self):
+        heartbeat._wheels[self.io_loop] = TimerWheel(self.io_loop, resolution=0.01)
+        self.ws.heartbeat = Heartbeat(interval=None, timeout=0.05)
+        yield self.ws_connect('/ws/test')
+
+        close_code, close_reason = yield self.close_future
+
+        self.assertEqual(close_code, 1001)
+        self.assertEqual(self.ws.heartbeat.reaped, 1)
+        self.assertEqual(self.ws.handlers.count(), 0)
+
+    @gen_test
+    def test_admission(self):
+        self.ws.admission = Admission(max_connections=1)
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 503'):
+            yield self.ws_connect('/ws/test')
+
+        self.assertEqual(self.ws.admission.rejected, 1)
+        self.assertEqual(self.ws.admission.connections, 1)
+
+        self.close(ws_connection)
+        yield self.close_future
+
+        self.assertEqual(self.ws.admission.connections, 0)
+        self.assertDictEqual(self.ws.admission.per_ip, {})
+
+        ws_connection = yield self.ws_connect('/ws/test')
+        ws_connection.close()
+
+    @gen_test
+    def test_admission_per_ip(self):
+        self.ws.admission = Admission(max_per_ip=1)
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 429'):
+            yield self.ws_connect('/ws/test')
+
+        self.assertDictEqual(self.ws.admission.per_ip, {'127.0.0.1': 1})
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_admission_of_process(self):
+        admission = Admission(max_connections=1)
+
+        with patch.object(TornadoWrapper, 'admission', admission):
+            self.ws.admission = Admission()
+            ws_connection = yield self.ws_connect('/ws/test')
+
+            with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 503'):
+                yield self.ws_connect('/ws/test')
+
+            # Rejected by the process, so not counted by the WebSocket
+            self.assertEqual(self.ws.admission.connections, 1)
+
+            self.close(ws_connection)
+            yield self.close_future
+
+        self.assertEqual(admission.connections, 0)
+
+    @gen_test
+    def test_admission_with_rejected_handshake(self):
+        self.ws.admission = Admission(max_connections=1)
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 400'):
+            yield self.ws_connect('/ws/test?codec=unknown')
+
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 400'):
+            yield self.ws_connect('/ws/test?codec=unknown')
+
+        self.assertEqual(self.ws.admission.connections, 0)
+        self.assertEqual(self.ws.admission.rejected, 0)
+
+    @gen_test
+    def test_rate_limit(self):
+        self.ws.rate_limit = RateLimit(rate=0.01, burst=2)
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        for _ in range(3):
+            ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+
+        for _ in range(2):
+            response = yield ws_connection.read_message()
+            self.assertEqual(json_decode(response)['event'], 'hello')
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {
+            'event': 'warning',
+            'data': {'message': 'Too many messages, this message was ignored.'}
+        })
+
+        # Rejected before decoding
+        ws_connection.write_message('not json')
+        response = yield ws_connection.read_message()
+        self.assertEqual(json_decode(response)['data']['message'], 'Too many messages, this message was ignored.')
+        self.assertEqual(self.ws.metrics.decode_errors, 0)
+        self.assertEqual(self.ws.metrics.rate_limited, 2)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_rate_limit_of_event(self):
+        self.ws.rate_limits['hello'] = RateLimit(rate=0.01, action='drop')
+        # Every call is counted
+        self.ws.metrics = WebSocketMetrics(sampling=1)
+
+        @self.ws.on
+        def ping(socket, data):
+            socket.emit('pong', {})
+
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        for _ in range(3):
+            ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+
+        ws_connection.write_message(json_encode({'event': 'ping'}))
+
+        response = yield ws_connection.read_message()
+        self.assertEqual(json_decode(response)['event'], 'hello')
+
+        # Other « hello » events were dropped, other events are not limited
+        response = yield ws_connection.read_message()
+        self.assertEqual(json_decode(response)['event'], 'pong')
+        self.assertEqual(self.ws.metrics.calls['hello'], 1)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_rate_limit_with_close_action(self):
+        self.ws.rate_limit = RateLimit(rate=0.01, action='close')
+        ws_connection = yield self.ws_connect('/ws/test')
+
+        ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+        ws_connection.write_message(json_encode({'event': 'hello', 'data': {}}))
+
+        response = yield ws_connection.read_message()
+        self.assertEqual(json_decode(response)['event'], 'hello')
+
+        response = yield ws_connection.read_message()
+        self.assertIsNone(response)
+        self.assertEqual(ws_connection.close_code, 1008)
+
+        yield self.close_future
+
+    @gen_test
+    def test_compression(self):
+        self.ws.compression = Compression(min_size=64, window_bits=10)
+        ws_connection = yield self.ws_connect('/ws/test', compression_options={})
+
+        self.assertEqual(
+            ws_connection.headers['Sec-WebSocket-Extensions'],
+            'permessage-deflate; server_max_window_bits=10'
+        )
+
+        self.ws.emit('small', {})
+        self.ws.emit('large', {'message': 'a' * 1000})
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {'event': 'small', 'data': {}})
+
+        response = yield ws_connection.read_message()
+        self.assertDictEqual(json_decode(response), {'event': 'large', 'data': {'message': 'a' * 1000}})
+
+        # Only the large message was compressed, by the connection itself
+        self.assertEqual(self.ws.compression.uncompressed, 1)
+        self.assertEqual(self.ws.compression.compressions, 0)
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_compression_without_context_takeover(self):
+        self.ws.compression = Compression(min_size=64, context_takeover=False)
+        connections = []
+
+        for _ in range(3):
+            connections.append((yield self.ws_connect('/ws/test', compression_options={})))
+
+        uncompressed_connection = yield self.ws_connect('/ws/test')
+
+        self.assertIn('server_no_context_takeover', connections[0].headers['Sec-WebSocket-Extensions'])
+        self.assertNotIn('Sec-WebSocket-Extensions', uncompressed_connection.headers)
+
+        for i in range(2):
+            self.ws.emit('large', {'message': 'a' * 1000, 'i': i})
+
+        for ws_connection in connections + [uncompressed_connection]:
+            for i in range(2):
+                response = yield ws_connection.read_message()
+                self.assertDictEqual(json_decode(response), {
+                    'event': 'large',
+                    'data': {'message': 'a' * 1000, 'i': i}
+                })
+
+        # Each message was compressed once, for every client
+        self.assertEqual(self.ws.compression.compressions, 2)
+        self.assertEqual(self.ws.compression.shared, 4)
+
+        for ws_connection in connections:
+            ws_connection.close()
+
+        self.close(uncompressed_connection)
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    @gen_test
+    def test_compression_with_several_codecs(self):
+        self.ws.compression = Compression(min_size=64, context_takeover=False)
+        connections = []
+
+        # Clients of both codecs alternate in the order of connections
+        for path in ('/ws/test', '/ws/test?codec=msgpack') * 4:
+            connections.append((yield self.ws_connect(path, compression_options={})))
+
+        self.ws.emit('large', {'message': 'a' * 1000})
+
+        for ws_connection in connections:
+            response = yield ws_connection.read_message()
+            self.assertIsNotNone(response)
+
+        # Compressed once per codec
+        self.assertEqual(self.ws.compression.compressions, 2)
+        self.assertEqual(self.ws.compression.shared, 6)
+
+        for ws_connection in connections[1:]:
+            ws_connection.close()
+
+        self.close(connections[0])
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    @gen_test
+    def test_codec_with_query_argument(self):
+        ws_connection = yield self.ws_connect('/ws/test?codec=msgpack')
+        handler = list(self.ws.handlers)[0]
+
+        self.assertIs(handler.codec, get_codec('msgpack'))
+
+        ws_connection.write_message(msgpack.packb({'event': 'hello', 'data': {'foo': 1}}), binary=True)
+        response = yield ws_connection.read_message()
+
+        self.assertIsInstance(response, bytes)
+        self.assertEqual(msgpack.unpackb(response, raw=False)['data']['data_sent'], {'foo': 1})
+
+        ws_connection.write_message(b'\xc1', binary=True)
+        response = yield ws_connection.read_message()
+
+        self.assertDictEqual(msgpack.unpackb(response, raw=False), {
+            'event': 'warning',
+            'data': {'message': 'Invalid MessagePack was sent.'}
+        })
+
+        self.close(ws_connection)
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    @gen_test
+    def test_codec_with_subprotocol(self):
+        ws_connection = yield self.ws_connect('/ws/test', subprotocols=['chat', 'dtws.unknown', 'dtws.msgpack'])
+        handler = list(self.ws.handlers)[0]
+
+        self.assertEqual(ws_connection.selected_subprotocol, 'dtws.msgpack')
+        self.assertIs(handler.codec, get_codec('msgpack'))
+
+        self.close(ws_connection)
+
+    @gen_test
+    def test_unknown_codec(self):
+        with self.assertRaisesRegexp(tornado.httpclient.HTTPError, 'HTTP 400'):
+            yield self.ws_connect('/ws/test?codec=unknown')
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    @gen_test
+    def test_broadcast_to_several_codecs(self):
+        json_connection = yield self.ws_connect('/ws/test')
+        msgpack_connection = yield self.ws_connect('/ws/test?codec=msgpack')
+
+        self.ws.emit('my_event', {'my': 'data'})
+
+        response = yield json_connection.read_message()
+        self.assertDictEqual(json_decode(response), {'event': 'my_event', 'data': {'my': 'data'}})
+
+        response = yield msgpack_connection.read_message()
+        self.assertDictEqual(msgpack.unpackb(response, raw=False), {'event': 'my_event', 'data': {'my': 'data'}})
+
+        json_connection.close()
+        self.close(msgpack_connection)
+
     @gen_test
     def test_emit_warning(self):
         ws_connection = yield self.ws_connect('/ws/test')
 
         self.assertEqual(self.ws.events, {'hello': ANY})
-        self.assertNotEqual(self.ws.handlers, [])
-        self.ws.handlers[0].emit_warning('WARNING!')
+        self.assertEqual(self.ws.handlers.count(), 1)
+        list(self.ws.handlers)[0].emit_warning('WARNING!')
 
         response = yield ws_connection.read_message()
         response = json_decode(response)
@@ -290,12 +834,12 @@ class WebSocketHandlerTest(WebSocketBaseTestCase):
 
     @gen_test
     def test_on_close(self):
-        self.assertEqual(self.ws.handlers, [])
+        self.assertEqual(self.ws.handlers.count(), 0)
 
         ws_connection = yield self.ws_connect('/ws/test')
-        self.assertNotEqual(self.ws.handlers, [])
+        self.assertEqual(self.ws.handlers.count(), 1)
 
         self.close(ws_connection)
         yield self.close_future
 
-        self.assertEqual(self.ws.handlers, [])
+        self.assertEqual(self.ws.handlers.count(), 0)
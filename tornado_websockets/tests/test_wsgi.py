@@ -0,0 +1,153 @@
+# coding: utf-8
+
+import threading
+from unittest import TestCase
+
+import tornado.gen
+import tornado.web
+from django.test import override_settings
+from mock import Mock, patch
+from tornado.testing import AsyncHTTPTestCase, ExpectLog, gen_test
+
+from tornado_websockets.frame import encode_event
+from tornado_websockets.websocket import WebSocket
+from tornado_websockets.wsgi import DEFAULT_QUEUE, DjangoWSGIContainer, ThreadPoolWSGIContainer, app_log
+
+
+def hello_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('X-Thread', threading.current_thread().name)])
+    return [b'Hello ', environ['PATH_INFO'].encode('utf-8')]
+
+
+def failing_app(environ, start_response):
+    raise ValueError('Oops')
+
+
+class TestThreadPoolWSGIContainer(AsyncHTTPTestCase):
+    """
+        Tests for ThreadPoolWSGIContainer class.
+    """
+
+    def get_app(self):
+        self.released = threading.Event()
+        self.started = threading.Semaphore(0)
+
+        def blocking_app(environ, start_response):
+            self.started.release()
+            self.released.wait(5)
+            return hello_app(environ, start_response)
+
+        with patch('tornado_websockets.tornadowrapper.TornadoWrapper.add_handler'):
+            self.ws = WebSocket('/wsgi')
+
+        def emitting_app(environ, start_response):
+            self.ws.emit('from_view', {'my': 'data'})
+            return hello_app(environ, start_response)
+
+        self.containers = {
+            'hello': ThreadPoolWSGIContainer(hello_app, threads=2, queue=0),
+            'blocking': ThreadPoolWSGIContainer(blocking_app, threads=1, queue=1),
+            'failing': ThreadPoolWSGIContainer(failing_app, threads=1, queue=0),
+            'emitting': ThreadPoolWSGIContainer(emitting_app, threads=1, queue=0),
+        }
+
+        return tornado.web.Application([
+            (r'/%s/.*' % name, tornado.web.FallbackHandler, dict(fallback=container))
+            for name, container in self.containers.items()
+        ])
+
+    def tearDown(self):
+        self.released.set()
+        super(TestThreadPoolWSGIContainer, self).tearDown()
+
+    def test_response(self):
+        response = self.fetch('/hello/world')
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'Hello /hello/world')
+        self.assertEqual(response.headers['Content-Type'], 'text/plain')
+        self.assertEqual(response.headers['Content-Length'], '18')
+        self.assertNotEqual(response.headers['X-Thread'], threading.current_thread().name)
+        self.assertEqual(self.containers['hello'].pending, 0)
+
+    def test_emit_from_view(self):
+        published = []
+        broadcast = Mock(local=False)
+        broadcast.publish.side_effect = lambda *args: published.append(threading.current_thread().name)
+
+        with patch('tornado_websockets.tornadowrapper.TornadoWrapper.broadcast', broadcast):
+            response = self.fetch('/emitting/')
+
+            # The view runs in the pool, its message is published from the IOLoop
+            while not published:
+                self.io_loop.run_sync(tornado.gen.moment)
+
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers['X-Thread'], threading.current_thread().name)
+        self.assertListEqual(published, [threading.current_thread().name])
+        payload = encode_event('from_view', {'my': 'data'})
+        broadcast.publish.assert_called_once_with(self.ws, None, payload, 'from_view')
+
+    def test_exception(self):
+        with ExpectLog(app_log, 'Uncaught exception in WSGI application'):
+            response = self.fetch('/failing/')
+
+        self.assertEqual(response.code, 500)
+        self.assertEqual(self.containers['failing'].pending, 0)
+
+    @gen_test
+    def test_saturated(self):
+        container = self.containers['blocking']
+        url = self.get_url('/blocking/')
+
+        # One request runs, one waits for the thread
+        first = self.http_client.fetch(url)
+        second = self.http_client.fetch(url)
+
+        while container.pending < 2:
+            yield tornado.gen.sleep(.01)
+
+        self.assertTrue(container.saturated)
+
+        response = yield self.http_client.fetch(url, raise_error=False)
+
+        self.assertEqual(response.code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+        self.released.set()
+        responses = yield [first, second]
+
+        self.assertListEqual([response.code for response in responses], [200, 200])
+        self.assertEqual(container.pending, 0)
+        self.assertFalse(container.saturated)
+
+    def test_invalid_pool(self):
+        with self.assertRaises(ValueError):
+            ThreadPoolWSGIContainer(hello_app, threads=0).start()
+
+        with self.assertRaises(ValueError):
+            ThreadPoolWSGIContainer(hello_app, queue=-1).start()
+
+
+class TestDjangoWSGIContainer(TestCase):
+    """
+        Tests for DjangoWSGIContainer class.
+    """
+
+    def test_start_with_settings(self):
+        container = DjangoWSGIContainer()
+
+        with override_settings(TORNADO={'wsgi_threads': 3, 'wsgi_queue': 4}):
+            container.start()
+
+        self.assertEqual(container.threads, 3)
+        self.assertEqual(container.queue, 4)
+
+    def test_start_without_settings(self):
+        container = DjangoWSGIContainer(threads=2)
+
+        with override_settings(TORNADO={}):
+            container.start()
+
+        self.assertEqual(container.threads, 2)
+        self.assertEqual(container.queue, DEFAULT_QUEUE)
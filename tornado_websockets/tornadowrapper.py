@@ -2,9 +2,14 @@
 import tornado
 import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
 import tornado.web
 import tornado.websocket
 
+from .broadcast import LocalBackend
+from .metrics import MetricsHandler
+
 
 class TornadoWrapper(object):
     """
@@ -12,11 +17,19 @@ class TornadoWrapper(object):
 
         It let you access to Tornado app, handlers and settings everywhere in your code (it's really
         useful when you run ``runtornado`` management command and WebSockets management).
+
+        ``admission`` limits the connections of this process to all WebSockets, ``None`` for no limit, see
+        :class:`~tornado_websockets.admission.Admission`.
     """
 
     app = None
     server = None
     handlers = []
+    sockets = None
+    reuse_port = False
+    websockets = {}
+    broadcast = LocalBackend()
+    admission = None
 
     @classmethod
     def start_app(cls, handlers=None, settings=None):
@@ -42,11 +55,44 @@ class TornadoWrapper(object):
 
         cls.app = tornado.web.Application(handlers, **settings)
 
+    @classmethod
+    def fork(cls, tornado_port, workers, reuse_port=False):
+        """
+            Fork ``workers`` processes which will all serve ``tornado_port``, should be called before
+            :meth:`~tornado_websockets.tornadowrapper.TornadoWrapper.start_app` so each worker builds its own
+            application and runs its own IOLoop.
+
+            By default, the listening socket is bound before forking and shared by all workers. With ``reuse_port``,
+            each worker binds its own socket with ``SO_REUSEPORT`` and the kernel balances connections between them.
+
+            The calling process becomes a supervisor: it never returns, and restarts workers which crash. This method
+            only returns in workers.
+
+            :param tornado_port: Port to listen
+            :param workers: Number of workers, ``0`` for one worker per CPU
+            :param reuse_port: Bind one socket per worker with ``SO_REUSEPORT``
+            :type tornado_port: int
+            :type workers: int
+            :type reuse_port: bool
+            :return: id of this worker, between ``0`` and ``workers - 1``
+            :rtype: int
+        """
+
+        cls.reuse_port = reuse_port
+
+        if not reuse_port:
+            cls.sockets = tornado.netutil.bind_sockets(tornado_port)
+
+        return tornado.process.fork_processes(workers)
+
     @classmethod
     def listen(cls, tornado_port):
         """
             Start the Tornado HTTP server on given port.
 
+            If :meth:`~tornado_websockets.tornadowrapper.TornadoWrapper.fork` was called, the server uses the socket
+            shared between workers or binds its own socket with ``SO_REUSEPORT``.
+
             :param tornado_port: Port to listen
             :type tornado_port: int
             :return: None
@@ -58,17 +104,53 @@ class TornadoWrapper(object):
             raise TypeError('Tornado application was not instantiated, call TornadoWrapper.start_app method.')
 
         cls.server = tornado.httpserver.HTTPServer(cls.app)
-        cls.server.listen(tornado_port)
+
+        if cls.sockets:
+            cls.server.add_sockets(cls.sockets)
+        elif cls.reuse_port:
+            cls.server.add_sockets(tornado.netutil.bind_sockets(tornado_port, reuse_port=True))
+        else:
+            cls.server.listen(tornado_port)
 
     @classmethod
     def loop(cls):
         """
-            Run Tornado main loop and display configuration about Tornado handlers and settings.
+            Start the broadcast backend, then run Tornado main loop.
 
             :return: None
         """
+
+        cls.broadcast.start(cls.websockets)
         tornado.ioloop.IOLoop.instance().start()
 
+    @classmethod
+    def set_broadcast(cls, backend):
+        """
+            Replace the broadcast backend used by :meth:`WebSocket.emit()
+            <tornado_websockets.websocket.WebSocket.emit>`, it will be started by
+            :meth:`~tornado_websockets.tornadowrapper.TornadoWrapper.loop`.
+
+            :param backend: new backend
+            :type backend: tornado_websockets.broadcast.BroadcastBackend
+        """
+
+        cls.broadcast.stop()
+        cls.broadcast = backend
+
+    @classmethod
+    def add_metrics_handler(cls, path='/metrics'):
+        """
+            Serve the metrics of every WebSocket in Prometheus text format on ``path``, see
+            :class:`~tornado_websockets.metrics.MetricsHandler`.
+
+            Each process has its own metrics, so with several workers a scrape only reaches one of them.
+
+            :param path: path of the metrics handler
+            :type path: str
+        """
+
+        cls.add_handler((path, MetricsHandler, {'websockets': cls.websockets}))
+
     @classmethod
     def add_handler(cls, handler):
         """
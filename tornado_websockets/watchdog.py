@@ -0,0 +1,217 @@
+# coding: utf-8
+
+"""
+    Watchdog of the IOLoop: measures its lag and logs callbacks which block it, with a sample of their stack.
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from timeit import default_timer
+
+import tornado.ioloop
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_INTERVAL = 0.5
+
+# Watchdog of this process, set by Watchdog.start()
+current = None
+
+
+class Watchdog(object):
+    """
+        Watches the IOLoop of the current process, where Django views (with :func:`~tornado_websockets.django_app`)
+        and WebSocket callbacks run, so any blocking call delays every client:
+
+        - the IOLoop lag (how late a timer runs) is measured every ``interval`` seconds and logged when it is above
+          ``threshold``,
+        - callbacks dispatched by :meth:`WebSocketHandler.run_callback()
+          <tornado_websockets.websockethandler.WebSocketHandler.run_callback>` and Django requests served by
+          :func:`~tornado_websockets.django_app` are timed by a thread: when one blocks the IOLoop longer than
+          ``threshold``, it is logged with a sample of the IOLoop thread stack, taken while it is still blocking.
+
+        Statistics:
+
+        - ``lag`` and ``max_lag``: last and maximum IOLoop lag, in seconds,
+        - ``slow_callbacks``: number of callbacks which blocked the IOLoop longer than ``threshold``.
+
+        :param threshold: duration in seconds above which the IOLoop is considered blocked
+        :param interval: how often (in seconds) the IOLoop lag is measured
+        :type threshold: float
+        :type interval: float
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, interval=DEFAULT_INTERVAL):
+        if threshold <= 0:
+            raise ValueError('Param « threshold » should be positive, got %r.' % threshold)
+
+        if interval <= 0:
+            raise ValueError('Param « interval » should be positive, got %r.' % interval)
+
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+
+        self.io_loop = None
+        self.thread = None
+        self.loop_thread_id = None
+        self.running = False
+
+        # (name, owner, start) of the running callback, only written by the IOLoop thread
+        self._current = None
+        # Running callback already logged by the watchdog thread
+        self._flagged = None
+        self._timeout = None
+        self._scheduled_at = None
+
+    def start(self):
+        """
+            Start watching the IOLoop of the current thread, it becomes the watchdog of this process. Should be
+            called in each worker, after a fork.
+        """
+
+        global current
+
+        self.io_loop = tornado.ioloop.IOLoop.current()
+        self.loop_thread_id = threading.current_thread().ident
+        self.running = True
+        self.schedule()
+
+        self.thread = threading.Thread(target=self.watch, name='tornado_websockets-watchdog')
+        self.thread.daemon = True
+        self.thread.start()
+
+        current = self
+
+    def stop(self):
+        """
+            Stop watching the IOLoop.
+        """
+
+        global current
+
+        self.running = False
+
+        if self._timeout is not None:
+            self.io_loop.remove_timeout(self._timeout)
+            self._timeout = None
+
+        if current is self:
+            current = None
+
+    def schedule(self):
+        self._scheduled_at = self.io_loop.time() + self.interval
+        self._timeout = self.io_loop.call_at(self._scheduled_at, self.tick)
+
+    def tick(self):
+        self.lag = max(0.0, self.io_loop.time() - self._scheduled_at)
+        self.max_lag = max(self.max_lag, self.lag)
+
+        if self.lag > self.threshold:
+            logger.warning('IOLoop lag: a timer ran %.0f ms late.', self.lag * 1000)
+
+        if self.running:
+            self.schedule()
+
+    def begin(self, name, owner):
+        """
+            Called by the IOLoop thread before running a callback.
+
+            :param name: event name, or the request line of a Django request
+            :param owner: path of the WebSocket, or ``'django'``
+            :type name: str
+            :type owner: str
+        """
+
+        self._current = (name, owner, default_timer())
+
+    def end(self):
+        """
+            Called by the IOLoop thread after running a callback started by :meth:`begin`.
+        """
+
+        running, self._current = self._current, None
+
+        if running is None:
+            return
+
+        duration = default_timer() - running[2]
+
+        if duration > self.threshold:
+            self.slow_callbacks += 1
+
+            if self._flagged is running:
+                logger.warning('« %s » of %s blocked the IOLoop for %.0f ms.', running[0], running[1], duration * 1000)
+            else:
+                # Too short for the watchdog thread to sample it
+                logger.warning('« %s » of %s blocked the IOLoop for %.0f ms, no stack was sampled.',
+                               running[0], running[1], duration * 1000)
+
+    def watch(self):
+        """
+            Body of the watchdog thread: checks the running callback several times per ``threshold``.
+        """
+
+        while self.running:
+            time.sleep(self.threshold / 4)
+
+            running = self._current
+
+            if running is None or running is self._flagged or default_timer() - running[2] <= self.threshold:
+                continue
+
+            self._flagged = running
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '(no stack)\n'
+
+            logger.warning('« %s » of %s has been blocking the IOLoop for more than %.0f ms, IOLoop stack:\n%s',
+                           running[0], running[1], self.threshold * 1000, stack.rstrip('\n'))
+
+    def __repr__(self):
+        return '<Watchdog: threshold %.0f ms, max lag %.0f ms, %d slow callback(s)>' % (
+            self.threshold * 1000, self.max_lag * 1000, self.slow_callbacks
+        )
+
+
+class WatchedWSGIApplication(object):
+    """
+        Wraps a WSGI application (like Django) served by a ``tornado.wsgi.WSGIContainer`` running on the IOLoop, so
+        the watchdog times each request, see :func:`~tornado_websockets.django_app`.
+
+        The application is wrapped, not the container: since Tornado 6.3, the container only schedules the request
+        and calls the application later. Calls from another thread (a container with an ``executor``) do not block
+        the IOLoop and are not timed.
+
+        :param application: WSGI application
+        :param owner: name of the application in logs
+        :type application: callable
+        :type owner: str
+    """
+
+    def __init__(self, application, owner='django'):
+        self.application = application
+        self.owner = owner
+
+    def __call__(self, environ, start_response):
+        watchdog = current
+
+        if watchdog is None or threading.current_thread().ident != watchdog.loop_thread_id:
+            return self.application(environ, start_response)
+
+        name = '%s %s' % (environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'))
+
+        if environ.get('QUERY_STRING'):
+            name += '?' + environ['QUERY_STRING']
+
+        watchdog.begin(name, self.owner)
+
+        try:
+            return self.application(environ, start_response)
+        finally:
+            watchdog.end()
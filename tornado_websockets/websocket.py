@@ -1,29 +1,76 @@
 # coding: utf-8
 
 from six import string_types
+from tornado.websocket import WebSocketClosedError
 
+from .admission import Admission
+from .batching import Batcher
+from .codec import JSON
+from .compression import Compression
+from .dispatch import compile_executor_invoker, compile_invoker, executor_io_loop
 from .exceptions import NotCallableError
+from .frame import build_frame, encode_event
+from .heartbeat import Heartbeat
+from .metrics import WebSocketMetrics
+from .outbound import outbound_options
+from .ratelimit import RateLimit
+from .registry import ConnectionRegistry
 from .tornadowrapper import TornadoWrapper
 from .websockethandler import WebSocketHandler
 
+# Events which are called by WebSocketHandler itself during a connection lifecycle, see WebSocket.on
+LIFECYCLE_HOOKS = ('connect', 'open', 'close')
+
 
 class WebSocket(object):
     """
         Class that you should to make WebSocket applications 👍.
     """
 
-    def __init__(self, path):
+    def __init__(self, path, outbound=None, batch=None, compression=None, metrics=True, heartbeat=None,
+                 admission=None, rate_limit=None):
         """
             Initialize a new WebSocket object.
 
             :param path: path of your application, used to rely with dtws's client side.
             :type path: str
+            :param outbound: flow control of each client, see :func:`~tornado_websockets.outbound.outbound_options`
+            :type outbound: dict
+            :param batch: ``None`` to send each message in its own frame, otherwise messages emitted to a client are
+                          sent together in one frame, after one IOLoop iteration (``0``) or a window in seconds, see
+                          :class:`~tornado_websockets.batching.Batcher`
+            :type batch: float
+            :param compression: ``None`` to disable per-message compression, otherwise compression settings, see
+                                :class:`~tornado_websockets.compression.Compression`
+            :type compression: dict
+            :param metrics: ``False`` to not collect metrics, see :class:`~tornado_websockets.metrics.WebSocketMetrics`
+            :type metrics: bool
+            :param heartbeat: ``None`` to never ping nor close idle clients, otherwise heartbeat settings, see
+                              :class:`~tornado_websockets.heartbeat.Heartbeat`
+            :type heartbeat: dict
+            :param admission: ``None`` for no limit, otherwise limits on the connections to this WebSocket, see
+                              :class:`~tornado_websockets.admission.Admission`
+            :type admission: dict
+            :param rate_limit: ``None`` for no limit, otherwise the rate limit of the messages of each client, checked
+                               before decoding them, see :class:`~tornado_websockets.ratelimit.RateLimit`
+            :type rate_limit: dict
         """
 
         self.events = {}
-        self.handlers = []
+        self.invokers = {}
+        self.rate_limits = {}
+        self.hooks = dict((hook, []) for hook in LIFECYCLE_HOOKS)
+        self.handlers = ConnectionRegistry()
+        self.rooms = {}
         self.context = None
         self.modules = []
+        self.outbound = outbound_options(**(outbound or {}))
+        self.compression = Compression(**compression) if compression is not None else None
+        self.batcher = Batcher(batch, self.compression) if batch is not None else None
+        self.metrics = WebSocketMetrics() if metrics else None
+        self.heartbeat = Heartbeat(**heartbeat) if heartbeat is not None else None
+        self.admission = Admission(**admission) if admission is not None else None
+        self.rate_limit = RateLimit(**rate_limit) if rate_limit is not None else None
 
         if not isinstance(path, string_types):
             raise TypeError('« Path » parameter should be a string.')
@@ -31,6 +78,8 @@ class WebSocket(object):
         self.path = path.strip()
         self.path = self.path if self.path.startswith('/') else '/' + self.path
 
+        # Index this WebSocket by its path, for messages broadcasted by other processes
+        TornadoWrapper.websockets[self.path] = self
         TornadoWrapper.add_handler(('/ws' + self.path, WebSocketHandler, {'websocket': self}))
 
     def bind(self, module):
@@ -45,15 +94,44 @@ class WebSocket(object):
         module._websocket = self
         module.initialize()
 
-    def on(self, callback):
+    def on(self, callback=None, executor=False, rate_limit=None, hook=None):
         """
             Should be used as a decorator.
 
             It will execute the decorated function when :class:`~tornado_websockets.websockethandler.WebSocketHandler`
             will receive an event where its name correspond to the function (by using ``__name__`` magic attribute).
 
+            The callback signature is analysed here, once, so dispatching an incoming event only costs a dictionary
+            lookup and a direct call.
+
+            A callback named ``connect``, ``open`` or ``close``, or registered with ``hook='connect'``, ``'open'`` or
+            ``'close'`` (like the callbacks of modules, whose names are prefixed), is also a lifecycle hook, called
+            without any data:
+
+            - ``connect`` when a client asks for a connection, before the WebSocket handshake. Raising a
+              ``tornado.web.HTTPError`` here rejects the client,
+            - ``open`` when the connection is opened,
+            - ``close`` when the connection is closed.
+
+            A callback can be a coroutine (``async def`` or ``@tornado.gen.coroutine``), it is awaited and an
+            exception it raises is logged and reported to the client with a ``warning`` event.
+
+            A blocking callback (ORM queries, ...) can be registered with ``@ws.on(executor=True)`` to run it in a
+            thread pool shared by all WebSockets, or ``@ws.on(executor=my_executor)`` to use your own
+            ``concurrent.futures.Executor``. Such a callback can call ``emit()`` methods, messages are sent from the
+            IOLoop, but it should not touch anything else of the connection.
+
+            The rate of an event can be limited for each client with ``@ws.on(rate_limit={'rate': 1, 'burst': 5})``,
+            see :class:`~tornado_websockets.ratelimit.RateLimit`.
+
             :param callback: Function to decorate.
+            :param executor: ``True`` or an executor to run the callback outside the IOLoop thread.
+            :param rate_limit: ``None`` for no limit, otherwise the rate limit of this event for each client
+            :param hook: lifecycle hook of the callback, ``None`` to find it from the name of the callback
             :type callback: callable
+            :type executor: bool or concurrent.futures.Executor
+            :type rate_limit: dict
+            :type hook: str
             :raise tornado_websockets.exceptions.NotCallableError:
 
             :Example:
@@ -61,26 +139,110 @@ class WebSocket(object):
                  >>> @ws.on
                  ... def hello(socket, data):
                  ...     print('Received event « hello » from a client.')
+                 >>> @ws.on(executor=True)
+                 ... def save(socket, data):
+                 ...     Message.objects.create(text=data['text'])
+                 ...     socket.emit('saved')
+                 >>> @ws.on(rate_limit={'rate': 2, 'burst': 10, 'action': 'drop'})
+                 ... def message(socket, data):
+                 ...     ws.emit('message', data)
         """
 
+        if callback is None:
+            return lambda callback: self.on(callback, executor=executor, rate_limit=rate_limit, hook=hook)
+
         if not callable(callback):
             raise NotCallableError(callback)
 
-        self.events[callback.__name__] = callback
+        if hook is not None and hook not in LIFECYCLE_HOOKS:
+            raise ValueError('Param « hook » should be one of %s, got %r.' % (', '.join(LIFECYCLE_HOOKS), hook))
+
+        name = callback.__name__
+
+        if hook is None and name in LIFECYCLE_HOOKS:
+            hook = name
+        invoker = compile_invoker(callback)
+
+        if executor:
+            invoker = compile_executor_invoker(invoker, executor)
+
+        self.events[name] = callback
+        self.invokers[name] = invoker
+
+        if rate_limit is not None:
+            self.rate_limits[name] = RateLimit(**rate_limit)
+        else:
+            self.rate_limits.pop(name, None)
+
+        # Like self.events, a new callback replaces the previous one with the same name
+        for lifecycle_hook, hooks in self.hooks.items():
+            self.hooks[lifecycle_hook] = [registered for registered in hooks if registered[0] != name]
+
+        if hook is not None:
+            self.hooks[hook].append((name, invoker))
+
         return callback
 
-    def emit(self, event, data=None):
+    def join(self, room, handler):
         """
-            Send an event/data dictionnary to all clients connected to your WebSocket instance.
+            Add a client to a room, rooms are created on the fly.
+
+            :param room: room name
+            :param handler: client joining the room
+            :type room: str
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        members = self.rooms.get(room)
+
+        if members is None:
+            members = self.rooms[room] = ConnectionRegistry()
+
+        members.add(handler)
+        handler.rooms.add(room)
+
+    def leave(self, room, handler):
+        """
+            Remove a client from a room, a room without any client is deleted.
+
+            :param room: room name
+            :param handler: client leaving the room
+            :type room: str
+            :type handler: tornado_websockets.websockethandler.WebSocketHandler
+        """
+
+        handler.rooms.discard(room)
+        members = self.rooms.get(room)
+
+        if members is not None and members.remove(handler) and not members:
+            del self.rooms[room]
+
+    def emit(self, event, data=None, room=None, local=False):
+        """
+            Send an event/data dictionnary to all clients connected to your WebSocket instance, or only to clients
+            which joined ``room``.
             To see all ways to emit an event, please read « :ref:`emit-an-event` » section.
 
+            The event/data envelope is serialized and framed only once, then the same bytes are written to every
+            client. Clients whose connection is already closed are skipped. Emitting to a room only costs its number
+            of members.
+
+            The message is published through the broadcast backend of
+            :class:`~tornado_websockets.tornadowrapper.TornadoWrapper`, so it also reaches clients connected to other
+            processes when the server runs several workers, unless ``local`` is ``True``: messages depending on the
+            state of this process (a version, a sequence number, ...) only reach its own clients. Called from a
+            callback running in an executor, the message is published from the IOLoop.
+
             :param event: event name
             :param data: a dictionary or a string which will be converted to ``{'message': data}``
+            :param room: room name, see :meth:`~tornado_websockets.websocket.WebSocket.join`
+            :param local: only send the message to clients of this process
             :type event: str
             :type data: dict or str
+            :type room: str
+            :type local: bool
             :raise: :class:`~tornado_websockets.exceptions.EmitHandlerError` if not used inside
                     :meth:`@WebSocket.on() <tornado_websockets.websocket.WebSocket.on>` decorator.
-            :raise: :class:`tornado.websocket.WebSocketClosedError` if connection is closed.
 
             .. warning::
                 :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` method should be used inside
@@ -101,6 +263,111 @@ class WebSocket(object):
         if not isinstance(data, dict):
             raise TypeError('Param « data » should be a string or a dictionary.')
 
-        if self.handlers:
-            for handler in self.handlers:
-                handler.emit(event, data)
+        self.publish(encode_event(event, data), room, event, local)
+
+    def publish(self, payload, room=None, event=None, local=False):
+        """
+            Send an already encoded message to all clients, or only to clients which joined ``room``, like
+            :meth:`~tornado_websockets.websocket.WebSocket.emit` does once the message is encoded.
+
+            :param payload: JSON encoded message, see :func:`~tornado_websockets.frame.encode_event`
+            :param room: room name
+            :param event: event name of the message
+            :param local: only send the message to clients of this process
+            :type payload: bytes
+            :type room: str
+            :type event: str
+            :type local: bool
+        """
+
+        io_loop = executor_io_loop()
+
+        if io_loop is not None:
+            # Called from a callback running in an executor thread, writing is only safe from the IOLoop
+            io_loop.add_callback(self.publish, payload, room, event, local)
+            return
+
+        if local:
+            self.deliver(payload, room, event)
+            return
+
+        broadcast = TornadoWrapper.broadcast
+
+        if broadcast.local and not (self.handlers if room is None else self.rooms.get(room)):
+            return
+
+        broadcast.publish(self, room, payload, event)
+
+    def deliver(self, payload, room=None, event=None):
+        """
+            Write an encoded message to all clients of this process connected to this WebSocket, or only to clients
+            which joined ``room``. Called by the broadcast backend for messages emitted by this process or by other
+            processes.
+
+            Messages are published in JSON, they are encoded again (once per codec, not per client) for clients
+            which negotiated another codec. With compression, each encoded message is compressed once for the clients
+            which do not keep a compression context, see :meth:`Compression.sharing()
+            <tornado_websockets.compression.Compression.sharing>`.
+
+            :param payload: JSON encoded message, see :func:`~tornado_websockets.frame.encode_event`
+            :param room: room name
+            :param event: event name of the message
+            :type payload: bytes
+            :type room: str
+            :type event: str
+        """
+
+        handlers = self.handlers if room is None else self.rooms.get(room)
+
+        if not handlers:
+            return
+
+        if self.compression is None:
+            sent = self.write_frames(handlers, payload, room, event)
+        else:
+            with self.compression.sharing():
+                sent = self.write_frames(handlers, payload, room, event)
+
+        if self.metrics is not None:
+            # Counted with the size of the JSON payload, whatever the codec of each client
+            self.metrics.sent(event, len(payload), sent)
+
+    def write_frames(self, handlers, payload, room, event):
+        """
+            Write a message to each of the given clients, in its codec. Return the number of clients written to.
+        """
+
+        # Queued messages of a slow client only replace messages of the same event and room
+        key = (event, room) if event is not None else None
+
+        # Batched messages are framed when the batch is flushed
+        framed = self.batcher is None
+        frame = build_frame(payload) if framed else None
+
+        # Payload and frame for each other codec, built on first use
+        encoded = {}
+        sent = 0
+
+        for handler in handlers:
+            codec = handler.codec
+
+            try:
+                if codec is JSON:
+                    handler.write_frame(frame, payload, key)
+                    sent += 1
+                    continue
+
+                other = encoded.get(codec)
+
+                if other is None:
+                    other_payload = codec.encode(JSON.decode(payload))
+                    other_frame = build_frame(other_payload, codec.opcode) if framed else None
+                    other = encoded[codec] = (other_payload, other_frame)
+
+                handler.write_frame(other[1], other[0], key)
+                sent += 1
+            except WebSocketClosedError:
+                # Its on_close() will remove it from handlers
+                pass
+
+        return sent
@@ -1,14 +1,30 @@
 # coding: utf-8
 
-import inspect
+import functools
+import itertools
+import logging
+from timeit import default_timer
 
 import tornado
-import tornado.escape
+import tornado.gen
 import tornado.httpserver
 import tornado.ioloop
+import tornado.iostream
 import tornado.web
 import tornado.websocket
 
+from . import watchdog
+from .codec import JSON, SUBPROTOCOL_PREFIX, get_codec
+from .dispatch import executor_io_loop, is_awaitable
+from .outbound import OutboundQueue
+from .ratelimit import CLOSE_CODE
+from .tornadowrapper import TornadoWrapper
+
+app_log = logging.getLogger('tornado.application')
+
+# Connection ids, unique for the lifetime of the process
+_connection_ids = itertools.count(1)
+
 
 class WebSocketHandler(tornado.websocket.WebSocketHandler):
     """
@@ -23,7 +39,11 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
     def initialize(self, websocket):
         """
             Called when class initialization, makes a link between a :class:`~tornado_websockets.websocket.WebSocket`
-            instance and this object.
+            instance and this object, gives it a connection ``id``, an ``outbound`` queue (see
+            :class:`~tornado_websockets.outbound.OutboundQueue`) and the default ``codec`` (JSON).
+
+            ``last_seen`` is the time (:func:`timeit.default_timer`) of the last message or pong of the client, see
+            :class:`~tornado_websockets.heartbeat.Heartbeat`.
 
             :param websocket: instance of WebSocket.
             :type websocket: WebSocket
@@ -31,41 +51,198 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
 
         # Make a link between a WebSocket instance and this object
         self.websocket = websocket
-        websocket.handlers.append(self)
+        self.id = next(_connection_ids)
+        self.rooms = set()
+        self.outbound = OutboundQueue(self, **websocket.outbound)
+        self.codec = JSON
+        self.last_seen = None
+        self.last_ping = None
+        self.heartbeat_timer = None
+        self.admissions = ()
+        self.buckets = {}
+
+    @tornado.gen.coroutine
+    def prepare(self):
+        """
+            Called when a client asks for a connection, before the WebSocket handshake. Checks connection limits (see
+            :meth:`~tornado_websockets.websockethandler.WebSocketHandler.admit`), selects the codec asked with the
+            ``codec`` query parameter, then calls ``connect`` hooks, the asynchronous ones are awaited so they can
+            reject the client too.
+
+            :raise: ``tornado.web.HTTPError`` (400) if the codec is unknown, (429 or 503) if a limit is reached.
+        """
+
+        self.admit()
+
+        name = self.get_query_argument('codec', None)
+
+        if name is not None:
+            codec = get_codec(name)
+
+            if codec is None:
+                raise tornado.web.HTTPError(400, 'Unknown codec « %s ».' % name)
+
+            self.codec = codec
+
+        for name, invoker in self.websocket.hooks['connect']:
+            result = invoker(self.websocket.context, self, {})
+
+            if is_awaitable(result):
+                yield result
+
+    def admit(self):
+        """
+            Count this connection in the limits of the process (:attr:`TornadoWrapper.admission
+            <tornado_websockets.tornadowrapper.TornadoWrapper.admission>`) and of its WebSocket, until it is closed
+            or rejected.
+
+            :raise: ``tornado.web.HTTPError`` (429 or 503) if a limit is reached, see
+                    :class:`~tornado_websockets.admission.Admission`.
+        """
+
+        ip = self.request.remote_ip
+        admitted = []
+
+        try:
+            for admission in (TornadoWrapper.admission, self.websocket.admission):
+                if admission is not None:
+                    admission.admit(ip)
+                    admitted.append(admission)
+        except tornado.web.HTTPError:
+            for admission in admitted:
+                admission.release(ip)
+
+            raise
+
+        self.admissions = admitted
+
+    def release(self):
+        """
+            Stop counting this connection in the limits it was admitted by.
+        """
+
+        admissions, self.admissions = self.admissions, ()
+
+        for admission in admissions:
+            admission.release(self.request.remote_ip)
+
+    def on_finish(self):
+        # Also called after a successful handshake (101), the connection is then released by on_close()
+        if self.get_status() != 101:
+            self.release()
 
     def open(self):
         """
-            Called when the WebSocket is opened
+            Called when the WebSocket is opened, adds this object to its WebSocket handlers, starts its heartbeat then
+            calls ``open`` hooks.
+
+            Clients rejected during the handshake never reach this method, so they are never added to handlers.
         """
 
-        for event in self.websocket.events:
-            if event.endswith('open'):
-                self.on_message('{"event": "%s", "data": {}}' % event)
+        self.websocket.handlers.add(self)
+
+        if self.websocket.heartbeat is not None:
+            self.websocket.heartbeat.watch(self)
+
+        self.run_hooks('open')
 
     def check_origin(self, origin):
         return True
 
+    def get_compression_options(self):
+        """
+            Enable per-message compression if the WebSocket has compression settings, see
+            :class:`~tornado_websockets.compression.Compression`.
+
+            :rtype: dict
+        """
+
+        compression = self.websocket.compression
+
+        return compression.options() if compression is not None else None
+
+    def get_websocket_protocol(self):
+        protocol = super(WebSocketHandler, self).get_websocket_protocol()
+        compression = self.websocket.compression
+
+        if protocol is not None and compression is not None:
+            # Tornado echoes the parameters of the accepted offer, so server parameters are added to the offers
+            parse_extensions_header = protocol._parse_extensions_header
+            protocol._parse_extensions_header = lambda headers: compression.negotiate(parse_extensions_header(headers))
+
+        return protocol
+
+    def select_subprotocol(self, subprotocols):
+        """
+            Select the first ``dtws.<codec>`` subprotocol asked by the client whose codec is registered, see
+            :func:`~tornado_websockets.codec.register_codec`.
+
+            :param subprotocols: subprotocols asked by the client
+            :type subprotocols: list
+            :rtype: str
+        """
+
+        for subprotocol in subprotocols:
+            if subprotocol.startswith(SUBPROTOCOL_PREFIX):
+                codec = get_codec(subprotocol)
+
+                if codec is not None:
+                    self.codec = codec
+                    return subprotocol
+
+        return None
+
     def on_message(self, message):
         """
             Handle incoming messages on the WebSocket.
 
-            :param message: JSON string
-            :type message: str
+            A message above the rate limit of the WebSocket is rejected before being decoded, a message above the
+            rate limit of its event before its callback is called, see
+            :class:`~tornado_websockets.ratelimit.RateLimit`.
+
+            Asynchronous callbacks (``async def``, ``@tornado.gen.coroutine`` or registered with
+            ``@WebSocket.on(executor=...)``) are not awaited before handling the next message of this client, see
+            :meth:`~tornado_websockets.websockethandler.WebSocketHandler.run_callback`.
+
+            :param message: message serialized by the codec of this connection, JSON by default
+            :type message: str or bytes
         """
 
-        try:
-            message = tornado.escape.json_decode(message)
-            event = message.get('event')
-            data = message.get('data')
-        except ValueError:
-            self.emit_warning('Invalid JSON was sent.')
+        metrics = self.websocket.metrics
+        weight = 0
+
+        if metrics is not None:
+            countdown = metrics.countdown - 1
+
+            if countdown:
+                metrics.countdown = countdown
+            else:
+                weight = metrics.sample(len(message))
+
+        self.last_seen = default_timer()
+
+        rate_limit = self.websocket.rate_limit
+
+        if rate_limit is not None and not self.consume(None, rate_limit):
             return
 
-        if not event:
-            self.emit_warning('There is no event in this JSON.')
+        envelope = self.decode_envelope(message)
+
+        if envelope is None:
             return
 
-        if not self.websocket.events.get(event):
+        event, data = envelope
+        invoker = self.websocket.invokers.get(event)
+
+        if not invoker:
+            if metrics is not None:
+                metrics.unknown_events += 1
+
+            return
+
+        rate_limit = self.websocket.rate_limits.get(event)
+
+        if rate_limit is not None and not self.consume(event, rate_limit):
             return
 
         if not data:
@@ -74,18 +251,137 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             self.emit_warning('The data should be a dictionary.')
             return
 
-        callback = self.websocket.events.get(event)
-        spec = inspect.getargspec(callback)
-        kwargs = {}
+        self.run_callback(event, invoker, data, weight)
+
+    def decode_envelope(self, message):
+        """
+            Decode a message with the codec of this connection. A client which sent an invalid message or a message
+            without event receives a ``warning`` event.
+
+            :param message: message serialized by the codec of this connection
+            :type message: str or bytes
+            :return: ``(event, data)``, or ``None`` if the message is invalid
+            :rtype: tuple
+        """
+
+        try:
+            message = self.codec.decode(message)
+            event = message.get('event')
+            data = message.get('data')
+        except (ValueError, AttributeError):
+            if self.websocket.metrics is not None:
+                self.websocket.metrics.decode_errors += 1
+
+            self.emit_warning('Invalid %s was sent.' % self.codec.label)
+            return None
+
+        if not event:
+            self.emit_warning('There is no event in this %s.' % self.codec.label)
+            return None
+
+        return event, data
+
+    def consume(self, event, rate_limit):
+        """
+            Take a token from the bucket of this client for ``event`` (``None`` for all its messages), created on
+            first use. If the bucket is empty, applies the action of the rate limit: warn the client, drop the
+            message or close the connection.
+
+            :param event: event name, or ``None``
+            :param rate_limit: rate limit of the event, or of the WebSocket
+            :type event: str
+            :type rate_limit: tornado_websockets.ratelimit.RateLimit
+            :return: ``False`` if the message is above the limit and should be ignored
+            :rtype: bool
+        """
+
+        bucket = self.buckets.get(event)
+
+        if bucket is None:
+            bucket = self.buckets[event] = rate_limit.bucket()
+
+        if rate_limit.consume(bucket):
+            return True
+
+        if self.websocket.metrics is not None:
+            self.websocket.metrics.rate_limited += 1
+
+        if rate_limit.action == 'warn':
+            if event is None:
+                self.emit_warning('Too many messages, this message was ignored.')
+            else:
+                self.emit_warning('Too many « %s » events, this one was ignored.' % event)
+        elif rate_limit.action == 'close':
+            self.close(CLOSE_CODE, 'Rate limit exceeded.')
+
+        return False
+
+    def on_pong(self, data):
+        """
+            Called when the client answers a ping, see :class:`~tornado_websockets.heartbeat.Heartbeat`.
+        """
+
+        self.last_seen = default_timer()
+
+    def run_callback(self, name, invoker, data, weight=0):
+        """
+            Call a callback through its invoker. If the callback returns a coroutine or a future, it is awaited on
+            the IOLoop and an exception it raises is logged and reported to the client with a ``warning`` event.
+
+            A sampled call is counted ``weight`` times by the metrics of the WebSocket, and timed until it completes,
+            see :class:`~tornado_websockets.metrics.WebSocketMetrics`.
+
+            With ``runtornado --watchdog``, a callback blocking the IOLoop is logged, see
+            :class:`~tornado_websockets.watchdog.Watchdog`.
+
+            :param name: event name
+            :param invoker: invoker of the callback, see :func:`~tornado_websockets.dispatch.compile_invoker`
+            :param data: data sent by the client
+            :param weight: number of calls this call stands for, ``0`` if it is not sampled
+            :type name: str
+            :type invoker: callable
+            :type data: dict
+            :type weight: int
+        """
+
+        metrics = self.websocket.metrics if weight else None
+        start = None
+
+        if metrics is not None:
+            metrics.calls[name] += weight
+            start = default_timer()
+
+        monitor = watchdog.current
 
-        if 'self' in spec.args:
-            kwargs['self'] = self.websocket.context
-        if 'socket' in spec.args:
-            kwargs['socket'] = self
-        if 'data' in spec.args:
-            kwargs['data'] = data
+        if monitor is None:
+            result = invoker(self.websocket.context, self, data)
+        else:
+            monitor.begin(name, self.websocket.path)
 
-        return callback(**kwargs)
+            try:
+                result = invoker(self.websocket.context, self, data)
+            finally:
+                monitor.end()
+
+        if is_awaitable(result):
+            future = tornado.gen.convert_yielded(result)
+            tornado.ioloop.IOLoop.current().add_future(future, functools.partial(self.on_callback_done, name, start))
+        elif start is not None:
+            metrics.observe(name, default_timer() - start)
+
+    def on_callback_done(self, name, start, future):
+        if start is not None and self.websocket.metrics is not None:
+            self.websocket.metrics.observe(name, default_timer() - start)
+
+        try:
+            future.result()
+        except Exception:
+            app_log.error('Uncaught exception in callback « %s » of %s', name, self.websocket.path, exc_info=True)
+
+            try:
+                self.emit_warning('An error occurred while handling « %s » event.' % name)
+            except tornado.websocket.WebSocketClosedError:
+                pass
 
     def emit(self, event, data):
         """
@@ -94,16 +390,137 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             Wrapper for `tornado.websocket.WebSocketHandler.write_message <http://www.tornadoweb.org/en/stable/
             websocket.html#tornado.websocket.WebSocketHandler.write_message>`_ method.
 
+            Can be called from a callback running in an executor, the message is then sent from the IOLoop.
+
             :param event: event name to emit
             :param data: associated data
             :type event: str
             :type data: dict
         """
 
-        self.write_message({
-            'event': event,
-            'data': data
-        })
+        io_loop = executor_io_loop()
+
+        if io_loop is not None:
+            # Called from a callback running in an executor thread, writing is only safe from the IOLoop
+            io_loop.add_callback(self.emit, event, data)
+            return
+
+        payload = self.codec.encode_event(event, data)
+        self.send(payload, key=(event, None))
+
+        if self.websocket.metrics is not None:
+            self.websocket.metrics.sent(event, len(payload))
+
+    def write_frame(self, frame, payload, key=None):
+        """
+            Writes an already built frame to the client of this WebSocket, used by
+            :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>` to share the same bytes between
+            every client.
+
+            If the connection negotiated per-message compression, a compressed frame is shared instead when the
+            connection does not keep its compression context, otherwise ``payload`` is sent through
+            ``write_message``. Messages smaller than the ``min_size`` of compression settings are sent uncompressed.
+
+            :param frame: complete WebSocket frame, see :func:`~tornado_websockets.frame.build_frame`
+            :param payload: encoded message wrapped by ``frame``
+            :param key: coalesce key of the message, see :class:`~tornado_websockets.outbound.OutboundQueue`
+            :type frame: bytes
+            :type payload: bytes
+            :type key: hashable
+            :raise: :class:`tornado.websocket.WebSocketClosedError` if connection is closed.
+        """
+
+        self.send(payload, frame, key)
+
+    def send(self, payload, frame=None, key=None):
+        """
+            Sends an encoded message through the ``outbound`` queue of this connection, so a slow client is handled
+            by its policy instead of buffering messages without limit. If the WebSocket batches messages, the
+            message is added to the next batch of this client instead.
+
+            :param payload: encoded message
+            :param frame: complete WebSocket frame around ``payload``, or ``None``
+            :param key: coalesce key of the message, see :class:`~tornado_websockets.outbound.OutboundQueue`
+            :type payload: bytes
+            :type frame: bytes
+            :type key: hashable
+            :raise: :class:`tornado.websocket.WebSocketClosedError` if connection is closed.
+        """
+
+        connection = self.ws_connection
+
+        if connection is None or connection.client_terminated or connection.server_terminated:
+            raise tornado.websocket.WebSocketClosedError()
+
+        batcher = self.websocket.batcher
+
+        if batcher is not None:
+            batcher.add(self, payload)
+        else:
+            self.outbound.send(payload, frame, key)
+
+    def write_now(self, payload, frame=None):
+        """
+            Writes a message to the connection, bypassing the ``outbound`` queue.
+
+            :param payload: encoded message
+            :param frame: complete WebSocket frame around ``payload``, or ``None`` to let Tornado frame it
+            :type payload: bytes
+            :type frame: bytes
+            :return: future resolved when the message is flushed
+            :raise: :class:`tornado.websocket.WebSocketClosedError` if connection is closed.
+        """
+
+        connection = self.ws_connection
+        compressor = getattr(connection, '_compressor', None)
+
+        if compressor is not None:
+            compression = self.websocket.compression
+            frame = compression.frame(payload, frame, self.codec.opcode, compressor) if compression else None
+
+        if frame is None:
+            return self.write_message(payload, binary=self.codec.binary)
+
+        try:
+            return connection.stream.write(frame)
+        except tornado.iostream.StreamClosedError:
+            raise tornado.websocket.WebSocketClosedError()
+
+    def join(self, room):
+        """
+            Join a room of this WebSocket, see :meth:`WebSocket.join() <tornado_websockets.websocket.WebSocket.join>`.
+
+            :param room: room name
+            :type room: str
+        """
+
+        self.websocket.join(room, self)
+
+    def leave(self, room):
+        """
+            Leave a room of this WebSocket, see
+            :meth:`WebSocket.leave() <tornado_websockets.websocket.WebSocket.leave>`.
+
+            :param room: room name
+            :type room: str
+        """
+
+        self.websocket.leave(room, self)
+
+    def emit_room(self, room, event, data=None):
+        """
+            Sends a given event/data combinaison to every client of a room, this client included if it joined it.
+            Shortcut for :meth:`WebSocket.emit() <tornado_websockets.websocket.WebSocket.emit>`.
+
+            :param room: room name
+            :param event: event name to emit
+            :param data: associated data
+            :type room: str
+            :type event: str
+            :type data: dict or str
+        """
+
+        self.websocket.emit(event, data, room=room)
 
     def emit_warning(self, message):
         """
@@ -113,11 +530,43 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
             :type message: str
         """
 
+        if self.websocket.metrics is not None:
+            self.websocket.metrics.warnings += 1
+
         return self.emit('warning', {'message': message})
 
+    def run_hooks(self, hook):
+        """
+            Call lifecycle hooks registered by :meth:`@WebSocket.on() <tornado_websockets.websocket.WebSocket.on>`
+            decorator, without any data.
+
+            :param hook: ``'open'`` or ``'close'``
+            :type hook: str
+        """
+
+        # Hooks are rare, each call is counted and timed
+        weight = 1 if self.websocket.metrics is not None else 0
+
+        for name, invoker in self.websocket.hooks[hook]:
+            self.run_callback(name, invoker, {}, weight)
+
     def on_close(self):
         """
-            Called when the WebSocket is closed, delete the link between this object and its WebSocket.
+            Called when the WebSocket is closed, delete the link between this object and its WebSocket and its rooms,
+            then calls ``close`` hooks.
         """
 
-        self.websocket.handlers.remove(self)
+        self.outbound.clear()
+        self.release()
+
+        if self.websocket.heartbeat is not None:
+            self.websocket.heartbeat.forget(self)
+
+        if self.websocket.batcher is not None:
+            self.websocket.batcher.discard(self)
+
+        for room in list(self.rooms):
+            self.websocket.leave(room, self)
+
+        if self.websocket.handlers.remove(self):
+            self.run_hooks('close')
@@ -0,0 +1,209 @@
+# coding: utf-8
+
+"""
+    Run a WSGI application (like Django) on a pool of threads, so slow requests do not block the IOLoop and the
+    WebSockets it serves.
+"""
+
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado
+import tornado.httputil
+import tornado.ioloop
+import tornado.wsgi
+
+from .dispatch import call_for_io_loop
+
+access_log = logging.getLogger('tornado.access')
+app_log = logging.getLogger('tornado.application')
+
+DEFAULT_THREADS = 10
+DEFAULT_QUEUE = 100
+
+
+class ThreadPoolWSGIContainer(object):
+    """
+        Like ``tornado.wsgi.WSGIContainer``, but the WSGI application is called in a pool of ``threads`` threads
+        instead of the IOLoop thread. Like callbacks registered with ``@ws.on(executor=...)``, the application can
+        call ``emit()`` methods (or ``ProgressBar.tick()``), messages are sent from the IOLoop.
+
+        At most ``queue`` requests wait for a free thread, further requests are answered immediately with a
+        ``503 Service Unavailable`` so the IOLoop never piles up work it can't handle.
+
+        Use it as the ``fallback`` of a ``tornado.web.FallbackHandler``, see
+        :func:`~tornado_websockets.threaded_django_app`.
+
+        :param wsgi_application: WSGI application
+        :param threads: size of the thread pool
+        :param queue: number of requests which can wait for a thread
+        :type wsgi_application: callable
+        :type threads: int
+        :type queue: int
+    """
+
+    def __init__(self, wsgi_application, threads=DEFAULT_THREADS, queue=DEFAULT_QUEUE):
+        self.wsgi_application = wsgi_application
+        self.threads = threads
+        self.queue = queue
+        self.pending = 0
+        self.executor = None
+
+        # Only used to build WSGI environments, its environ() is static on old Tornado versions
+        self._container = tornado.wsgi.WSGIContainer(wsgi_application)
+
+    def start(self):
+        """
+            Create the thread pool, called on the first request so the container can be created before forking
+            workers.
+        """
+
+        if self.threads < 1:
+            raise ValueError('A thread pool needs at least one thread, got %d.' % self.threads)
+
+        if self.queue < 0:
+            raise ValueError('Queue size can not be negative, got %d.' % self.queue)
+
+        self.executor = ThreadPoolExecutor(self.threads)
+
+    @property
+    def saturated(self):
+        """
+            ``True`` when every thread is busy and the queue is full.
+
+            :rtype: bool
+        """
+
+        return self.pending >= self.threads + self.queue
+
+    def __call__(self, request):
+        if self.executor is None:
+            self.start()
+
+        if self.saturated:
+            self.write_response(request, '503 Service Unavailable', [
+                ('Content-Type', 'text/plain; charset=UTF-8'),
+                ('Retry-After', '1'),
+            ], b'Service Unavailable')
+            return
+
+        environ = self._container.environ(request)
+        io_loop = tornado.ioloop.IOLoop.current()
+
+        self.pending += 1
+        future = self.executor.submit(call_for_io_loop, io_loop, self.call_application, environ)
+        io_loop.add_future(future, lambda future: self.on_response(request, future))
+
+    def call_application(self, environ):
+        """
+            Call the WSGI application, in a thread of the pool.
+
+            :return: ``(status, headers, body)``
+            :rtype: tuple
+        """
+
+        data = {}
+        body = []
+
+        def start_response(status, headers, exc_info=None):
+            data['status'] = status
+            data['headers'] = headers
+            return body.append
+
+        app_response = self.wsgi_application(environ, start_response)
+
+        try:
+            body.extend(app_response)
+        finally:
+            if hasattr(app_response, 'close'):
+                app_response.close()
+
+        if 'status' not in data:
+            raise Exception('WSGI app did not call start_response')
+
+        return data['status'], data['headers'], b''.join(body)
+
+    def on_response(self, request, future):
+        self.pending -= 1
+
+        try:
+            status, headers, body = future.result()
+        except Exception:
+            app_log.error('Uncaught exception in WSGI application %r', request, exc_info=sys.exc_info())
+            status, body = '500 Internal Server Error', b'Internal Server Error'
+            headers = [('Content-Type', 'text/plain; charset=UTF-8')]
+
+        self.write_response(request, status, headers, body)
+
+    def write_response(self, request, status, headers, body):
+        """
+            Write a complete response to the connection of ``request``, the same way ``WSGIContainer`` does.
+        """
+
+        status_code, reason = status.split(' ', 1)
+        status_code = int(status_code)
+        header_set = set(name.lower() for name, value in headers)
+
+        if status_code != 304:
+            if 'content-length' not in header_set:
+                headers.append(('Content-Length', str(len(body))))
+            if 'content-type' not in header_set:
+                headers.append(('Content-Type', 'text/html; charset=UTF-8'))
+
+        if 'server' not in header_set:
+            headers.append(('Server', 'TornadoServer/%s' % tornado.version))
+
+        start_line = tornado.httputil.ResponseStartLine('HTTP/1.1', status_code, reason)
+        header_obj = tornado.httputil.HTTPHeaders()
+
+        for name, value in headers:
+            header_obj.add(name, value)
+
+        request.connection.write_headers(start_line, header_obj, chunk=body)
+        request.connection.finish()
+        self.log(status_code, request)
+
+    def log(self, status_code, request):
+        if status_code < 400:
+            log_method = access_log.info
+        elif status_code < 500:
+            log_method = access_log.warning
+        else:
+            log_method = access_log.error
+
+        request_time = 1000.0 * request.request_time()
+        summary = '%s %s (%s)' % (request.method, request.uri, request.remote_ip)
+        log_method('%d %s %.2fms', status_code, summary, request_time)
+
+
+class DjangoWSGIContainer(ThreadPoolWSGIContainer):
+    """
+        :class:`ThreadPoolWSGIContainer` running Django, used by :func:`~tornado_websockets.threaded_django_app`.
+
+        ``threads`` and ``queue`` default to ``TORNADO['wsgi_threads']`` and ``TORNADO['wsgi_queue']`` settings, read
+        on the first request because the container is usually created inside the settings module.
+
+        :param threads: size of the thread pool
+        :param queue: number of requests which can wait for a thread
+        :type threads: int
+        :type queue: int
+    """
+
+    def __init__(self, threads=None, queue=None):
+        import django.core.handlers.wsgi
+
+        super(DjangoWSGIContainer, self).__init__(django.core.handlers.wsgi.WSGIHandler(), threads, queue)
+
+    def start(self):
+        from django.conf import settings
+
+        configuration = getattr(settings, 'TORNADO', {})
+
+        if self.threads is None:
+            self.threads = configuration.get('wsgi_threads', DEFAULT_THREADS)
+
+        if self.queue is None:
+            self.queue = configuration.get('wsgi_queue', DEFAULT_QUEUE)
+
+        super(DjangoWSGIContainer, self).start()